@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time showing bv's diff in-process against running git diff
+
+Builds a synthetic repository with many version.py targets (see
+synth.py), then bumps each in turn and times writing its diff both ways:
+rendered by gitr (the default) and by running 'git diff' (--git-diff).
+The bump itself isn't timed, and the target is put back after each one.
+Reports the median and 95th percentile per bump for each, and the saving.
+
+Usage:
+    diff_bench.py [--targets=<n>] [--files=<n>] [--json] [<dir>]
+
+Options:
+    --targets=<n>    how many version.py files to bump [default: 200]
+    --files=<n>      other python files in the repo [default: 1000]
+    --json           write the results as JSON
+
+Arguments:
+    <dir>            where to build the repository (default: a temporary
+                     dir)
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import docopt
+
+import synth
+
+GITR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [GITR, os.path.join(GITR, 'gitr')]
+
+import gitr  # noqa: E402
+from gitr import api  # noqa: E402
+from gitr import tbx  # noqa: E402
+
+
+# -----------------------------------------------------------------------------
+def main():
+    """Entrypoint
+    """
+    o = docopt.docopt(__doc__)
+    ntargets = int(o['--targets'])
+    top = o['<dir>'] or tempfile.mkdtemp(prefix='gitr-diff-bench-')
+    try:
+        synth.make_repo(top, files=int(o['--files']), funcs=5, commits=1,
+                        versions=ntargets)
+        times = {'in-process': [], 'git diff': []}
+        with tbx.chdir(top):
+            for n in range(ntargets):
+                target = 'pkg{0:03d}/version.py'.format(n)
+                for (name, use_git) in [('in-process', False),
+                                        ('git diff', True)]:
+                    res = api.bump(target)
+                    times[name].append(timed(res.root, res.relpath, use_git))
+                    synth.git(top, 'checkout', '-q', '--', target)
+    finally:
+        if not o['<dir>']:
+            shutil.rmtree(top)
+
+    results = {}
+    for name in times:
+        t = sorted(times[name])
+        results[name] = {'median': t[len(t) // 2],
+                         'p95': t[min(len(t) - 1, int(0.95 * len(t)))],
+                         'total': sum(t)}
+    saving = results['git diff']['median'] - results['in-process']['median']
+    results['saving per bump'] = saving
+    if o['--json']:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    for name in ['in-process', 'git diff']:
+        r = results[name]
+        print("{0:12s} median {1:7.2f}ms  p95 {2:7.2f}ms  total {3:7.3f}s"
+              .format(name, 1000 * r['median'], 1000 * r['p95'],
+                      r['total']))
+    print("saving per bump: {0:.2f}ms over {1} targets"
+          .format(1000 * saving, ntargets))
+
+
+# -----------------------------------------------------------------------------
+def timed(root, relpath, use_git):
+    """
+    Return how long writing the diff of *relpath* took, in seconds, with
+    stdout sent to /dev/null
+    """
+    real = sys.stdout
+    with open(os.devnull, 'w') as null:
+        sys.stdout = null
+        try:
+            start = time.time()
+            gitr.version_diff(root, relpath, use_git)
+            return time.time() - start
+        finally:
+            sys.stdout = real
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
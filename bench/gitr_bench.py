@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time gitr's subcommands on a synthetic repository
+
+Builds a reproducible repository (see synth.py), runs each benchmark a
+few times as a fresh 'gitr' process (so startup is included, as users see
+it), and reports the median and minimum. The results can be saved as JSON
+and compared with a saved baseline: any benchmark whose median has slowed
+by more than the threshold is flagged, and the exit status is 1. A run
+that exits with a status the benchmark doesn't expect is reported and
+left out of the timings, and it too makes the exit status 1.
+
+Usage:
+    gitr_bench.py [options] [<dir>]
+
+Options:
+    --files=<n>      python files in the synthetic repo [default: 1000]
+    --funcs=<n>      functions per file [default: 10]
+    --commits=<n>    commits of history [default: 200]
+    --conflicts=<n>  conflicted files for flix [default: 20]
+    --versions=<n>   packages with a version.py [default: 20]
+    --seed=<n>       seed for the generator [default: 1]
+    --runs=<n>       timed runs per benchmark [default: 5]
+    --only=<names>   comma separated benchmarks to run (default: all)
+    --out=<file>     save the results as JSON
+    --baseline=<file>  compare against results saved with --out
+    --threshold=<pct>  slowdown that counts as a regression [default: 20]
+    --keep           don't remove the repositories when done
+
+Arguments:
+    <dir>            where to build the repositories (default: a temporary
+                     dir)
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import docopt
+
+import synth
+
+GITR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (which repo, gitr arguments, how to put the repo back after each
+# run: 'checkout' the work tree again, 'remerge' the conflicts, or None)
+BENCHMARKS = [('startup', 'main', ['--version'], None),
+              ('bv', 'main', ['bv', 'pkg000/version.py'], 'checkout'),
+              ('bv --git-diff', 'main', ['bv', '--git-diff',
+                                         'pkg000/version.py'], 'checkout'),
+              ('bv --dry-run', 'main', ['bv', '--dry-run'], None),
+              ('depth', 'main', ['depth', 'HEAD~10'], None),
+              ('depth --in', 'main', ['depth', '--in', 'master', 'HEAD~10'],
+               None),
+              ('dunn', 'main', ['dunn'], None),
+              ('dupl', 'main', ['dupl'], None),
+              ('dupl --history', 'main', ['dupl', '--history'], None),
+              ('nodoc', 'main', ['nodoc'], None),
+              ('flix', 'conflicts', ['flix'], None),
+              ('flix --auto', 'conflicts', ['flix', '--auto'], 'remerge'),
+              ]
+
+# benchmarks that expect gitr to exit with a status other than 0 ('gitr
+# --version' exits with the version as its message)
+EXPECT = {'startup': 1}
+
+
+# -----------------------------------------------------------------------------
+def main():
+    """Entrypoint
+    """
+    o = docopt.docopt(__doc__)
+    params = dict((k, int(o['--' + k])) for k in ['files', 'funcs',
+                                                  'commits', 'conflicts',
+                                                  'versions', 'seed'])
+    runs = int(o['--runs'])
+    only = o['--only'].split(',') if o['--only'] else None
+    top = o['<dir>'] or tempfile.mkdtemp(prefix='gitr-bench-')
+    repos = {'main': os.path.join(top, 'main'),
+             'conflicts': os.path.join(top, 'conflicts')}
+    try:
+        os.makedirs(repos['main'])
+        synth.make_repo(repos['main'], params['files'], params['funcs'],
+                        params['commits'], params['versions'],
+                        params['seed'])
+        synth.make_conflicts(repos['main'], repos['conflicts'],
+                             params['conflicts'], params['seed'])
+        results = {}
+        failed = []
+        for (name, repo, args, reset) in BENCHMARKS:
+            if only and name not in only:
+                continue
+            res = results[name] = bench(repos[repo], args, runs, reset,
+                                        EXPECT.get(name, 0))
+            if res['failed']:
+                failed.append(name)
+                print("{0:16s} {1} of {2} runs exited with {3}"
+                      .format(name, res['failed'], runs + 1,
+                              ', '.join(str(c) for c in res['status'])))
+            if res['runs']:
+                print("{0:16s} median {1:8.3f}s  min {2:8.3f}s"
+                      .format(name, res['median'], res['min']))
+    finally:
+        if not o['--keep']:
+            shutil.rmtree(top)
+
+    report = {'meta': meta(params, runs), 'results': results}
+    if o['--out']:
+        with open(o['--out'], 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if o['--baseline']:
+        with open(o['--baseline']) as f:
+            base = json.load(f)
+        slow = compare(base['results'], results, float(o['--threshold']))
+        if slow:
+            sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+
+# -----------------------------------------------------------------------------
+def bench(repo, args, runs, reset, expect=0):
+    """
+    Time 'gitr *args*' in *repo* *runs* times, after one untimed run to warm
+    the caches. With *reset* ('checkout' or 'remerge'), the repo is put back
+    that way after each run, so every run starts from the same state. Runs
+    (the warm-up included) that exit with a status other than *expect* are
+    counted as failed, with the statuses they exited with, and not timed;
+    if none are left, the median and minimum are None.
+    """
+    times = []
+    status = []
+    for n in range(runs + 1):
+        (elapsed, code) = timed(gitr, repo, args)
+        if reset == 'checkout':
+            synth.git(repo, 'checkout', '-q', '-f', 'HEAD')
+        elif reset == 'remerge':
+            synth.remerge(repo)
+        if code != expect:
+            status.append(code)
+        elif n:
+            times.append(elapsed)
+    times.sort()
+    return {'median': times[len(times) // 2] if times else None,
+            'min': times[0] if times else None,
+            'runs': times, 'failed': len(status),
+            'status': sorted(set(status))}
+
+
+# -----------------------------------------------------------------------------
+def gitr(repo, args):
+    """
+    Run gitr from this source tree with *args* in *repo*, discarding its
+    output, and return its exit status
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([GITR, os.path.join(GITR, 'gitr')])
+    with open(os.devnull, 'w') as null:
+        return subprocess.call([sys.executable, '-c',
+                                'import gitr; gitr.main()'] + args,
+                               cwd=repo, env=env, stdout=null, stderr=null)
+
+
+# -----------------------------------------------------------------------------
+def compare(base, results, threshold):
+    """
+    Print how each benchmark's median compares with *base*'s and return the
+    names of those more than *threshold* percent slower
+    """
+    slow = []
+    for name in sorted(results):
+        if name not in base or results[name]['median'] is None or \
+           base[name].get('median') is None:
+            continue
+        (old, new) = (base[name]['median'], results[name]['median'])
+        change = 100.0 * (new - old) / old if old else 0.0
+        flag = ''
+        if threshold < change:
+            slow.append(name)
+            flag = '  REGRESSION'
+        print("{0:16s} {1:8.3f}s -> {2:8.3f}s  {3:+7.1f}%{4}"
+              .format(name, old, new, change, flag))
+    return slow
+
+
+# -----------------------------------------------------------------------------
+def meta(params, runs):
+    """
+    What the results were measured on
+    """
+    git_version = subprocess.check_output(['git', '--version']).decode()
+    return {'params': params,
+            'runs': runs,
+            'python': platform.python_version(),
+            'git': git_version.strip(),
+            'platform': platform.platform(),
+            'when': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+
+# -----------------------------------------------------------------------------
+def timed(func, *args):
+    """
+    Return (how long (wall clock) func(*args) took, what it returned)
+    """
+    start = time.time()
+    rval = func(*args)
+    return (time.time() - start, rval)
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
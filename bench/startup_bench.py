@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure how long the gitr command takes to start
+
+Times 'gitr --version', 'gitr -h', and the stub subcommands, which do
+next to nothing, so what's measured is interpreter start plus imports.
+Warm runs reuse the compiled bytecode; cold runs get a fresh, empty
+bytecode cache each time (python 3.8 and later), as on the first run
+after an install or upgrade. Medians and 95th percentiles are reported,
+then the cost of each module 'import gitr' loads (python -X importtime,
+python 3.7 and later), and a check against the import budget.
+
+Usage:
+    startup_bench.py [--runs=<n>] [--top=<n>] [--json]
+
+Options:
+    --runs=<n>       timed runs per command and mode [default: 50]
+    --top=<n>        how many of the costliest imports to list [default: 15]
+    --json           write the results as JSON
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import docopt
+
+GITR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = os.path.join(GITR, 'bench', 'import_budget.json')
+
+# none of these touch the repo: depth and the like read the object store,
+# which would swamp the startup cost being measured
+COMMANDS = [['--version'],
+            ['-h'],
+            ['dunn'],
+            ['hook', '--list'],
+            ]
+
+
+# -----------------------------------------------------------------------------
+def main():
+    """Entrypoint
+    """
+    o = docopt.docopt(__doc__)
+    runs = int(o['--runs'])
+    modes = ['warm']
+    if sys.version_info >= (3, 8):
+        modes.append('cold')
+    results = {'commands': {}, 'imports': import_costs(),
+               'budget': budget_check()}
+    for args in COMMANDS:
+        name = ' '.join(args)
+        results['commands'][name] = {}
+        for mode in modes:
+            times = sorted(timed_run(args, mode) for _ in range(runs))
+            results['commands'][name][mode] = {
+                'median': percentile(times, 50),
+                'p95': percentile(times, 95)}
+
+    if o['--json']:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    for name in sorted(results['commands']):
+        for mode in modes:
+            r = results['commands'][name][mode]
+            print("{0:16s} {1:4s}  median {2:7.1f}ms  p95 {3:7.1f}ms"
+                  .format(name, mode, 1000 * r['median'], 1000 * r['p95']))
+    if results['imports']:
+        print("")
+        print("{0:>10s} {1:>10s}  module".format('self ms', 'total ms'))
+        costly = sorted(results['imports'], key=lambda i: -i['total'])
+        for i in costly[:int(o['--top'])]:
+            print("{0:10.1f} {1:10.1f}  {2}".format(i['self'] / 1000.0,
+                                                    i['total'] / 1000.0,
+                                                    i['module']))
+    b = results['budget']
+    print("")
+    print("budget: {0} modules (limit {1}); forbidden loaded: {2}"
+          .format(b['modules'], b['limit'],
+                  ', '.join(b['forbidden']) or 'none'))
+
+
+# -----------------------------------------------------------------------------
+def env(extra=None):
+    """
+    The environment for running gitr from this source tree
+    """
+    rval = dict(os.environ)
+    rval['PYTHONPATH'] = os.pathsep.join([GITR, os.path.join(GITR, 'gitr')])
+    rval.update(extra or {})
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def timed_run(args, mode):
+    """
+    Return how long 'gitr *args*' takes, in seconds. In 'cold' *mode*, the
+    bytecode is compiled afresh.
+    """
+    extra = {}
+    prefix = None
+    if mode == 'cold':
+        prefix = extra['PYTHONPYCACHEPREFIX'] = tempfile.mkdtemp()
+    cmd = [sys.executable, '-c', 'import gitr; gitr.main()'] + args
+    try:
+        with open(os.devnull, 'w') as null:
+            start = time.time()
+            subprocess.call(cmd, cwd=GITR, env=env(extra), stdout=null,
+                            stderr=null)
+            return time.time() - start
+    finally:
+        if prefix:
+            shutil.rmtree(prefix)
+
+
+# -----------------------------------------------------------------------------
+def import_costs():
+    """
+    Return [{'module', 'self', 'total'}] (microseconds) for the modules
+    'import gitr' loads, or [] where python can't tell us
+    """
+    if sys.version_info < (3, 7):
+        return []
+    p = subprocess.Popen([sys.executable, '-X', 'importtime', '-c',
+                          'import gitr'], env=env(), stderr=subprocess.PIPE)
+    (_, err) = p.communicate()
+    rval = []
+    for line in err.decode().splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        (selfus, total, name) = line[len('import time:'):].split('|')
+        rval.append({'module': name.strip(), 'self': int(selfus),
+                     'total': int(total)})
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def budget_check():
+    """
+    Compare what 'import gitr' loads with the import budget
+    """
+    with open(BUDGET) as f:
+        budget = json.load(f)
+    probe = ('import json, sys\n'
+             'before = set(sys.modules)\n'
+             'import gitr\n'
+             'print(json.dumps([m for m in set(sys.modules) - before\n'
+             '                  if sys.modules[m] is not None]))\n')
+    out = subprocess.check_output([sys.executable, '-c', probe], env=env())
+    mods = json.loads(out.decode())
+    return {'modules': len(mods),
+            'limit': budget['max_modules'][str(sys.version_info[0])],
+            'forbidden': sorted(m for m in mods
+                                if m.split('.')[0] in budget['forbidden'])}
+
+
+# -----------------------------------------------------------------------------
+def percentile(values, pct):
+    """
+    The *pct*th percentile of sorted *values* (nearest rank)
+    """
+    n = max(1, int(round(pct / 100.0 * len(values))))
+    return values[min(n, len(values)) - 1]
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
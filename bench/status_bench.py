@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compare 'git status' latency with and without the status speedups
+
+Builds a synthetic tree (200,000 files by default), commits it, and times
+'git status --porcelain' plain, with the untracked cache, and (where git
+supports the builtin daemon on this platform) with fsmonitor.
+
+Usage:
+    status_bench.py [--files=<n>] [--runs=<n>] [--keep] [<dir>]
+
+Options:
+    --files=<n>      number of files in the synthetic tree [default: 200000]
+    --runs=<n>       timed runs per configuration [default: 5]
+    --keep           don't remove the tree when done
+
+Arguments:
+    <dir>            where to build the tree (default: a temporary dir)
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import docopt
+
+
+# -----------------------------------------------------------------------------
+def main():
+    """Entrypoint
+    """
+    o = docopt.docopt(__doc__)
+    nfiles = int(o['--files'])
+    runs = int(o['--runs'])
+    top = o['<dir>'] or tempfile.mkdtemp(prefix='gitr-status-')
+    try:
+        make_tree(top, nfiles)
+        configs = [('plain', ['core.untrackedCache=false',
+                              'core.fsmonitor=false']),
+                   ('untracked cache', ['core.untrackedCache=true',
+                                        'core.fsmonitor=false'])]
+        if fsmonitor_supported():
+            configs.append(('untracked cache + fsmonitor',
+                            ['core.untrackedCache=true',
+                             'core.fsmonitor=true']))
+        for name, conf in configs:
+            # one untimed run to populate caches / start the daemon
+            status(top, conf)
+            times = sorted(timed(status, top, conf) for _ in range(runs))
+            print("{0:30s} median {1:8.3f}s  min {2:8.3f}s"
+                  .format(name, times[len(times) // 2], times[0]))
+        if fsmonitor_supported():
+            git(top, 'fsmonitor--daemon', 'stop')
+    finally:
+        if not o['--keep']:
+            shutil.rmtree(top)
+
+
+# -----------------------------------------------------------------------------
+def fsmonitor_supported():
+    """
+    The builtin fsmonitor daemon is available on macOS and Windows
+    """
+    return sys.platform in ['darwin', 'win32']
+
+
+# -----------------------------------------------------------------------------
+def git(top, *args):
+    """
+    Run a git command in *top*, discarding its output
+    """
+    with open(os.devnull, 'w') as null:
+        subprocess.check_call(['git', '-C', top] + list(args), stdout=null)
+
+
+# -----------------------------------------------------------------------------
+def make_tree(top, nfiles, per_dir=1000):
+    """
+    Populate *top* with *nfiles* small files, *per_dir* to a directory, and
+    commit them
+    """
+    git(top, 'init', '-q')
+    for n in range(nfiles):
+        d = os.path.join(top, 'd{0:04d}'.format(n // per_dir))
+        if n % per_dir == 0:
+            os.makedirs(d)
+        with open(os.path.join(d, 'f{0:04d}.txt'.format(n % per_dir)),
+                  'w') as f:
+            f.write('file {0}\n'.format(n))
+    git(top, 'add', '-A')
+    git(top, '-c', 'user.name=bench', '-c', 'user.email=bench@example.com',
+        'commit', '-q', '-m', 'synthetic tree')
+
+
+# -----------------------------------------------------------------------------
+def status(top, conf):
+    """
+    Run 'git status --porcelain' in *top* with '-c' settings *conf*
+    """
+    args = []
+    for c in conf:
+        args.extend(['-c', c])
+    git(top, *(args + ['status', '--porcelain']))
+
+
+# -----------------------------------------------------------------------------
+def timed(func, *args):
+    """
+    Return how long (wall clock) func(*args) took
+    """
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""Build reproducible synthetic repositories for the gitr benchmarks
+
+Everything is generated from a seed, offline, and the history is written
+with a single 'git fast-import', so a repo with thousands of files and
+commits takes seconds to build. The same parameters and seed always give
+the same repository (down to the commit ids).
+"""
+import os
+import random
+import subprocess
+
+AUTHOR = b'bench <bench@example.com> 1500000000 +0000'
+IDENT = ['-c', 'user.name=bench', '-c', 'user.email=bench@example.com']
+
+# statement templates for function bodies; {v} is a name, {n} a number
+STATEMENTS = ['{v} = {n}',
+              '{v} = [x * {n} for x in range({n})]',
+              'if {v} > {n}:\n        {v} -= {n}',
+              'for i in range({n}):\n        {v} += i',
+              'return {v}']
+
+
+# -----------------------------------------------------------------------------
+def git(top, *args, **kw):
+    """
+    Run a git command in *top*, passing bytes *input* (keyword) on stdin
+    and discarding its output
+    """
+    with open(os.devnull, 'w') as null:
+        p = subprocess.Popen(['git', '-C', top] + IDENT + list(args),
+                             stdin=subprocess.PIPE, stdout=null)
+        p.communicate(kw.get('input'))
+    if p.returncode != 0:
+        raise subprocess.CalledProcessError(p.returncode, args[0])
+
+
+# -----------------------------------------------------------------------------
+def module(rng, nfuncs, names):
+    """
+    The text of a python module with *nfuncs* functions whose names are
+    drawn from *names* (so some are defined in more than one file), about
+    half of them with docstrings
+    """
+    chunks = []
+    for _ in range(nfuncs):
+        name = rng.choice(names)
+        body = []
+        if rng.random() < 0.5:
+            body.append('"""{0} does a thing"""'.format(name))
+        v = rng.choice(['a', 'b', 'total', 'value'])
+        body.append('{0} = 0'.format(v))
+        for _ in range(rng.randint(2, 8)):
+            body.append(rng.choice(STATEMENTS[:-1]).format(
+                v=v, n=rng.randint(1, 99)))
+        body.append('return {0}'.format(v))
+        chunks.append('def {0}({1}):\n    {2}\n'.format(
+            name, v if rng.random() < 0.3 else '', '\n    '.join(body)))
+    return '\n\n'.join(chunks)
+
+
+# -----------------------------------------------------------------------------
+def make_repo(top, files=1000, funcs=10, commits=100, versions=10,
+              seed=1):
+    """
+    Build a repository in *top* with *files* python files of *funcs*
+    functions each, *versions* packages with a version.py, and *commits*
+    commits of history (the first adds everything; each later one rewrites
+    one file). The work tree is checked out at the tip of master.
+    """
+    rng = random.Random(seed)
+    names = ['func_{0}'.format(n) for n in range(max(1, files * funcs // 4))]
+    paths = ['src/d{0:03d}/m{1:04d}.py'.format(n // 100, n)
+             for n in range(files)]
+    tree = dict((p, module(rng, funcs, names)) for p in paths)
+    for n in range(versions):
+        tree['pkg{0:03d}/version.py'.format(n)] = \
+            "__version__ = '1.{0}.0'\n".format(n)
+
+    stream = []
+    for c in range(max(1, commits)):
+        if c == 0:
+            changed = sorted(tree)
+        else:
+            path = rng.choice(paths)
+            tree[path] = module(rng, funcs, names)
+            changed = [path]
+        stream.append(b'commit refs/heads/master\n')
+        stream.append(b'mark :' + str(c + 1).encode() + b'\n')
+        stream.append(b'author ' + AUTHOR + b'\n')
+        stream.append(b'committer ' + AUTHOR + b'\n')
+        stream.append(_data('commit {0}'.format(c).encode()))
+        if c:
+            stream.append(b'from :' + str(c).encode() + b'\n')
+        for path in changed:
+            stream.append(b'M 100644 inline ' + path.encode() + b'\n')
+            stream.append(_data(tree[path].encode()))
+    git(top, 'init', '-q')
+    git(top, 'fast-import', '--quiet', input=b''.join(stream))
+    git(top, 'checkout', '-q', '-f', 'master')
+
+
+# -----------------------------------------------------------------------------
+def make_conflicts(src, top, conflicts=10, seed=1):
+    """
+    Clone *src* into *top* and leave it mid-merge with *conflicts* python
+    files conflicted. In half of them (rounding down) master only added
+    trailing white space to the line both sides changed, so the conflict is
+    trivial for flix --auto; in the rest both sides really changed it.
+    """
+    rng = random.Random(seed)
+    subprocess.check_call(['git', 'clone', '-q', src, top])
+    out = subprocess.check_output(['git', '-C', top, 'ls-files', '*.py'])
+    paths = sorted(p for p in out.decode().splitlines()
+                   if not p.endswith('version.py'))
+    victims = rng.sample(paths, min(conflicts, len(paths)))
+    trivial = set(victims[:len(victims) // 2])
+    git(top, 'checkout', '-q', '-b', 'side')
+    _edit(top, victims, 'side')
+    git(top, 'checkout', '-q', 'master')
+    _edit(top, victims, 'master', trivial)
+    remerge(top)
+
+
+# -----------------------------------------------------------------------------
+def remerge(top):
+    """
+    Put the repo make_conflicts() built back in the middle of its merge, with
+    every conflict unresolved, whatever was done to it since
+    """
+    git(top, 'reset', '-q', '--hard')
+    try:
+        git(top, 'merge', '-q', 'side')
+    except subprocess.CalledProcessError:
+        pass
+
+
+# -----------------------------------------------------------------------------
+def _edit(top, paths, tag, trivial=()):
+    """
+    Change the first line of each of *paths* to mention *tag* (or, for
+    those in *trivial*, just add trailing white space to it) and commit
+    """
+    for p in paths:
+        full = os.path.join(top, p)
+        with open(full) as f:
+            lines = f.readlines()
+        if p in trivial:
+            lines[0] = lines[0].rstrip('\n') + '  \n'
+        else:
+            lines[0] = '# changed on {0}\n'.format(tag)
+        with open(full, 'w') as f:
+            f.writelines(lines)
+    git(top, 'commit', '-q', '-a', '-m', 'edit on ' + tag)
+
+
+# -----------------------------------------------------------------------------
+def _data(payload):
+    """
+    A fast-import data block
+    """
+    return b'data ' + str(len(payload)).encode() + b'\n' + payload + b'\n'
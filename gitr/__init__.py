@@ -7,42 +7,113 @@ repositories.
 Commands:
     gitr bv - will bump the version of the current repo as set in <path>
         (default = version.py). Options --major, --minor, --patch, --build
-        (default) determine which component of the version value is bumped
+        (default) determine which component of the version value is bumped.
+        With --dry-run, every file named <path> in the tree is examined and
+        the bumps that would be made are reported (--json for JSON) without
+        changing anything. With --ref, <path> is bumped on branch <ref> by
+        writing a new commit straight into the object database; no working
+        tree is needed, so this works in bare repos. A branch checked out in
+        a working tree is refused; bump it there without --ref. The diff of
+        the bump is rendered by gitr itself unless --git-diff asks for git's
 
     gitr dunn - will suggest what the next step to be done probably is based on
         the state of the repo.
 
     gitr depth - will report how far back a commitish is (number of commits
         between the one in question and the present as well as the age of the
-        target committish)
+        target committish). Given a comma separated list of refs (or ref
+        patterns, like 'release/*') to look in, it reports instead whether
+        the commitish is in each one and how far back from its tip. A
+        commitish of '-' reads commitishes from stdin, one per line, and all
+        of them are checked against all of the refs at once. With --stats,
+        it reports how many commits are in a range (A..B, or just A for
+        A..HEAD), the days they span, commits per day, and the busiest day
 
     gitr dupl - will find and report any duplicate functions in the current
-        tree in .py files
-
-    gitr flix - will find and report conflicts
+        tree in .py files (functions with the same qualified name). With the
+        similar option, it reports pairs of functions whose bodies have nearly
+        the same structure instead, whatever they're called. With --history,
+        it reports for each name defined more than once since which commit
+        that's been so, and which commit brought each copy to its file
+        (following files and functions that moved). The history walked is
+        remembered, so later runs only look at new commits
+
+    gitr flix - will find and report conflicts in <target>, or in every file
+        with unmerged entries in the index. With --auto, it resolves the
+        trivial ones instead: where both sides made the same change but for
+        white space, where one side only changed white space, or where one
+        side only bumped a version. The three versions are taken from the
+        index, and a file is rewritten and staged only if all its conflicts
+        are trivial. It reports what it did with each file.
+
+        flix remembers the conflicts it sees and, once they've been resolved
+        and staged, how. The same conflicts met again (in a later merge or
+        rebase, whichever side they're on) are reported as resolved before,
+        and --auto resolves them the same way. This doesn't need git's
+        rerere to be enabled
+
+    gitr multi - will run a gitr subcommand (given after '--') in each of the
+        repositories listed in <repolist>, biggest first, --jobs at a time.
+        Output lines are prefixed with the repo path (or, with --json, each
+        repo's result is written as one JSON object per line). A failure in
+        one repo is reported and doesn't stop the others
 
     gitr hook - will list available hooks (--list), install and link a hook
         (--add), show a list of installed hooks (--show), and remove hooks
         (--rm)
 
     gitr nodoc - will find and report any functions in the current tree in .py
-        files that have no docstring
+        files that have no docstring. Given a commit to compare against, it
+        reports only the ones the changes since that commit touch
+
+    Every subcommand can write its results as text (the default), json (a
+    list of objects), jsonl (an object per line), or csv. The records are
+    written as they're found, a batch at a time.
+
+    With a revision range, dupl and nodoc report a time series instead: one
+    line per commit in the range, oldest first, with the number of functions
+    and of duplicated names or undocumented functions. Nothing is checked
+    out, so this is quick even over thousands of commits
 
 Usage:
     gitr (-h|--help|--version)
-    gitr bv [(-d|--debug)] [(-q|--quiet)] [(--major|--minor|--patch|--build)] [<path>]
-    gitr depth [(-d|--debug)] <commitish>
-    gitr dunn [(-d|--debug)]
-    gitr dupl [(-d|--debug)]
-    gitr flix [(-d|--debug)] [<target>]
-    gitr hook [(-d|--debug)] (--list|--show)
-    gitr hook [(-d|--debug)] (--add|--rm) <hookname>
-    gitr nodoc [(-d|--debug)]
+    gitr bv [(-d|--debug)] [(-q|--quiet)] [--format=<fmt>] [--git-diff]
+            [(--major|--minor|--patch|--build)] [<path>]
+    gitr bv --dry-run [--json] [--format=<fmt>]
+            [(--major|--minor|--patch|--build)] [<path>]
+    gitr bv --ref=<ref> [(-q|--quiet)] [--format=<fmt>]
+            [(--major|--minor|--patch|--build)] [<path>]
+    gitr depth [(-d|--debug)] [--format=<fmt>] [--in=<refs>] <commitish>
+    gitr depth [(-d|--debug)] [--format=<fmt>] --stats <commitish>
+    gitr dunn [(-d|--debug)] [--format=<fmt>]
+    gitr dupl [(-d|--debug)] [--format=<fmt>] [--similar]
+    gitr dupl [(-d|--debug)] [--format=<fmt>] --rev=<range>
+    gitr dupl [(-d|--debug)] [--format=<fmt>] --history [--rev=<range>]
+    gitr flix [(-d|--debug)] [--format=<fmt>] [--auto] [<target>]
+    gitr hook [(-d|--debug)] [--format=<fmt>] (--list|--show)
+    gitr hook [(-d|--debug)] [--format=<fmt>] (--add|--rm) <hookname>
+    gitr multi [--json] [--format=<fmt>] [--jobs=<n>] <repolist> -- <args>...
+    gitr nodoc [(-d|--debug)] [--format=<fmt>] [--rev=<range>]
+    gitr nodoc [(-d|--debug)] [--format=<fmt>] --since=<commitish>
 
 Options:
     -h --help        Provide help info (display this document)
     -d --debug       Run under the debugger
     --version        Show version
+    --dry-run        Report what bv would do without doing it
+    --json           Write the --dry-run report as JSON
+    --format=<fmt>   Write results as text, json, jsonl, or csv
+                     [default: text]
+    --ref=<ref>      Bump the version on branch <ref> without a checkout
+    --git-diff       Show the bump by running git diff (bv)
+    --similar        Report structurally similar functions (dupl)
+    --rev=<range>    Report counts for each commit in <range> (dupl, nodoc)
+    --history        Report where duplicated names came from (dupl)
+    --since=<commitish>  Report only functions changed since <commitish>
+    --in=<refs>      Refs to look for <commitish> in, comma separated (depth)
+    --stats          Report commit dates over a range (depth)
+    --auto           Resolve trivial conflicts (flix)
+    --jobs=<n>       How many repos to work on at once (default: CPU count)
     --list           List git hooks available to install
     --show           List installed git hooks
     --add            Add a hook by name
@@ -51,30 +122,64 @@ Options:
 Arguments
     <commitish>      which object in the commit chain to check
     <hookname>       which hook to add or remove
+    <args>           gitr subcommand and arguments to run in each repo
     <path>           path for version info
+    <repolist>       file listing repository paths, one per line
     <target>         which file to examine for conflicts
 """
 
 import docopt
-import git
-import os
-import pdb
-import re
+import json
 import sys
-
+import time
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import api
+import output
 import tbx
 import version
+# gitr.find_repo_root() was here before gitr.api took it over
+from api import find_repo_root  # noqa: F401
+
+# kept off the startup path; see bench/import_budget.json
+git = tbx.lazy_import('git')
+multiprocessing = tbx.lazy_import('multiprocessing')
 
 __author__ = 'Tom Barron'
 __email__ = 'tusculum@gmail.com'
 __version__ = version.__version__
 
+# the fields each subcommand reports when --format isn't text
+BUMP_FIELDS = ['path', 'old', 'new']
+REF_FIELDS = ['path', 'old', 'new', 'commit', 'ref']
+DEPTH_FIELDS = ['commitish', 'commit', 'commits', 'ancestor', 'time', 'age']
+REF_DEPTH_FIELDS = ['commitish', 'commit', 'ref', 'tip', 'contained',
+                    'commits']
+STATS_FIELDS = ['range', 'commits', 'first', 'last', 'days', 'per_day',
+                'busiest', 'busiest_commits', 'age']
+PLAN_FIELDS = ['path', 'old', 'new', 'start', 'end', 'locator', 'error']
+DUPL_FIELDS = ['name', 'path', 'lineno']
+HISTORY_FIELDS = ['name', 'since', 'since_time', 'path', 'first',
+                  'first_time', 'last', 'moved_from']
+SIMILAR_FIELDS = ['score', 'a_path', 'a_lineno', 'a_qualname', 'b_path',
+                  'b_lineno', 'b_qualname']
+FLIX_FIELDS = ['path', 'start', 'base', 'sep', 'end', 'ours', 'theirs',
+               'known']
+AUTO_FIELDS = ['path', 'conflicts', 'rules', 'resolved', 'reason']
+MULTI_FIELDS = ['repo', 'status', 'output', 'error']
+NODOC_FIELDS = ['path', 'lineno', 'qualname']
+
+
 # -----------------------------------------------------------------------------
 def main():
     """Entrypoint
     """
     o = docopt.docopt(sys.modules[__name__].__doc__)
     if o['--debug']:
+        import pdb
         pdb.set_trace()
 
     if o['--version']:
@@ -107,186 +212,533 @@ def gitr_bv(opts):
         if opts.get(a, False) and opts.get(b, False):
             sys.exit('{0} and {1} are mutually exclusive'.format(a, b))
 
-    tl = []
-    target = opts.get('<path>', 'version.py') or 'version.py'
-    if not os.path.exists(target):
-        if '/' in target:
-            td = tbx.dirname(target)
-            if not os.path.exists(td):
-                os.makedirs(td)
-            version_update(target, ['0', '0', '0'])
-            if opts.get('-q', False) or opts.get('--quiet', False):
-                msg = ""
+    quiet = opts.get('-q', False) or opts.get('--quiet', False)
+    fmt = out_format(opts)
+    try:
+        if opts.get('--dry-run', False):
+            bv_dry_run(opts)
+        elif opts.get('--ref'):
+            res = api.bump_ref(opts['--ref'], opts.get('<path>'),
+                               bv_part(opts))
+            if quiet:
+                pass
+            elif fmt != 'text':
+                output.write_all(fmt, REF_FIELDS, [res._asdict()])
             else:
-                msg = "{0} is not in git -- no diff available".format(target)
-            sys.exit(msg)
+                print('{0}: {1} -> {2}'.format(res.path, res.old, res.new))
+                print(res.commit)
         else:
-            for r,d,f in os.walk('.'):
-                if target in f:
-                    tl.append(os.path.join(r, target))
-            if tl == []:
-                sys.exit('{0} not found'.format(target))
-            target = tl[0]
+            res = api.bump(opts.get('<path>'), bv_part(opts))
+            if res.created:
+                if quiet:
+                    msg = ""
+                else:
+                    msg = "{0} is not in git -- no diff available".format(
+                        res.path)
+                sys.exit(msg)
+            if quiet:
+                pass
+            elif fmt != 'text':
+                output.write_all(fmt, BUMP_FIELDS, [res._asdict()])
+            else:
+                version_diff(res.root, res.relpath,
+                             opts.get('--git-diff', False))
+    except api.GitrError as e:
+        sys.exit(str(e))
 
-    try:
-        repo_root = find_repo_root()
-        repo = git.Repo(repo_root)
-        # compute the target path relative to the repo root
-        repo_rel_target = os.path.relpath(os.path.abspath(target), repo_root)
-        s = repo.git.status(repo_rel_target, porc=True)
-        if s.strip() != '':
-            sys.exit('{0} is already bumped'.format(repo_rel_target))
-    except git.InvalidGitRepositoryError:
-        sys.exit('{0} is not in a git repo'.format(target))
-
-    with open(target, 'r') as f:
-        content = f.read()
-    q = re.findall(r'(\d+\.\d+\.\d+\.?\w*)', content)
-    try:
-        v = q[0]
-    except NameError:
-        sys.exit("No version found in {0} ['{1}']".format(target,
-                                                        content))
-    except IndexError:
-        sys.exit("No version found in {0} ['{1}']".format(target,
-                                                        content))
 
-    iv = v.split('.')
-    ov = version_increment(iv, opts)
-    version_update(target, ov, iv)
-    if not opts.get('-q', False) and not opts.get('--quiet', False):
-        version_diff(repo, repo_rel_target)
+# -----------------------------------------------------------------------------
+def bv_dry_run(opts):
+    """
+    Report the bumps that gitr bv would make to every target in the tree
+    without touching anything
+    """
+    target = opts.get('<path>', 'version.py') or 'version.py'
+    if '/' in target:
+        paths = [target]
+    else:
+        paths = api.discover_targets(target)
+    plan = bv_plan(paths, opts)
+    fmt = out_format(opts)
+    if fmt != 'text':
+        output.write_all(fmt, PLAN_FIELDS, plan)
+    elif opts.get('--json', False):
+        print(json.dumps(plan, indent=2, sort_keys=True))
+    else:
+        for p in plan:
+            if 'error' in p:
+                print("{0}: {1}".format(p['path'], p['error']))
+            else:
+                print("{0}: {1} -> {2}".format(p['path'], p['old'], p['new']))
+
+
+# -----------------------------------------------------------------------------
+def bv_plan(paths, opts):
+    """
+    Work out the bump for each of *paths*. Return a list of dicts (path, old,
+    new, start, end, locator) in the order of *paths*; a target that can't be
+    bumped gets (path, error) instead.
+    """
+    rval = []
+    for p in api.plan(paths, bv_part(opts)):
+        rval.append(dict((k, v) for (k, v) in p._asdict().items()
+                         if v is not None))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def bv_part(opts):
+    """
+    Which version component do the bv options in *opts* select?
+    """
+    for part in api.PARTS:
+        if opts.get('--' + part, False):
+            return part
+    return 'build'
 
 
 # -----------------------------------------------------------------------------
 def gitr_depth(opts):
     """Report the number of commits back to a given one and its age
     """
-    print("Coming soon: report the number steps back to a given commit")
+    fmt = out_format(opts)
+    if opts.get('--in'):
+        depth_in(opts, fmt)
+        return
+    if opts.get('--stats'):
+        depth_stats(opts, fmt)
+        return
+    try:
+        d = api.depth(opts['<commitish>'])
+    except api.GitrError as e:
+        sys.exit(str(e))
+    age = max(0, int(time.time()) - d.time)
+    if fmt != 'text':
+        output.write_all(fmt, DEPTH_FIELDS, [dict(d._asdict(), age=age)])
+    elif d.ancestor:
+        print("{0} ({1}) is {2} commit{3} back from HEAD, {4} old"
+              "".format(d.commitish, d.commit[:12], d.commits,
+                        '' if d.commits == 1 else 's', age_text(age)))
+    else:
+        print("{0} ({1}) is not in the history of HEAD; HEAD has {2} "
+              "commit{3} it doesn't, and it is {4} old"
+              "".format(d.commitish, d.commit[:12], d.commits,
+                        '' if d.commits == 1 else 's', age_text(age)))
+
+
+# -----------------------------------------------------------------------------
+def depth_in(opts, fmt):
+    """
+    Report whether <commitish> (or each one read from stdin, for '-') is in
+    each of the --in refs, and how far back
+    """
+    commitishes = [opts['<commitish>']]
+    if commitishes == ['-']:
+        commitishes = [line.strip() for line in sys.stdin if line.strip()]
+    refs = [r.strip() for r in opts['--in'].split(',') if r.strip()]
+    try:
+        found = api.depth_in(commitishes, refs)
+    except api.GitrError as e:
+        sys.exit(str(e))
+    if fmt != 'text':
+        output.write_all(fmt, REF_DEPTH_FIELDS, (r._asdict() for r in found))
+        return
+    for r in found:
+        if r.contained:
+            print("{0} ({1}) is in {2}, {3} commit{4} back"
+                  "".format(r.commitish, r.commit[:12], r.ref, r.commits,
+                            '' if r.commits == 1 else 's'))
+        else:
+            print("{0} ({1}) is not in {2}".format(r.commitish,
+                                                   r.commit[:12], r.ref))
+
+
+# -----------------------------------------------------------------------------
+def depth_stats(opts, fmt):
+    """
+    Report how many commits are in the range <commitish>, how old they are,
+    and how many were made per day
+    """
+    try:
+        st = api.depth_stats(opts['<commitish>'])
+    except api.GitrError as e:
+        sys.exit(str(e))
+    age = None if st.first is None else max(0, int(time.time()) - st.first)
+    if fmt != 'text':
+        output.write_all(fmt, STATS_FIELDS, [dict(st._asdict(), age=age)])
+    elif not st.commits:
+        print("{0}: no commits".format(st.range))
+    else:
+        print("{0}: {1} commit{2} over {3} day{4}, {5:.1f} per day; busiest "
+              "{6} with {7}; the oldest is {8} old"
+              "".format(st.range, st.commits, '' if st.commits == 1 else 's',
+                        st.days, '' if st.days == 1 else 's', st.per_day,
+                        st.busiest, st.busiest_commits, age_text(age)))
+
+
+# -----------------------------------------------------------------------------
+def age_text(seconds):
+    """
+    *seconds* as a rough age: '3 days', '1 hour', '20 seconds'
+    """
+    for (unit, size) in [('year', 365 * 86400), ('day', 86400),
+                         ('hour', 3600), ('minute', 60)]:
+        if size <= seconds:
+            n = seconds // size
+            return '{0} {1}{2}'.format(n, unit, '' if n == 1 else 's')
+    return '{0} second{1}'.format(seconds, '' if seconds == 1 else 's')
 
 
 # -----------------------------------------------------------------------------
 def gitr_dunn(opts):
     """Suggest the next step based on the state of the repository
     """
-    print("Git'r Dunn: I dunno, maybe do a commit?")
-    print("This is a temporary test entrypoint. It will become a plugin")
-    print("Coming soon - an oracle to suggest the next step given the state")
-    print("of the repository")
+    say(opts, ["Git'r Dunn: I dunno, maybe do a commit?",
+               "This is a temporary test entrypoint. It will become a plugin",
+               "Coming soon - an oracle to suggest the next step given the "
+               "state",
+               "of the repository"])
 
 
 # -----------------------------------------------------------------------------
 def gitr_dupl(opts):
     """Report duplicate function names
     """
-    print("Coming soon: duplicate function detector")
+    fmt = out_format(opts)
+    if opts.get('--similar'):
+        return dupl_similar(fmt)
+    if opts.get('--history'):
+        return dupl_history(opts.get('--rev') or 'HEAD', fmt)
+    if opts.get('--rev'):
+        return rev_series(opts['--rev'], 'dupl', 'duplicated', fmt)
+    try:
+        dups = api.dupl()
+    except api.GitrError as e:
+        sys.exit(str(e))
+    if fmt != 'text':
+        output.write_all(fmt, DUPL_FIELDS,
+                         (dict(f._asdict(), name=name)
+                          for name in dups for f in dups[name]))
+        return
+    for name in dups:
+        print(name)
+        for f in dups[name]:
+            print("    {0}:{1}".format(f.path, f.lineno))
+
+
+# -----------------------------------------------------------------------------
+def dupl_history(rev, fmt='text'):
+    """Report when and where the names duplicated at the end of *rev* came
+    from
+    """
+    try:
+        dups = api.dupl_history(rev)
+    except api.GitrError as e:
+        sys.exit(str(e))
+    if fmt != 'text':
+        output.write_all(fmt, HISTORY_FIELDS,
+                         (dict(f._asdict(), name=d.qualname, since=d.since,
+                               since_time=d.since_time)
+                          for d in dups for f in d.paths))
+        return
+    for d in dups:
+        print("{0} duplicated since {1} {2}"
+              "".format(d.qualname, d.since[:12], stamp(d.since_time)))
+        for f in d.paths:
+            moved = " (from {0})".format(f.moved_from) if f.moved_from else ""
+            print("    {0} {1} {2}{3}".format(f.path, f.first[:12],
+                                              stamp(f.first_time), moved))
+
+
+# -----------------------------------------------------------------------------
+def dupl_similar(fmt='text'):
+    """Report structurally similar pairs of functions
+    """
+    try:
+        pairs = api.similar()
+    except api.GitrError as e:
+        sys.exit(str(e))
+    if fmt != 'text':
+        output.write_all(fmt, SIMILAR_FIELDS,
+                         (similar_record(p) for p in pairs))
+        return
+    for p in pairs:
+        print("{0:.2f} {1}:{2} {3} ~ {4}:{5} {6}"
+              "".format(p.score, p.a.path, p.a.lineno, p.a.qualname,
+                        p.b.path, p.b.lineno, p.b.qualname))
 
 
 # -----------------------------------------------------------------------------
 def gitr_flix(opts):
     """Report conflicts
     """
-    print("Coming soon: conflict reporter")
+    fmt = out_format(opts)
+    if opts.get('--auto'):
+        return flix_auto(opts.get('<target>'), fmt)
+    try:
+        hunks = api.flix(target=opts.get('<target>'))
+    except api.GitrError as e:
+        sys.exit(str(e))
+    if fmt != 'text':
+        output.write_all(fmt, FLIX_FIELDS,
+                         (dict(h._asdict(),
+                               ours=(h.base or h.sep) - h.start - 1,
+                               theirs=h.end - h.sep - 1) for h in hunks))
+        return
+    for h in hunks:
+        print("{0}:{1}: conflict ({2} lines ours, {3} lines theirs){4}"
+              .format(h.path, h.start, (h.base or h.sep) - h.start - 1,
+                      h.end - h.sep - 1,
+                      "; resolved before" if h.known else ""))
+    if not hunks:
+        print("No conflicts found")
+
+
+# -----------------------------------------------------------------------------
+def flix_auto(target=None, fmt='text'):
+    """Resolve trivial conflicts and report what was done with each file
+    """
+    try:
+        results = api.flix_auto(target=target)
+    except api.GitrError as e:
+        sys.exit(str(e))
+    if fmt != 'text':
+        output.write_all(fmt, AUTO_FIELDS,
+                         (dict(r._asdict(), rules=','.join(r.rules))
+                          for r in results))
+        return
+    for r in results:
+        if r.resolved:
+            print("{0}: resolved {1} of {1} conflicts ({2})"
+                  .format(r.path, r.conflicts, ', '.join(r.rules)))
+        elif r.conflicts:
+            print("{0}: {1} of {2} conflicts trivial; left as is"
+                  .format(r.path, len(r.rules), r.conflicts))
+        else:
+            print("{0}: left as is ({1})".format(r.path, r.reason))
+    if not results:
+        print("No conflicts found")
+        return
+    print("auto-resolved {0} of {1} files"
+          .format(sum(1 for r in results if r.resolved), len(results)))
 
 
 # -----------------------------------------------------------------------------
 def gitr_hook(opts):
     """Manage git hooks
     """
-    print("Coming soon: hook management")
+    say(opts, ["Coming soon: hook management"])
+
+
+# -----------------------------------------------------------------------------
+def gitr_multi(opts):
+    """Run a gitr subcommand across many repositories
+    """
+    repos = multi_repos(opts['<repolist>'])
+    argv = opts['<args>']
+    if argv[0] in ['multi', '-d', '--debug'] or '-d' in argv or \
+       '--debug' in argv:
+        sys.exit("gitr multi can't run '{0}'".format(' '.join(argv)))
+    fmt = 'jsonl' if opts.get('--json', False) else out_format(opts)
+    jobs = int(opts.get('--jobs') or 0) or None
+    pool = multiprocessing.Pool(jobs)
+    failed = 0
+    w = None if fmt == 'text' else output.writer(fmt, MULTI_FIELDS, batch=1)
+    try:
+        for res in pool.imap_unordered(multi_worker,
+                                       [(r, argv) for r in repos]):
+            failed += res['status'] != 'ok'
+            multi_report(res, w)
+    finally:
+        pool.close()
+        pool.join()
+        if w is not None:
+            w.close()
+    if failed:
+        sys.exit('gitr multi: {0} of {1} repos failed'.format(failed,
+                                                              len(repos)))
+
+
+# -----------------------------------------------------------------------------
+def multi_repos(repolist):
+    """
+    Read the repository paths from file *repolist* (blank lines and #
+    comments are ignored) and return them largest first, where size is the
+    number of entries in the repo's index
+    """
+    repos = []
+    for line in tbx.contents(repolist, type=list):
+        line = line.split('#', 1)[0].strip()
+        if line:
+            repos.append(line)
+    return sorted(repos, key=lambda r: (-api.index_entry_count(r), r))
+
+
+# -----------------------------------------------------------------------------
+def multi_report(res, w=None):
+    """
+    Write one repo's result from gitr multi to stdout, through output writer
+    *w* if there is one
+    """
+    if w is not None:
+        w.write(res)
+    else:
+        for line in res['output'].splitlines():
+            sys.stdout.write('{0}: {1}\n'.format(res['repo'], line))
+        if res['status'] != 'ok':
+            sys.stdout.write('{0}: ERROR: {1}\n'.format(res['repo'],
+                                                        res['error']))
+    sys.stdout.flush()
+
+
+# -----------------------------------------------------------------------------
+def multi_worker(job):
+    """
+    In a pool process, run the gitr command line *argv* in *repo* and return
+    a dict with the repo, status ('ok' or 'error'), the captured output, and
+    the error message if any. A subcommand calling sys.exit() with a message
+    counts as an error.
+    """
+    (repo, argv) = job
+    res = {'repo': repo, 'status': 'ok', 'output': '', 'error': ''}
+    buf = StringIO()
+    (stdout, sys.stdout) = (sys.stdout, buf)
+    try:
+        with tbx.chdir(repo):
+            dispatch(docopt.docopt(sys.modules[__name__].__doc__, argv))
+    except SystemExit as e:
+        if e.code not in [None, 0, '']:
+            res.update(status='error', error=str(e.code))
+    except Exception as e:
+        res.update(status='error', error='{0}: {1}'.format(type(e).__name__,
+                                                           e))
+    finally:
+        sys.stdout = stdout
+    res['output'] = buf.getvalue()
+    return res
 
 
 # -----------------------------------------------------------------------------
 def gitr_nodoc(opts):
     """Report functions with no docstring
     """
-    print("Coming soon: find and report functions with no docstring")
+    fmt = out_format(opts)
+    if opts.get('--rev'):
+        return rev_series(opts['--rev'], 'nodoc', 'undocumented', fmt)
+    try:
+        funcs = api.iter_nodoc(since=opts.get('--since'))
+        if fmt != 'text':
+            output.write_all(fmt, NODOC_FIELDS,
+                             (f._asdict() for f in funcs))
+            return
+        for f in funcs:
+            print("{0}:{1}: {2}".format(f.path, f.lineno, f.qualname))
+    except api.GitrError as e:
+        sys.exit(str(e))
+
+
+# -----------------------------------------------------------------------------
+def rev_series(rev, field, label, fmt='text'):
+    """Report *field* of api.history() for each commit in *rev*
+    """
+    try:
+        if fmt != 'text':
+            output.write_all(fmt, ['commit', 'time', 'functions', field],
+                             (r._asdict() for r in api.history(rev)))
+            return
+        for r in api.history(rev):
+            print("{0} {1} {2} functions, {3} {4}"
+                  "".format(r.commit[:12], stamp(r.time), r.functions,
+                            getattr(r, field), label))
+    except api.GitrError as e:
+        sys.exit(str(e))
 
 
 # -----------------------------------------------------------------------------
-def find_repo_root():
+def stamp(when):
     """
-    Starting from '.', step up until we find a git repo. Return a git.Repo
-    object initialized from it
+    Local date and time for *when* (seconds since the epoch)
     """
-    loc = os.getcwd()
-    clue = os.path.join(loc, '.git')
-    while not os.path.isdir(clue) and 1 < len(loc):
-        loc = os.path.dirname(loc)
-        clue = os.path.join(loc, '.git')
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(when))
 
-    if os.path.isdir(clue):
-        return(loc)
-    else:
-        raise git.InvalidGitRepositoryError(clue)
+
+# -----------------------------------------------------------------------------
+def version_diff(root, target, use_git=False):
+    """
+    Write the diff of *target* (relative to *root*) to stdout. It's rendered
+    in-process unless *use_git* is set (or HEAD lacks *target*), in which
+    case git's output is copied through as it comes.
+    """
+    if not use_git:
+        try:
+            sys.stdout.write(''.join(api.version_patch(root, target)))
+            return
+        except api.NotFound:
+            pass
+    proc = git.Repo(root).git.diff(target, as_process=True)
+    try:
+        output.copy_lines(proc.stdout)
+    finally:
+        proc.wait()
 
 
 # -----------------------------------------------------------------------------
-def version_diff(repo, target):
+def out_format(opts):
     """
-    Get the diff of target and write it to stdout
+    Return the --format in *opts*, complaining if it's not one we know
     """
-    txt = repo.git.diff(target)
-    print(txt)
+    fmt = opts.get('--format') or 'text'
+    if fmt not in output.FORMATS:
+        sys.exit("--format must be one of {0}".format(
+            ', '.join(output.FORMATS)))
+    return fmt
 
 
 # -----------------------------------------------------------------------------
-def version_increment(iv, opts):
+def say(opts, lines):
     """
-    Given a version array in *p*, return the incremented value.
+    Print *lines* of text, or write them as records with a message field in
+    the --format asked for
     """
-    def strinc(sn):
-        """
-        Increment a numeric string or blow up
-        """
-        return str(int(sn) + 1)
-
-    ov = []
-    if opts.get('--major', False):
-        ov = [strinc(iv[0]), '0', '0']
-        ov_final = '.'.join(ov)
-    elif opts.get('--minor', False):
-        ov = [iv[0], strinc(iv[1]), '0']
-    elif opts.get('--patch', False):
-        ov = [iv[0], iv[1], strinc(iv[2])]
+    fmt = out_format(opts)
+    if fmt == 'text':
+        for line in lines:
+            print(line)
     else:
-        ov = iv[:]
-        if 3 == len(ov):
-            ov.append('1')
-        elif 4 == len(ov):
-            ov = iv[0:3] + [strinc(iv[3])]
-        else:
-            v = '.'.join(ov)
-            sys.exit("'{0}' is not a recognized version format".format(v))
-    return ov
+        output.write_all(fmt, ['message'],
+                         (dict(message=line) for line in lines))
 
 
 # -----------------------------------------------------------------------------
-def version_update(target, new, old=None):
+def similar_record(pair):
     """
-    Given a target path and new version array, write out the new version.
+    Flatten an api.Similar into a dict for output
+    """
+    rval = {'score': pair.score}
+    for (side, f) in [('a', pair.a), ('b', pair.b)]:
+        for field in ['path', 'lineno', 'qualname']:
+            rval['{0}_{1}'.format(side, field)] = getattr(f, field)
+    return rval
+
 
-    If target is empty, write one line: '__version__ = '<new>''
+# -----------------------------------------------------------------------------
+def version_increment(iv, opts):
+    """
+    Given a version array in *p*, return the incremented value.
+    """
+    try:
+        return api.increment(iv, bv_part(opts))
+    except api.GitrError as e:
+        sys.exit(str(e))
 
-    If old is not None, format and find it in target's contents and replace it
-    with the new version.
 
-    If target is not empty and old and is not found, fail and complain.
+# -----------------------------------------------------------------------------
+def version_update(target, new, old=None, occurrence=1, span=None):
     """
-    news = '.'.join(new)
-    c = tbx.contents(target, default='')
-    with open(target, 'w') as f:
-        if not old:
-            if not c:
-                f.write("__version__ = '{0}'\n".format(news))
-            else:
-                sys.exit("Don't know where to put '{0}' in '{1}'".format(news,
-                                                                         c))
-        else:
-            olds = '.'.join(old)
-            if not c:
-                sys.exit("Can't update '{0}' in an empty file".format(olds))
-            elif olds in c:
-                f.write(c.replace(olds, news))
-            else:
-                sys.exit("'{0}' not found in '{1}'".format(olds, c))
+    Given a target path and new version array, write out the new version.
+    See api.update() for the details; here, failures exit with a message.
+    """
+    try:
+        api.update(target, new, old, occurrence, span)
+    except api.GitrError as e:
+        sys.exit(str(e))
@@ -0,0 +1,183 @@
+"""
+Per-file analyses for nodoc, dupl, and flix
+
+An analyzer takes the contents of a file (bytes) and returns a plain,
+JSON-friendly result. Each has a version number that is bumped whenever its
+output changes, so cached results (see cache.BlobCache) from an older
+analyzer are never reused. Results are kept apart by python version too,
+since what parses (and so what's found) depends on the interpreter.
+"""
+import ast
+import os
+import sys
+
+import gitindex
+import similar
+
+MARK_OURS = b'<<<<<<< '
+MARK_BASE = b'||||||| '
+MARK_SEP = b'======='
+MARK_THEIRS = b'>>>>>>> '
+
+
+# -----------------------------------------------------------------------------
+def functions(data):
+    """
+    Return a list of [qualname, name, lineno, end_lineno, has_docstring] for
+    each function and method defined in python source *data*. A file that
+    doesn't parse has no functions.
+    """
+    try:
+        tree = ast.parse(data)
+    except (SyntaxError, ValueError, TypeError):
+        return []
+    rval = []
+    _walk_defs(tree, '', rval)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def shapes(data):
+    """
+    Like functions(), but each entry has a sixth element: the MinHash
+    signature of the function's body (see similar.py), or None if the body
+    is too small to be worth comparing
+    """
+    try:
+        tree = ast.parse(data)
+    except (SyntaxError, ValueError, TypeError):
+        return []
+    rval = []
+    _walk_defs(tree, '', rval, shaped=True)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def _walk_defs(node, prefix, rval, shaped=False):
+    """
+    Collect the functions under *node*, qualifying names with *prefix*. With
+    *shaped*, add each one's signature.
+    """
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, _FUNCTION_TYPES):
+            qual = prefix + child.name
+            rec = [qual, child.name, child.lineno, _end_lineno(child),
+                   ast.get_docstring(child) is not None]
+            if shaped:
+                rec.append(similar.signature(similar.shape(child)))
+            rval.append(rec)
+            _walk_defs(child, qual + '.', rval, shaped)
+        elif isinstance(child, ast.ClassDef):
+            _walk_defs(child, prefix + child.name + '.', rval, shaped)
+        else:
+            _walk_defs(child, prefix, rval, shaped)
+
+
+# -----------------------------------------------------------------------------
+def _end_lineno(node):
+    """
+    The last line of *node*: end_lineno where python records it, otherwise
+    the highest line number of anything inside it
+    """
+    end = getattr(node, 'end_lineno', None)
+    if end is not None:
+        return end
+    return max(getattr(n, 'lineno', 0) for n in ast.walk(node))
+
+
+_FUNCTION_TYPES = tuple(getattr(ast, n) for n in ['FunctionDef',
+                                                  'AsyncFunctionDef']
+                        if hasattr(ast, n))
+
+
+# -----------------------------------------------------------------------------
+def conflicts(data):
+    """
+    Return a list of [start, base, sep, end] line numbers (1-based) for each
+    conflict hunk in *data*: the '<<<<<<<' line, the '|||||||' line (0 if the
+    hunk has no base section), the '=======' line, and the '>>>>>>>' line.
+    Unterminated hunks are ignored.
+    """
+    rval = []
+    hunk = None
+    for n, line in enumerate(data.splitlines(), 1):
+        if line.startswith(MARK_OURS):
+            hunk = [n, 0, 0, 0]
+        elif hunk is None:
+            continue
+        elif line.startswith(MARK_BASE) and not hunk[2]:
+            hunk[1] = n
+        elif line.rstrip() == MARK_SEP and not hunk[2]:
+            hunk[2] = n
+        elif line.startswith(MARK_THEIRS) and hunk[2]:
+            hunk[3] = n
+            rval.append(hunk)
+            hunk = None
+    return rval
+
+
+# name -> (function, version)
+ANALYZERS = {'functions': (functions, 1),
+             'conflicts': (conflicts, 1),
+             'shapes': (shapes, 1),
+             }
+
+# part of every cached result's version: python 2 and 3 (and minor versions)
+# don't parse the same source the same way
+PYTHON = 'py{0}{1}'.format(*sys.version_info[:2])
+
+
+# -----------------------------------------------------------------------------
+def run(cache, name, sha, read):
+    """
+    Return analyzer *name*'s result for the blob *sha*, from *cache* (a
+    cache.BlobCache, or None for no caching) if it's there. Otherwise call
+    *read*() for the blob's contents, analyze them, and cache the result.
+    """
+    (func, version) = ANALYZERS[name]
+    version = '{0}-{1}'.format(version, PYTHON)
+    if cache is not None:
+        hit = cache.get(sha, name, version)
+        if hit is not None:
+            return hit
+    rval = func(read())
+    if cache is not None:
+        cache.put(sha, name, version, rval)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def worktree_blobs(root, paths, git_dir=None):
+    """
+    Generate (path, sha, read) for each of *paths* (relative to *root*) that
+    exists in the working tree. *sha* is the blob id of the file's current
+    contents -- taken from the index (in *git_dir*, by default *root*/.git)
+    when the file's stat data shows it's unchanged, computed otherwise --
+    and read() returns those contents.
+    """
+    git_dir = git_dir or os.path.join(root, '.git')
+    with gitindex.Index(os.path.join(git_dir, 'index')) as idx:
+        for path in paths:
+            full = os.path.join(root, path)
+            if not os.path.isfile(full):
+                continue
+            ents = [e for e in idx.find(path) if e.stage == 0]
+            if ents and not gitindex.worktree_changed(idx, ents[0], full):
+                sha = ents[0].sha
+            else:
+                sha = gitindex.file_sha(full, os.lstat(full))
+            yield (path, sha, _reader(full))
+
+
+# -----------------------------------------------------------------------------
+def _reader(path):
+    """
+    Return a function that reads *path*
+    """
+    def read():
+        """
+        Read the file
+        """
+        with open(path, 'rb') as f:
+            return f.read()
+    return read
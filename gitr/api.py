@@ -0,0 +1,1497 @@
+"""
+gitr as a library
+
+Everything here reports trouble by raising a GitrError subclass and reports
+success by returning a result object, so gitr can be called in-process as
+often as a long-running host likes. The gitr command line is a thin wrapper
+that prints the results and turns GitrErrors into sys.exit() messages.
+
+    import gitr.api
+    try:
+        res = gitr.api.bump('version.py', part='minor')
+        print('{0} -> {1}'.format(res.old, res.new))
+    except gitr.api.AlreadyBumped:
+        ...
+"""
+import collections
+import fnmatch
+import hashlib
+import heapq
+import json
+import os
+import shutil
+import sys
+import time
+
+import analyze
+import cache
+import files
+import gitindex
+import locator
+import odb
+import plumb
+import reach
+import similar as simlib
+import symtab
+import tbx
+import udiff
+
+# GitPython is only loaded by the commands that use it
+git = tbx.lazy_import('git')
+
+# and conflict resolution only by flix; these are modules of our own, so
+# they're imported from whatever package we're in
+rerere = tbx.lazy_import('rerere', __name__.rpartition('.')[0])
+resolve = tbx.lazy_import('resolve', __name__.rpartition('.')[0])
+
+PARTS = ['major', 'minor', 'patch', 'build']
+
+# repos with more tracked files than this get a hint about fsmonitor and the
+# untracked cache when those are not configured
+STATUS_HINT_THRESHOLD = 50000
+
+# how many symbol tables (one per state of the tree) dupl keeps on disk
+SYMTAB_KEEP = 4
+
+
+# -----------------------------------------------------------------------------
+class GitrError(Exception):
+    """
+    Base class for everything gitr raises on purpose
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class NotARepo(GitrError):
+    """
+    The target is not in a git repository
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class NotFound(GitrError):
+    """
+    The target file (or ref) doesn't exist
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class AlreadyBumped(GitrError):
+    """
+    The target already has uncommitted changes
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class NoVersion(GitrError):
+    """
+    No version string could be found in the target
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class BadVersion(GitrError):
+    """
+    The version string is not in a format we know how to increment
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class UpdateError(GitrError):
+    """
+    The new version could not be written into the target
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class CheckedOut(GitrError):
+    """
+    The ref is checked out in a working tree, so moving it behind the
+    tree's back would leave the tree out of step with it
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class NotABranch(GitrError):
+    """
+    The ref is a tag, a remote-tracking ref, or anything else that isn't a
+    branch, so it shouldn't be moved to a new commit
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class GitFailed(GitrError):
+    """
+    A git command we ran failed
+    """
+    pass
+
+
+# a function found by nodoc()/dupl(); *path* is relative to the repo root and
+# *doc* says whether it has a docstring
+Function = collections.namedtuple('Function',
+                                  ['path', 'qualname', 'name', 'lineno',
+                                   'end', 'doc'])
+
+# where a qualified name is defined, as dupl_history() found: the commit
+# that brought it to *path* (made at *first_time*), the last commit walked
+# that still has it there, and the path it was moved from (or None)
+FirstSeen = collections.namedtuple('FirstSeen',
+                                   ['path', 'qualname', 'first', 'first_time',
+                                    'last', 'moved_from'])
+
+# a name dupl_history() reports: defined more than once ever since commit
+# *since* (made at *since_time*), at *paths* (a list of FirstSeen)
+DuplHistory = collections.namedtuple('DuplHistory',
+                                     ['qualname', 'since', 'since_time',
+                                      'paths'])
+
+# a pair of structurally similar Functions found by similar(); *score* is
+# their estimated similarity, 0.0 to 1.0
+Similar = collections.namedtuple('Similar', ['score', 'a', 'b'])
+
+# one point of history()'s time series: how many functions commit *commit*
+# (made at *time*, seconds since the epoch) has, how many of them have no
+# docstring, and how many qualified names are defined more than once
+RevStats = collections.namedtuple('RevStats',
+                                  ['commit', 'time', 'functions', 'nodoc',
+                                   'dupl'])
+
+# the result of depth(): *commit* is what *commitish* names; *commits* is
+# how many commits HEAD has that it doesn't (git rev-list --count
+# commitish..HEAD); *ancestor* says whether it's in HEAD's history at all;
+# *time* is its commit time (seconds since the epoch)
+Depth = collections.namedtuple('Depth',
+                               ['commitish', 'commit', 'commits', 'ancestor',
+                                'time'])
+
+# one answer from depth_in(): whether *commit* (what *commitish* names) is in
+# the history of *ref* (whose tip is *tip*) and how many commits *ref* has
+# that it doesn't
+RefDepth = collections.namedtuple('RefDepth',
+                                  ['commitish', 'commit', 'ref', 'tip',
+                                   'contained', 'commits'])
+
+# the result of depth_stats(): how many *commits* are in *range*, the
+# earliest and latest of their commit times, how many (UTC) calendar days
+# those span, the average commits per day over them, and the *busiest* day
+# ('YYYY-MM-DD') with how many commits it saw
+DepthStats = collections.namedtuple('DepthStats',
+                                    ['range', 'commits', 'first', 'last',
+                                     'days', 'per_day', 'busiest',
+                                     'busiest_commits'])
+
+# a conflict hunk found by flix(): line numbers of the '<<<<<<<', '|||||||'
+# (0 if there's no base section), '=======', and '>>>>>>>' lines, and
+# whether the hunk has a *known* resolution
+Conflict = collections.namedtuple('Conflict',
+                                  ['path', 'start', 'base', 'sep', 'end',
+                                   'known'])
+
+# what flix_auto() made of a conflicted file: how many *conflicts* merging
+# its index stages found, the *rules* (see resolve.RULES) that settled
+# those it could, and whether it was *resolved* (rewritten and staged) or,
+# for *reason*, left as it was
+AutoResolved = collections.namedtuple('AutoResolved',
+                                      ['path', 'conflicts', 'rules',
+                                       'resolved', 'reason'])
+
+# the outcome of bump(): *root* is the repo root and *relpath* the target
+# relative to it; *created* means the target didn't exist and was started at
+# 0.0.0 (so *old* is None)
+BumpResult = collections.namedtuple('BumpResult',
+                                    ['path', 'root', 'relpath', 'old', 'new',
+                                     'created'])
+
+# the outcome of bump_ref(): *commit* is the new commit; *ref* is the full
+# name of the ref that was moved to it, or None if none was
+RefBumpResult = collections.namedtuple('RefBumpResult',
+                                       ['path', 'old', 'new', 'commit',
+                                        'ref'])
+
+# one entry of plan(); *error* is None unless the target can't be bumped, in
+# which case the other fields (but *path*) are None
+BumpPlan = collections.namedtuple('BumpPlan',
+                                  ['path', 'old', 'new', 'start', 'end',
+                                   'locator', 'error'])
+
+
+# -----------------------------------------------------------------------------
+def bump(path=None, part='build'):
+    """
+    Bump the *part* component of the version in *path* (default
+    'version.py') and return a BumpResult.
+
+    A *path* with no '/' that doesn't exist is looked for in the tree below
+    '.'. A *path* with a '/' that doesn't exist is created, with version
+    0.0.0.
+    """
+    target = path or 'version.py'
+    if not os.path.exists(target):
+        if '/' in target:
+            td = tbx.dirname(target)
+            if not os.path.exists(td):
+                os.makedirs(td)
+            update(target, ['0', '0', '0'])
+            return BumpResult(target, None, None, None, '0.0.0', True)
+        tl = discover_targets(target)
+        if tl == []:
+            raise NotFound('{0} not found'.format(target))
+        target = tl[0]
+
+    try:
+        repo_root = find_repo_root()
+    except git.InvalidGitRepositoryError:
+        raise NotARepo('{0} is not in a git repo'.format(target))
+    # compute the target path relative to the repo root
+    repo_rel_target = os.path.relpath(os.path.abspath(target), repo_root)
+    if target_status(repo_root, repo_rel_target).strip() != '':
+        raise AlreadyBumped('{0} is already bumped'.format(repo_rel_target))
+
+    m = locator.locate(target)
+    if m is None:
+        raise NoVersion("No version found in {0} ['{1}']"
+                        .format(target, version_excerpt(target)))
+    iv = m.version.split('.')
+    ov = increment(iv, part)
+    update(target, ov, iv, span=(m.start, m.end))
+    return BumpResult(target, repo_root, repo_rel_target, m.version,
+                      '.'.join(ov), False)
+
+
+# -----------------------------------------------------------------------------
+def bump_ref(ref, path=None, part='build', git_dir=None):
+    """
+    Bump the version in *path* on branch *ref* without a working tree and
+    return a RefBumpResult. The new blob, the trees above it, and a commit on
+    top of the ref's tip are written with git's plumbing and the ref is moved
+    to the new commit (if *ref* names a commit rather than a ref, the new
+    commit is just returned). Only branches (refs/heads/) are moved; other
+    refs, tags say, are refused with NotABranch. As with 'git branch -f', a
+    branch checked out in any working tree is refused with CheckedOut.
+    """
+    target = path or 'version.py'
+    try:
+        git_dir = git_dir or plumb.find_git_dir()
+    except git.InvalidGitRepositoryError:
+        raise NotARepo('{0} is not in a git repo'.format(target))
+    try:
+        commit = plumb.rev_parse(git_dir, ref + '^{commit}')
+    except git.GitCommandError:
+        raise NotFound('{0} is not a commit'.format(ref))
+
+    if '/' not in target:
+        hits = plumb.find_in_tree(git_dir, commit, target)
+        if not hits:
+            raise NotFound('{0} not found'.format(target))
+        target = hits[0]
+    try:
+        (mode, sha, data) = plumb.read_blob(git_dir, commit, target)
+    except (KeyError, git.GitCommandError):
+        raise NotFound('{0} not found'.format(target))
+
+    m = locator.search(data, locator.locator_for(target))
+    if m is None:
+        raise NoVersion("No version found in {0}:{1}".format(ref, target))
+    news = '.'.join(increment(m.version.split('.'), part))
+
+    try:
+        full = plumb.full_ref(git_dir, ref)
+        if full and not full.startswith('refs/heads/'):
+            raise NotABranch('{0} ({1}) is not a branch'.format(ref, full))
+        if full in plumb.checked_out(git_dir):
+            raise CheckedOut('{0} is checked out; bump it there without'
+                             ' --ref'.format(ref))
+        blob = plumb.write_blob(git_dir, data[:m.start] + news.encode() +
+                                data[m.end:])
+        tree = plumb.replace_blob(git_dir, commit + '^{tree}', target, mode,
+                                  blob)
+        new = plumb.commit_tree(git_dir, tree, commit,
+                                'Bump version to {0}'.format(news))
+        if full:
+            plumb.update_ref(git_dir, full, new, commit)
+        else:
+            full = None
+    except git.GitCommandError as e:
+        raise GitFailed(str(e))
+    return RefBumpResult(target, m.version, news, new, full)
+
+
+# -----------------------------------------------------------------------------
+def plan(paths, part='build', workers=8):
+    """
+    Work out the bump for each of *paths* in parallel without changing
+    anything. Return a list of BumpPlans in the order of *paths*.
+    """
+    def plan_one(path):
+        """
+        Plan the bump for one target
+        """
+        try:
+            m = locator.locate(path)
+            if m is None:
+                raise NoVersion('no version found')
+            ov = increment(m.version.split('.'), part)
+        except (IOError, OSError, GitrError) as e:
+            return BumpPlan(path, None, None, None, None, None, str(e))
+        return BumpPlan(path, m.version, '.'.join(ov), m.start, m.end,
+                        m.locator, None)
+
+    if not paths:
+        return []
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(1, min(workers, len(paths))))
+    try:
+        return pool.map(plan_one, paths)
+    finally:
+        pool.close()
+
+
+# -----------------------------------------------------------------------------
+def depth(commitish, root=None):
+    """
+    Return a Depth saying how far back from HEAD *commitish* is, in the repo
+    at *root* (default: the one we're in). Commits are read in-process; git
+    is only asked to make sense of *commitish* if we can't.
+    """
+    try:
+        git_dir = plumb.find_git_dir(root)
+    except git.InvalidGitRepositoryError:
+        raise NotARepo('{0} is not in a git repo'.format(root or os.getcwd()))
+    with odb.ObjectDB(git_dir) as db:
+        try:
+            head = db.rev_parse('HEAD')
+        except KeyError:
+            raise NotFound('HEAD is not a commit')
+        target = _commit_named(db, commitish)
+        try:
+            (count, ancestor) = _count_between(db, target, head)
+            when = db.commit(target).commit_time
+        except KeyError as e:
+            raise _missing(e)
+    return Depth(commitish, target, count, ancestor, when)
+
+
+# -----------------------------------------------------------------------------
+def depth_in(commitishes, refs, root=None):
+    """
+    Return a RefDepth for each of *commitishes* against each of *refs*, in
+    the repo at *root* (default: the one we're in). A ref containing '*',
+    '?', or '[' is matched against the names of the repo's refs, with or
+    without their refs/heads/, refs/tags/, or refs/remotes/ prefix; other
+    entries can be anything that names a commit. The questions are answered
+    together by a reach.Engine, so thousands of commits against a few refs
+    cost little more than one walk of each ref's history.
+    """
+    try:
+        git_dir = plumb.find_git_dir(root)
+    except git.InvalidGitRepositoryError:
+        raise NotARepo('{0} is not in a git repo'.format(root or os.getcwd()))
+    rval = []
+    with odb.ObjectDB(git_dir) as db:
+        tips = _ref_tips(db, refs)
+        engine = reach.Engine(db)
+        for commitish in commitishes:
+            sha = _commit_named(db, commitish)
+            for (name, tip) in tips:
+                try:
+                    (contained, count) = engine.distance(tip, sha)
+                except KeyError as e:
+                    raise _missing(e)
+                rval.append(RefDepth(commitish, sha, name, tip, contained,
+                                     count))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def depth_stats(rng, root=None):
+    """
+    Return DepthStats for the commits in *rng* in the repo at *root*
+    (default: the one we're in). *rng* is 'A..B' (the commits B has that A
+    doesn't; B defaults to HEAD, and with no A it's all of B's history) or
+    a commitish, meaning 'commitish..HEAD'. The commit times come from the
+    column kept with gitr's reachability index, so only commits added since
+    it was last brought up to date are read.
+    """
+    try:
+        git_dir = plumb.find_git_dir(root)
+    except git.InvalidGitRepositoryError:
+        raise NotARepo('{0} is not in a git repo'.format(root or os.getcwd()))
+    (base, tip) = rng.split('..', 1) if '..' in rng else (rng, 'HEAD')
+    with odb.ObjectDB(git_dir) as db:
+        tsha = _commit_named(db, tip or 'HEAD')
+        bsha = _commit_named(db, base) if base else None
+        try:
+            index = reach.graph_index(db)
+            engine = reach.Engine(db, index)
+            r = engine.reach(tsha)
+            (bits, extras) = (r.bits, r.extras)
+            if bsha:
+                b = engine.reach(bsha)
+                (bits, extras) = (bits & ~b.bits, extras - b.extras)
+            times = index.times(bits)
+            times.extend(db.commit(sha).commit_time for sha in extras)
+        except KeyError as e:
+            raise _missing(e)
+    if not times:
+        return DepthStats(rng, 0, None, None, 0, 0.0, None, 0)
+    days = collections.Counter(t // 86400 for t in times)
+    span = max(days) - min(days) + 1
+    (busiest, most) = min(days.items(), key=lambda kv: (-kv[1], kv[0]))
+    return DepthStats(rng, len(times), min(times), max(times), span,
+                      float(len(times)) / span,
+                      time.strftime('%Y-%m-%d', time.gmtime(busiest * 86400)),
+                      most)
+
+
+# -----------------------------------------------------------------------------
+def _missing(err):
+    """
+    The NotFound to raise for KeyError *err*, an object missing from
+    history being walked
+    """
+    return NotFound('history is incomplete: object {0} is missing'.format(
+        err.args[0] if err.args else '?'))
+
+
+# -----------------------------------------------------------------------------
+def _commit_named(db, commitish):
+    """
+    The commit *commitish* names in the repo *db* reads. git is only asked
+    to make sense of it if we can't.
+    """
+    try:
+        sha = db.peel(db.rev_parse(commitish))
+        db.commit(sha)
+        return sha
+    except KeyError:
+        pass
+    try:
+        return plumb.rev_parse(db.git_dir, commitish + '^{commit}')
+    except git.GitCommandError:
+        raise NotFound('{0} is not a commit'.format(commitish))
+
+
+# -----------------------------------------------------------------------------
+def _ref_tips(db, refs):
+    """
+    Return [(name, commit)] for *refs*, expanding patterns (see depth_in())
+    """
+    rval = []
+    names = None
+    for spec in refs:
+        if not any(c in spec for c in '*?['):
+            rval.append((spec, _commit_named(db, spec)))
+            continue
+        if names is None:
+            names = sorted(db.refs().items())
+        hits = []
+        for (full, sha) in names:
+            short = full
+            for prefix in ['refs/heads/', 'refs/tags/', 'refs/remotes/']:
+                if full.startswith(prefix):
+                    short = full[len(prefix):]
+            if fnmatch.fnmatchcase(full, spec) or \
+               fnmatch.fnmatchcase(short, spec):
+                try:
+                    hits.append((short, _commit_named(db, full)))
+                except NotFound:
+                    continue
+        if not hits:
+            raise NotFound('no refs match {0}'.format(spec))
+        rval.extend(hits)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def _count_between(db, base, tip):
+    """
+    Return (the number of commits reachable from *tip* but not from *base*,
+    whether *base* is reachable from *tip*). Commits are visited newest
+    first and the walk stops once everything left to visit is reachable from
+    *base* and no older than the oldest commit only *tip* has reached so
+    far, so only the part of history between them is read.
+    """
+    (TIP, BASE) = (1, 2)
+    flags = {tip: TIP}
+    flags[base] = flags.get(base, 0) | BASE
+    times = {}
+    oldest = [float('inf')]
+    # how many times each commit is queued, and how many queued entries are
+    # for commits only *tip* has reached, kept up to date as flags change
+    queued = {}
+    tips = [0]
+
+    def push(sha):
+        """
+        Queue *sha*, newest first
+        """
+        if sha not in times:
+            times[sha] = db.commit(sha).commit_time
+        if flags[sha] == TIP:
+            oldest[0] = min(oldest[0], times[sha])
+            tips[0] += 1
+        queued[sha] = queued.get(sha, 0) + 1
+        heapq.heappush(heap, (-times[sha], sha))
+
+    def pending():
+        """
+        Whether a commit still queued might change the count
+        """
+        return heap and (oldest[0] <= -heap[0][0] or 0 < tips[0])
+
+    heap = []
+    for sha in set([tip, base]):
+        push(sha)
+    while pending():
+        (_, sha) = heapq.heappop(heap)
+        queued[sha] -= 1
+        mark = flags[sha]
+        if mark == TIP:
+            tips[0] -= 1
+        for parent in db.commit(sha).parents:
+            old = flags.get(parent, 0)
+            if old | mark != old:
+                if old == TIP:
+                    tips[0] -= queued.get(parent, 0)
+                flags[parent] = old | mark
+                push(parent)
+    count = sum(1 for f in flags.values() if f == TIP)
+    return (count, bool(flags[base] & TIP))
+
+
+# -----------------------------------------------------------------------------
+def functions(root=None, pathspecs=None):
+    """
+    Generate a Function for each function defined in the tracked .py files
+    of the repo at *root* (default: the one we're in), limited to
+    *pathspecs* (default: the current directory)
+    """
+    (root, git_dir, pathspecs) = _scope(root, pathspecs)
+    bc = blob_cache(git_dir)
+    paths = files.tracked(root, pathspecs, ['*.py'], git_dir=git_dir)
+    for (path, sha, read) in analyze.worktree_blobs(root, paths, git_dir):
+        for f in analyze.run(bc, 'functions', sha, read):
+            yield Function(path, *f)
+
+
+# -----------------------------------------------------------------------------
+def nodoc(root=None, pathspecs=None, since=None):
+    """
+    Return the Functions that have no docstring. With *since* (a commitish),
+    only the ones that overlap lines changed since then: just the files in
+    the diff are parsed, so the work follows the size of the diff rather
+    than of the tree.
+    """
+    return list(iter_nodoc(root, pathspecs, since))
+
+
+# -----------------------------------------------------------------------------
+def iter_nodoc(root=None, pathspecs=None, since=None):
+    """
+    Generate what nodoc() returns, as it's found
+    """
+    if since is None:
+        for f in functions(root, pathspecs):
+            if not f.doc:
+                yield f
+        return
+    (root, git_dir, pathspecs) = _scope(root, pathspecs)
+    changes = changed_lines(root, since, pathspecs)
+    bc = blob_cache(git_dir)
+    for (path, sha, read) in analyze.worktree_blobs(root, sorted(changes),
+                                                    git_dir):
+        for f in analyze.run(bc, 'functions', sha, read):
+            func = Function(path, *f)
+            if not func.doc and any(start <= func.end and func.lineno <= end
+                                    for (start, end) in changes[path]):
+                yield func
+
+
+# -----------------------------------------------------------------------------
+def changed_lines(root, since, pathspecs=None):
+    """
+    Return {path: [(first, last)]}, the line ranges in each .py file of the
+    working tree at *root* that differ from commit *since*. A deletion
+    counts as a change to the lines on either side of it.
+    """
+    try:
+        out = git.Repo(root).git(c='core.quotepath=off').diff(
+            '-U0', '--no-color', '--no-ext-diff', since, '--',
+            *(pathspecs or []))
+    except git.GitCommandError:
+        raise NotFound('{0} is not a commit'.format(since))
+    wanted = files.selector(None, ['*.py'])
+    rval = {}
+    path = None
+    for line in out.splitlines():
+        if line.startswith('+++ '):
+            name = line[4:]
+            path = name[2:] if name.startswith('b/') else None
+            if path is not None and not wanted(path):
+                path = None
+        elif line.startswith('@@ ') and path is not None:
+            new = line.split()[2][1:]
+            (first, _, count) = new.partition(',')
+            (first, count) = (int(first), int(count or 1))
+            if count:
+                span = (first, first + count - 1)
+            else:
+                span = (first, first + 1)
+            rval.setdefault(path, []).append(span)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def symbols(root=None, pathspecs=None):
+    """
+    Return a symtab.SymbolTable of the functions that functions() would
+    report. Tables are saved under gitr/symtab in the git directory, keyed
+    by the blob ids of the files they cover, so when the tree is as it was
+    (dirty files and all) the table is loaded, mapped, rather than rebuilt
+    from the analysis cache. Only the SYMTAB_KEEP most recently used are
+    kept. Close the table when done with it.
+    """
+    (root, git_dir, pathspecs) = _scope(root, pathspecs)
+    paths = files.tracked(root, pathspecs, ['*.py'], git_dir=git_dir)
+    blobs = list(analyze.worktree_blobs(root, paths, git_dir))
+    tdir = os.path.join(git_dir, 'gitr', 'symtab')
+    tpath = os.path.join(tdir, _symtab_key(pathspecs, blobs))
+    try:
+        table = symtab.SymbolTable.load(tpath)
+        try:
+            os.utime(tpath, None)
+        except OSError:
+            pass
+        return table
+    except (IOError, OSError):
+        pass
+    except symtab.SymtabFormatError:
+        _discard(tpath)
+
+    table = symtab.SymbolTable()
+    bc = blob_cache(git_dir)
+    for (path, sha, read) in blobs:
+        for (qual, name, line, end, doc) in analyze.run(bc, 'functions', sha,
+                                                        read):
+            table.add(qual, name, path, line, end, doc)
+    try:
+        tbx.makedirs(tdir)
+        table.save(tpath)
+        _prune(tdir, SYMTAB_KEEP)
+    except (IOError, OSError):
+        pass
+    return table
+
+
+# -----------------------------------------------------------------------------
+def _symtab_key(pathspecs, blobs):
+    """
+    The name symbols() saves the table of (path, sha, read) *blobs* under
+    *pathspecs* as: a hash of them, the python version, and the table format
+    """
+    h = hashlib.sha1(json.dumps([sorted(pathspecs or []), analyze.PYTHON,
+                                 symtab.FORMAT_VERSION]).encode('utf-8'))
+    for (path, sha, read) in blobs:
+        if not isinstance(path, bytes):
+            path = path.encode('utf-8')
+        h.update(path + b'\0' + sha.encode() + b'\n')
+    return h.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+def _prune(dirpath, keep):
+    """
+    Remove all but the *keep* most recently used files in *dirpath*
+    """
+    ents = []
+    for name in os.listdir(dirpath):
+        path = os.path.join(dirpath, name)
+        try:
+            ents.append((os.stat(path).st_mtime, path))
+        except OSError:
+            continue
+    for (mtime, path) in sorted(ents, reverse=True)[keep:]:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# -----------------------------------------------------------------------------
+def _discard(path):
+    """
+    Remove the damaged file at *path*, so it's rebuilt; failing to isn't an
+    error
+    """
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+# -----------------------------------------------------------------------------
+def dupl(root=None, pathspecs=None):
+    """
+    Return an OrderedDict mapping each qualified function name defined more
+    than once to the list of its Functions, in name order
+    """
+    table = symbols(root, pathspecs)
+    groups = []
+    try:
+        for rows in table.duplicates('qual'):
+            funcs = [_function(table, n) for n in rows]
+            groups.append((funcs[0].qualname, funcs))
+    finally:
+        table.close()
+    return collections.OrderedDict(sorted(groups))
+
+
+# -----------------------------------------------------------------------------
+def _function(table, n):
+    """
+    Row *n* of symtab.SymbolTable *table* as a Function
+    """
+    (qual, name, path, line, end, doc) = table.row(n)
+    return Function(path, qual, name, line, end, doc)
+
+
+# -----------------------------------------------------------------------------
+def history(rev, root=None, pathspecs=None):
+    """
+    Generate a RevStats for each commit in *rev* (see plumb.rev_list),
+    oldest first, counting the functions in the .py files under
+    *pathspecs* (default: the current directory). Nothing is checked out:
+    trees and blobs are read in-process (see odb), and only the parts of the
+    tree that changed since the previous commit are looked at. Each blob is
+    analyzed once, and the results are cached like the worktree analyses.
+    """
+    (git_dir, pathspecs, commits) = _rev_scope(rev, root, pathspecs)
+    names = collections.Counter()
+    totals = {'functions': 0, 'nodoc': 0, 'dupl': 0}
+
+    def tally(records, sign):
+        """
+        Add (*sign* 1) or remove (*sign* -1) a blob's function *records*
+        """
+        for (qual, name, line, end, doc) in records:
+            totals['functions'] += sign
+            if not doc:
+                totals['nodoc'] += sign
+            before = names[qual]
+            names[qual] += sign
+            if (before < 2) != (names[qual] < 2):
+                totals['dupl'] += sign
+
+    with odb.ObjectDB(git_dir) as db:
+        for (commit, when, changes) in _symbol_walk(db, commits, pathspecs):
+            for (path, old, new) in changes:
+                tally(old or [], -1)
+                tally(new or [], 1)
+            yield RevStats(commit, when, totals['functions'],
+                           totals['nodoc'], totals['dupl'])
+
+
+# -----------------------------------------------------------------------------
+def dupl_history(rev='HEAD', root=None, pathspecs=None):
+    """
+    Return a list of DuplHistory, in name order, for the qualified names
+    the last commit of *rev* defines more than once in the .py files under
+    *pathspecs*: since when, and where (in path order) each copy came
+    from. This is found by walking *rev* as history() does, not by blaming
+    files. What the walk learns is kept in a symtab.SymbolHistory under
+    .git/gitr/dupl, so the next call only looks at the commits made since.
+    """
+    (git_dir, pathspecs, commits) = _rev_scope(rev, root, pathspecs)
+    path = os.path.join(git_dir, 'gitr', 'dupl',
+                        _history_key(rev, pathspecs))
+    hist = _load_history(path, [sha for (sha, when) in commits])
+    done = len(hist.commits)
+    if done < len(commits):
+        with odb.ObjectDB(git_dir) as db:
+            prev = db.commit(hist.commits[-1]).tree if done else None
+            for (commit, when, changes) in _symbol_walk(db, commits[done:],
+                                                        pathspecs, prev):
+                hist.advance(commit, when,
+                             [(p, [r[0] for r in old or []],
+                               [r[0] for r in new or []])
+                              for (p, old, new) in changes])
+        try:
+            tbx.makedirs(os.path.dirname(path))
+            hist.save(path)
+        except (IOError, OSError):
+            pass
+
+    times = dict(commits)
+    rval = []
+    for (qual, (since, rows)) in sorted(hist.duplicated().items()):
+        paths = []
+        for n in rows:
+            (qual, where, first, last, live, moved) = hist.row(n)
+            paths.append(FirstSeen(where, qual, first, times[first], last,
+                                   moved))
+        rval.append(DuplHistory(qual, hist.commits[since],
+                                hist.times[since], sorted(paths)))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def _history_key(rev, pathspecs):
+    """
+    The name of the file dupl_history() keeps its walk of *rev* over
+    *pathspecs* in. Only what *rev* leaves out counts, so walks up to
+    different commits share a file and each extends the last. What's found
+    depends on what parses, so each python version keeps its own.
+    """
+    base = rev.split('..')[0] if '..' in rev else ''
+    key = json.dumps([base, sorted(pathspecs or []), analyze.PYTHON])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+# -----------------------------------------------------------------------------
+def _load_history(path, commits):
+    """
+    Return the SymbolHistory saved at *path* if its walk is the start of
+    *commits*; otherwise (missing, damaged, or gone astray, after a rebase
+    say) an empty one
+    """
+    try:
+        hist = symtab.SymbolHistory.load(path)
+    except (IOError, OSError):
+        return symtab.SymbolHistory()
+    except symtab.SymtabFormatError:
+        _discard(path)
+        return symtab.SymbolHistory()
+    if hist.commits != commits[:len(hist.commits)]:
+        return symtab.SymbolHistory()
+    return hist
+
+
+# -----------------------------------------------------------------------------
+def _rev_scope(rev, root, pathspecs):
+    """
+    Return (git dir, pathspecs, [(commit, time)]) for walking *rev* over
+    *pathspecs* in the repo at *root*
+    """
+    try:
+        git_dir = plumb.find_git_dir(root)
+    except git.InvalidGitRepositoryError:
+        raise NotARepo('{0} is not in a git repo'.format(root or os.getcwd()))
+    if root is None and pathspecs is None and not plumb.is_bare(git_dir):
+        (root, git_dir, pathspecs) = _scope(None, None)
+    try:
+        commits = plumb.rev_list(git_dir, rev)
+    except git.GitCommandError:
+        raise NotFound('{0} is not a revision range'.format(rev))
+    return (git_dir, pathspecs, commits)
+
+
+# -----------------------------------------------------------------------------
+def _symbol_walk(db, commits, pathspecs, prev=None):
+    """
+    Generate (commit, time, changes) for each of *commits* in turn, where
+    changes lists (path, old functions, new functions) for the .py files
+    under *pathspecs* that differ from the commit before (or tree *prev*,
+    for the first). A side that isn't there is None. The function records
+    are analyze's, read once per blob through the analysis cache.
+    """
+    bc = cache.BlobCache(db.git_dir)
+    wanted = files.selector(pathspecs, ['*.py'])
+    results = {}
+
+    def functions(sha):
+        """
+        The function records for blob *sha*
+        """
+        if sha is None:
+            return None
+        if sha not in results:
+            results[sha] = analyze.run(bc, 'functions', sha,
+                                       _blob_reader(db, sha))
+        return results[sha]
+
+    for (commit, when) in commits:
+        tree = db.commit(commit).tree
+        yield (commit, when,
+               [(path, functions(old), functions(new))
+                for (path, old, new) in db.diff_trees(prev, tree)
+                if wanted(path)])
+        prev = tree
+
+
+# -----------------------------------------------------------------------------
+def _blob_reader(db, sha):
+    """
+    Return a function that reads blob *sha* from odb.ObjectDB *db*
+    """
+    def read():
+        """
+        Read the blob
+        """
+        return db.blob(sha)
+    return read
+
+
+# -----------------------------------------------------------------------------
+def similar(root=None, pathspecs=None, threshold=0.8):
+    """
+    Return a list of Similar pairs: functions whose bodies have the same
+    structure (ignoring names and constants) to at least *threshold*, most
+    similar first. Functions too small to compare are left out.
+    """
+    (root, git_dir, pathspecs) = _scope(root, pathspecs)
+    sigs = simlib.Signatures()
+    table = symtab.SymbolTable()
+    bc = blob_cache(git_dir)
+    paths = files.tracked(root, pathspecs, ['*.py'], git_dir=git_dir)
+    for (path, sha, read) in analyze.worktree_blobs(root, paths, git_dir):
+        for (qual, name, line, end, doc, sig) in analyze.run(bc, 'shapes',
+                                                             sha, read):
+            if sig is not None:
+                sigs.add(len(table), sig)
+                table.add(qual, name, path, line, end, doc)
+    try:
+        return [Similar(*s) for s in sigs.similar(
+            threshold, lambda n: _function(table, n))]
+    finally:
+        table.close()
+
+
+# -----------------------------------------------------------------------------
+def flix(root=None, target=None):
+    """
+    Return a list of Conflicts: the conflict hunks in *target* (relative to
+    the current directory) or, by default, in every file with unmerged
+    entries in the index. Each says whether it's been resolved before (see
+    rerere); the hunks are remembered, so once they're resolved and staged,
+    the next flix learns how.
+    """
+    (root, git_dir, pathspecs) = _scope(root, None)
+    unmerged = files.unmerged(root, git_dir=git_dir)
+    if target:
+        if not os.path.exists(target):
+            raise NotFound('{0} not found'.format(target))
+        paths = [os.path.relpath(os.path.abspath(target),
+                                 root).replace(os.sep, '/')]
+    else:
+        paths = list(unmerged)
+    rr = rerere.Resolutions(git_dir)
+    rr.learn(root, unmerged)
+    bc = blob_cache(git_dir)
+    rval = []
+    for (path, sha, read) in analyze.worktree_blobs(root, paths, git_dir):
+        hunks = analyze.run(bc, 'conflicts', sha, read)
+        if not hunks:
+            continue
+        data = read()
+        rr.remember(path, data)
+        for (h, known) in zip(hunks, rr.known(data)):
+            rval.append(Conflict(path, *(h + [known])))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def flix_auto(root=None, target=None, workers=8):
+    """
+    Resolve the conflicts in *target* (relative to the current directory)
+    or, by default, in every file with unmerged entries, that are trivial
+    (see resolve) or have been resolved before (see rerere). The base, ours,
+    and theirs versions of each file are taken from index stages 1, 2, and
+    3, found in one pass over the index and read in-process; the files are
+    then merged *workers* at a time. A file whose conflicts are all settled
+    is rewritten and staged (all of them with one 'git add'); others are
+    left as they are, and remembered so their resolutions can be learned.
+    Return an AutoResolved for each conflicted file, in path order.
+    """
+    (root, git_dir, pathspecs) = _scope(root, None)
+    if target:
+        if not os.path.exists(target):
+            raise NotFound('{0} not found'.format(target))
+        pathspecs = [os.path.relpath(os.path.abspath(target),
+                                     root).replace(os.sep, '/')]
+    else:
+        pathspecs = None
+    unmerged = files.unmerged(root, git_dir=git_dir)
+    rr = rerere.Resolutions(git_dir)
+    rr.learn(root, unmerged)
+    wanted = files.selector(pathspecs)
+    rval = {}
+    jobs = []
+    with odb.ObjectDB(git_dir) as db:
+        for (path, stages) in unmerged.items():
+            if not wanted(path):
+                continue
+            if 2 not in stages or 3 not in stages:
+                rval[path] = AutoResolved(path, 0, [], False,
+                                          'deleted on one side')
+            elif stages[2][0] != stages[3][0]:
+                rval[path] = AutoResolved(path, 0, [], False,
+                                          'modes differ')
+            else:
+                base = db.blob(stages[1][1]) if 1 in stages else b''
+                jobs.append((path, base, db.blob(stages[2][1]),
+                             db.blob(stages[3][1])))
+
+    def settle(job):
+        """
+        Resolve one file, if we can
+        """
+        (path, base, ours, theirs) = job
+        if any(udiff.is_binary(d) for d in (base, ours, theirs)):
+            return AutoResolved(path, 0, [], False, 'binary')
+        full = os.path.join(root, path)
+        try:
+            with open(full, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return AutoResolved(path, 0, [], False, 'missing')
+        if not analyze.conflicts(data):
+            return AutoResolved(path, 0, [], False, 'edited')
+        (merged, count, rules) = resolve.resolve_conflicted(data, base, ours,
+                                                            theirs, rr.get)
+        if merged is None:
+            rr.remember(path, data)
+            return AutoResolved(path, count, rules, False,
+                                'not trivial' if count else 'no conflicts')
+        with tbx.atomic_rewrite(full) as f:
+            f.write(merged)
+        return AutoResolved(path, count, rules, True, None)
+
+    if jobs:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max(1, min(workers, len(jobs))))
+        try:
+            for res in pool.map(settle, jobs):
+                rval[res.path] = res
+        finally:
+            pool.close()
+    done = sorted(p for p in rval if rval[p].resolved)
+    if done:
+        try:
+            plumb.run(git_dir, '--work-tree=' + root, 'add', '--', *done)
+        except git.GitCommandError as e:
+            raise GitFailed(str(e))
+    return [rval[p] for p in sorted(rval)]
+
+
+# -----------------------------------------------------------------------------
+def blob_cache(git_dir):
+    """
+    Return the analysis cache for the repo whose git directory is *git_dir*
+    """
+    return cache.BlobCache(git_dir)
+
+
+# -----------------------------------------------------------------------------
+def _scope(root, pathspecs):
+    """
+    Fill in the defaults for *root* (the repo we're in) and *pathspecs* (the
+    current directory, relative to *root*). Return (root, git directory,
+    pathspecs); the git directory is found as git would, so it may be
+    elsewhere (in a linked worktree or a submodule, say).
+    """
+    if root is None:
+        try:
+            root = find_repo_root()
+        except git.InvalidGitRepositoryError:
+            raise NotARepo('{0} is not in a git repo'.format(os.getcwd()))
+        if pathspecs is None:
+            here = os.path.relpath(os.getcwd(), root).replace(os.sep, '/')
+            pathspecs = [here]
+    try:
+        git_dir = plumb.find_git_dir(root)
+    except git.InvalidGitRepositoryError:
+        raise NotARepo('{0} is not in a git repo'.format(root))
+    return (root, git_dir, pathspecs)
+
+
+# -----------------------------------------------------------------------------
+def increment(iv, part='build'):
+    """
+    Given a version array *iv*, return it with component *part* (one of
+    PARTS) incremented. Incrementing 'build' adds a fourth component to a
+    three component version.
+    """
+    def strinc(sn):
+        """
+        Increment a numeric string or blow up
+        """
+        try:
+            return str(int(sn) + 1)
+        except ValueError:
+            raise BadVersion("'{0}' is not a recognized version format"
+                             .format('.'.join(iv)))
+
+    if part == 'major':
+        ov = [strinc(iv[0]), '0', '0']
+    elif part == 'minor':
+        ov = [iv[0], strinc(iv[1]), '0']
+    elif part == 'patch':
+        ov = [iv[0], iv[1], strinc(iv[2])]
+    elif part == 'build':
+        ov = iv[:]
+        if 3 == len(ov):
+            ov.append('1')
+        elif 4 == len(ov):
+            ov = iv[0:3] + [strinc(iv[3])]
+        else:
+            v = '.'.join(ov)
+            raise BadVersion("'{0}' is not a recognized version format"
+                             .format(v))
+    else:
+        raise ValueError("part must be one of {0}".format(PARTS))
+    return ov
+
+
+# -----------------------------------------------------------------------------
+def update(target, new, old=None, occurrence=1, span=None):
+    """
+    Given a target path and new version array, write out the new version.
+
+    If target is empty, write one line: '__version__ = '<new>''
+
+    If old is not None, format and find it in target's contents and replace
+    the *occurrence*'th match (the first, by default) with the new version.
+    If *span* (start, end) is given, the old version is expected at those
+    byte offsets (as reported by locator.locate()) and is replaced there
+    without searching.
+
+    If target is not empty and old and is not found, raise UpdateError.
+
+    The file is streamed into a temporary file that replaces target only once
+    the update has succeeded, so target is never left truncated and large
+    files are handled in bounded memory.
+    """
+    news = '.'.join(new)
+    try:
+        size = os.path.getsize(target)
+    except OSError:
+        size = 0
+    if not old:
+        if size:
+            raise UpdateError("Don't know where to put '{0}' in '{1}'"
+                              .format(news, version_excerpt(target)))
+        with tbx.atomic_rewrite(target) as f:
+            f.write("__version__ = '{0}'\n".format(news).encode())
+    else:
+        olds = '.'.join(old)
+        if not size:
+            raise UpdateError("Can't update '{0}' in an empty file"
+                              .format(olds))
+        with tbx.atomic_rewrite(target) as f:
+            with open(target, 'rb') as src:
+                if span:
+                    found = splice(src, f, span, olds.encode(),
+                                   news.encode())
+                else:
+                    found = stream_replace(src, f, olds.encode(),
+                                           news.encode(), occurrence)
+            if not found:
+                raise UpdateError("'{0}' not found in '{1}'"
+                                  .format(olds, version_excerpt(target)))
+
+
+# -----------------------------------------------------------------------------
+def find_repo_root(start=None):
+    """
+    Starting from *start* (default '.'), step up until we find a git repo.
+    Return the path of its top directory. The .git there may be a file
+    pointing at the git directory, as in linked worktrees and submodules.
+    """
+    loc = os.path.abspath(start) if start else os.getcwd()
+    clue = os.path.join(loc, '.git')
+    while not os.path.exists(clue) and 1 < len(loc):
+        loc = os.path.dirname(loc)
+        clue = os.path.join(loc, '.git')
+
+    if os.path.exists(clue):
+        return loc
+    else:
+        raise git.InvalidGitRepositoryError(clue)
+
+
+# -----------------------------------------------------------------------------
+def head_blob_sha(repo_root, relpath):
+    """
+    Return the blob id of *relpath* in HEAD of the repo at *repo_root*, or
+    None if HEAD doesn't have it (or there is no HEAD yet). The objects are
+    read in-process.
+    """
+    with odb.ObjectDB(plumb.find_git_dir(repo_root)) as db:
+        try:
+            tree = db.commit(db.rev_parse('HEAD')).tree
+        except KeyError:
+            return None
+        return db.find(tree, relpath.replace(os.sep, '/'))
+
+
+# -----------------------------------------------------------------------------
+def version_patch(repo_root, relpath):
+    """
+    Return the lines of the diff 'git diff *relpath*' would show in the repo
+    at *repo_root* just after bump(), rendered in-process. bump() only
+    touches files that match the index and HEAD, so HEAD's copy is the old
+    side and the work tree's the new. Raise NotFound if HEAD has no
+    *relpath*.
+    """
+    path = relpath.replace(os.sep, '/')
+    with odb.ObjectDB(plumb.find_git_dir(repo_root)) as db:
+        try:
+            entry = db.find_entry(db.commit(db.rev_parse('HEAD')).tree, path)
+        except KeyError:
+            entry = None
+        if entry is None:
+            raise NotFound('{0} is not in HEAD'.format(relpath))
+        (mode, sha) = entry
+        old = db.blob(sha)
+        with open(os.path.join(repo_root, relpath), 'rb') as f:
+            new = f.read()
+        return list(udiff.diff(path, old, new, db.abbrev(sha),
+                               db.abbrev(gitindex.blob_sha(new)), mode))
+
+
+# -----------------------------------------------------------------------------
+def git_status(repo, *paths):
+    """
+    Run 'git status --porcelain' on *paths* in *repo*, turning on whatever
+    status speedups are safe for this repo and invocation
+    """
+    return repo.git(c=status_config(repo)).status(*paths, porc=True)
+
+
+# -----------------------------------------------------------------------------
+def index_entry_count(repo_root):
+    """
+    Return the number of entries in the index of the repo at *repo_root*, read
+    from the index header. Return 0 if there is no index or it can't be read.
+    """
+    try:
+        ipath = os.path.join(plumb.find_git_dir(repo_root), 'index')
+        return gitindex.read_header(ipath)[1]
+    except (gitindex.IndexFormatError, git.InvalidGitRepositoryError):
+        return 0
+
+
+# -----------------------------------------------------------------------------
+def status_config(repo):
+    """
+    Return a list of 'name=value' settings to pass to git with '-c' so that
+    'git status' in *repo* can use the untracked cache and fsmonitor.
+
+    Nothing is returned for a feature the user has configured explicitly
+    (either way), or that this git does not support. The untracked cache is
+    only turned on when we can write the index, since that's where git keeps
+    it. fsmonitor is only turned on when the daemon is already running --
+    setting core.fsmonitor would otherwise start a background process.
+    """
+    conf = repo_status_features(repo)
+    rval = []
+    vinfo = repo.git.version_info
+    if 'core.untrackedcache' not in conf and (2, 8) <= vinfo:
+        if os.access(os.path.join(repo.git_dir, 'index'), os.W_OK):
+            rval.append('core.untrackedCache=true')
+    if 'core.fsmonitor' not in conf and (2, 36) <= vinfo:
+        sock = os.path.join(repo.git_dir, 'fsmonitor--daemon.ipc')
+        if os.path.exists(sock):
+            rval.append('core.fsmonitor=true')
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def repo_status_features(repo):
+    """
+    Return a dict of the status-related settings configured for *repo*
+    (core.untrackedcache, core.fsmonitor), keyed by lowercased name.
+    The result is cached on the repo object.
+    """
+    try:
+        return repo._gitr_status_features
+    except AttributeError:
+        pass
+    rval = {}
+    try:
+        out = repo.git.config('--get-regexp',
+                              r'^core\.(untrackedcache|fsmonitor)$')
+    except git.GitCommandError:
+        out = ''
+    for line in out.splitlines():
+        (name, _, value) = line.partition(' ')
+        rval[name.lower()] = value
+    repo._gitr_status_features = rval
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def status_hint(repo, repo_root):
+    """
+    If the repo at *repo_root* is big enough that fsmonitor and the untracked
+    cache would pay off and they are not configured, say so on stderr
+    """
+    if index_entry_count(repo_root) < STATUS_HINT_THRESHOLD:
+        return
+    conf = repo_status_features(repo)
+    off = ["'git config {0} true'".format(name)
+           for name in ['core.untrackedCache', 'core.fsmonitor']
+           if conf.get(name.lower(), 'false') in ['false', '']]
+    if off:
+        sys.stderr.write("gitr: {0} is large; {1} would speed up status\n"
+                         .format(repo_root, ' and '.join(off)))
+
+
+# -----------------------------------------------------------------------------
+def target_status(repo_root, relpath):
+    """
+    Return the 'git status --porcelain' code for *relpath* ('' if it is
+    clean). The index and HEAD are read in-process when we can; 'git status'
+    (and GitPython) is only used for indexes we can't read and for untracked
+    files, since only git knows whether they're ignored (and so clean).
+    """
+    try:
+        rval = gitindex.path_status(repo_root, relpath,
+                                    head_blob_sha(repo_root, relpath),
+                                    plumb.find_git_dir(repo_root))
+        if rval != '??':
+            return rval
+        return git_status(git.Repo(repo_root), relpath)
+    except gitindex.IndexUnsupported:
+        repo = git.Repo(repo_root)
+        status_hint(repo, repo_root)
+        return git_status(repo, relpath)
+
+
+# -----------------------------------------------------------------------------
+def version_excerpt(target, limit=1024):
+    """
+    Return the start of *target* (all of it if it's short) for error messages
+    """
+    with open(target, 'r') as f:
+        rval = f.read(limit + 1)
+    if limit < len(rval):
+        rval = rval[:limit] + '...'
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def splice(src, dst, span, olds, news, bufsize=65536):
+    """
+    Copy file *src* to file *dst*, replacing the bytes at *span* (start, end)
+    with *news*. Return False, having copied only part of the file, if what's
+    at *span* is not *olds*.
+    """
+    (start, end) = span
+    remaining = start
+    while remaining:
+        chunk = src.read(min(bufsize, remaining))
+        if not chunk:
+            return False
+        dst.write(chunk)
+        remaining -= len(chunk)
+    if src.read(end - start) != olds:
+        return False
+    dst.write(news)
+    shutil.copyfileobj(src, dst, bufsize)
+    return True
+
+
+# -----------------------------------------------------------------------------
+def stream_replace(src, dst, olds, news, occurrence=1, bufsize=65536):
+    """
+    Copy file *src* to file *dst*, replacing the *occurrence*'th instance of
+    *olds* with *news*. Data is moved *bufsize* bytes at a time, keeping back
+    just enough to catch a match that straddles two reads. Return True if the
+    replacement was made.
+    """
+    keep = len(olds) - 1
+    seen = 0
+    done = False
+    tail = b''
+    while True:
+        chunk = src.read(bufsize)
+        buf = tail + chunk
+        pos = 0
+        while not done:
+            hit = buf.find(olds, pos)
+            if hit < 0:
+                break
+            pos = hit + len(olds)
+            seen += 1
+            if seen == occurrence:
+                buf = buf[:hit] + news + buf[pos:]
+                done = True
+        if not chunk:
+            dst.write(buf)
+            return done
+        cut = len(buf) if done else max(len(buf) - keep, pos)
+        dst.write(buf[:cut])
+        tail = buf[cut:]
+
+
+# -----------------------------------------------------------------------------
+def discover_targets(name, top='.', workers=8):
+    """
+    Return the files called *name* under *top*, shallowest first. In a git
+    repo, the tracked files are listed from the index (see files.tracked())
+    and those that exist are returned; if there are none, or we're not in a
+    repo, the tree is walked, top level subdirectories in parallel, skipping
+    .git.
+    """
+    try:
+        root = find_repo_root(top)
+    except git.InvalidGitRepositoryError:
+        root = None
+    if root is not None:
+        rel = os.path.relpath(os.path.abspath(top), root).replace(os.sep, '/')
+        rval = [os.path.join(top, os.path.relpath(os.path.join(root, p),
+                                                  top))
+                for p in files.tracked(root, pathspecs=[rel], globs=[name],
+                                       git_dir=plumb.find_git_dir(root))]
+        rval = [p for p in rval if os.path.isfile(p)]
+        if rval:
+            return sorted(rval, key=_depth_key)
+
+    def walk(sub):
+        """
+        Return the matches under one subdirectory
+        """
+        rval = []
+        for r, d, f in os.walk(sub):
+            if '.git' in d:
+                d.remove('.git')
+            if name in f:
+                rval.append(os.path.join(r, name))
+        return rval
+
+    rval = []
+    subs = []
+    for entry in sorted(os.listdir(top)):
+        path = os.path.join(top, entry)
+        if entry == name and os.path.isfile(path):
+            rval.append(path)
+        elif entry != '.git' and os.path.isdir(path):
+            subs.append(path)
+    if subs:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max(1, min(workers, len(subs))))
+        try:
+            for found in pool.map(walk, subs):
+                rval.extend(found)
+        finally:
+            pool.close()
+    return sorted(rval, key=_depth_key)
+
+
+# -----------------------------------------------------------------------------
+def _depth_key(path):
+    """
+    Sort key putting shallower paths first
+    """
+    return (path.count(os.sep), path)
@@ -0,0 +1,136 @@
+"""
+A content-addressed cache of analysis results
+
+Results are keyed by blob id plus analyzer name and version, not by path and
+mtime, so they survive branch switches: after a checkout only the blobs that
+actually changed need analyzing again. The cache lives in
+.git/gitr/cache, one small JSON file per result, and is held under a size
+cap by evicting the least recently used entries.
+"""
+import json
+import os
+
+import tbx
+
+# default cap on the cache's size on disk
+MAX_BYTES = 64 * 1024 * 1024
+
+
+# -----------------------------------------------------------------------------
+class BlobCache(object):
+    """
+    Analysis results for blobs, stored under *git_dir*/gitr/cache
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, git_dir, max_bytes=MAX_BYTES, subdir='cache'):
+        """
+        Set up a cache in *git_dir* holding at most *max_bytes* of results.
+        Caches with different *subdir*s are kept (and evicted) separately.
+        """
+        self.dir = os.path.join(git_dir, 'gitr', subdir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+    # -------------------------------------------------------------------------
+    def _path(self, sha, name, version):
+        """
+        Where the result for (*sha*, *name*, *version*) lives
+        """
+        return os.path.join(self.dir, sha[:2],
+                            '{0}.{1}.{2}.json'.format(sha[2:], name, version))
+
+    # -------------------------------------------------------------------------
+    def get(self, sha, name, version):
+        """
+        Return the cached result, or None. A hit refreshes the entry's
+        mtime, which is what eviction goes by, if it can (it's still a hit
+        in a read-only repo).
+        """
+        path = self._path(sha, name, version)
+        try:
+            with open(path, 'r') as f:
+                rval = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return rval
+
+    # -------------------------------------------------------------------------
+    def put(self, sha, name, version, result):
+        """
+        Store *result*. Failing to write (read-only repo, full disk) is not
+        an error; the result just isn't cached.
+        """
+        path = self._path(sha, name, version)
+        data = json.dumps(result, separators=(',', ':')).encode()
+        try:
+            tbx.makedirs(os.path.dirname(path))
+            with tbx.atomic_rewrite(path) as f:
+                f.write(data)
+        except (IOError, OSError):
+            return
+        if self._size is not None:
+            self._size += len(data)
+        if self.max_bytes < self.size():
+            self.evict()
+
+    # -------------------------------------------------------------------------
+    def entries(self):
+        """
+        Return [(mtime, size, path)] for everything in the cache
+        """
+        rval = []
+        try:
+            subs = os.listdir(self.dir)
+        except OSError:
+            return rval
+        for sub in subs:
+            d = os.path.join(self.dir, sub)
+            try:
+                names = os.listdir(d)
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(d, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                rval.append((st.st_mtime, st.st_size, path))
+        return rval
+
+    # -------------------------------------------------------------------------
+    def size(self):
+        """
+        How many bytes the cache holds
+        """
+        if self._size is None:
+            self._size = sum(e[1] for e in self.entries())
+        return self._size
+
+    # -------------------------------------------------------------------------
+    def evict(self, target=None):
+        """
+        Remove least recently used entries until the cache is no bigger than
+        *target* (default: 90% of the cap, so we don't evict on every put)
+        """
+        if target is None:
+            target = self.max_bytes * 9 // 10
+        ents = sorted(self.entries())
+        size = sum(e[1] for e in ents)
+        for (mtime, esize, path) in ents:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            size -= esize
+        self._size = size
@@ -0,0 +1,216 @@
+"""
+Enumerate the files git tracks
+
+tracked() lists the paths in a repository's index, optionally limited by
+pathspecs (a file, or a directory prefix) and globs ('*.py'). The index is
+read in-process when we can (see gitindex); otherwise 'git ls-files -z' is
+streamed. Either way the paths come out lazily, as native strings (bytes on
+python 2, so they go to the file system and stdout as they are, whatever
+the locale), and the listing is kept per index checksum, size, and mtime,
+so every subcommand in a run (or every request in a long-running host)
+shares one enumeration until the index changes.
+"""
+import binascii
+import collections
+import fnmatch
+import os
+import subprocess
+
+import gitindex
+
+# how many listings (one per repo/index state) to keep
+CACHE_SIZE = 8
+
+_cache = collections.OrderedDict()
+
+
+# -----------------------------------------------------------------------------
+def tracked(root, pathspecs=None, globs=None, conflicted=False,
+            git_dir=None):
+    """
+    Generate the root-relative paths of the files tracked in the repo at
+    *root* (whose git directory is *git_dir*, by default *root*/.git), in
+    index order. With *pathspecs*, only paths equal to or under one of them;
+    with *globs*, only paths whose basename (or, for a glob with a '/',
+    whole path) matches one of them; with *conflicted*, only paths with
+    unmerged entries. Each path is reported once.
+    """
+    wanted = selector(pathspecs, globs)
+    last = None
+    for (path, stage) in entries(root, git_dir):
+        if path == last:
+            continue
+        if conflicted and stage == 0:
+            continue
+        if not wanted(path):
+            continue
+        last = path
+        yield path
+
+
+# -----------------------------------------------------------------------------
+def selector(pathspecs=None, globs=None):
+    """
+    Return a function that says whether a root-relative path is selected by
+    *pathspecs* and *globs*, as tracked() uses them
+    """
+    prefixes = [p.strip('/') for p in (pathspecs or []) if p.strip('/.')]
+
+    def wanted(path):
+        """
+        Is *path* selected?
+        """
+        if prefixes and not any(path == p or path.startswith(p + '/')
+                                for p in prefixes):
+            return False
+        if globs and not any(_glob_match(path, g) for g in globs):
+            return False
+        return True
+    return wanted
+
+
+# -----------------------------------------------------------------------------
+def entries(root, git_dir=None):
+    """
+    Generate (path, stage) for every entry in the index of the repo at
+    *root* (see tracked() for *git_dir*), from the cache if the index hasn't
+    changed since we last listed it
+    """
+    ipath = _index_path(root, git_dir)
+    # the checksum is all zeros with index.skipHash, so it takes the size
+    # and mtime as well to tell one index from the next
+    try:
+        st = os.stat(ipath)
+        key = (os.path.abspath(ipath), index_checksum(ipath), st.st_size,
+               st.st_mtime)
+    except OSError:
+        key = (os.path.abspath(ipath), None, None, None)
+    if key in _cache:
+        for ent in _cache[key]:
+            yield ent
+        return
+
+    listing = []
+    try:
+        with gitindex.Index(ipath) as idx:
+            for n in range(len(idx)):
+                ent = idx.entry(n)
+                rec = (_native(ent.path), ent.stage)
+                listing.append(rec)
+                yield rec
+    except gitindex.IndexUnsupported:
+        for rec in _ls_files(root):
+            listing.append(rec)
+            yield rec
+    # only a complete listing is worth keeping
+    _cache[key] = listing
+    while CACHE_SIZE < len(_cache):
+        _cache.popitem(last=False)
+
+
+# -----------------------------------------------------------------------------
+def unmerged(root, pathspecs=None, git_dir=None):
+    """
+    Return an OrderedDict mapping each path with unmerged entries in the
+    index of the repo at *root* (under *pathspecs*; see tracked() for
+    *git_dir*) to {stage: (mode, sha)}, read in one pass over the index.
+    Modes are octal strings, as git writes them.
+    """
+    wanted = selector(pathspecs)
+    rval = collections.OrderedDict()
+    try:
+        with gitindex.Index(_index_path(root, git_dir)) as idx:
+            recs = [(_native(e.path), e.stage, '{0:o}'.format(e.mode),
+                     e.sha) for e in idx.entries() if e.stage]
+    except gitindex.IndexUnsupported:
+        out = subprocess.check_output(['git', 'ls-files', '-z', '--unmerged'],
+                                      cwd=root)
+        recs = []
+        for rec in out.split(b'\0'):
+            if rec:
+                (meta, path) = rec.split(b'\t', 1)
+                (mode, sha, stage) = meta.decode().split()
+                recs.append((_native(path), int(stage), mode, sha))
+    for (path, stage, mode, sha) in recs:
+        if wanted(path):
+            rval.setdefault(path, {})[stage] = (mode, sha)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def index_checksum(ipath):
+    """
+    Return the trailing checksum of index file *ipath* as hex, or None if
+    there isn't one
+    """
+    try:
+        with open(ipath, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() < 32:
+                return None
+            f.seek(-20, os.SEEK_END)
+            return binascii.hexlify(f.read(20)).decode('ascii')
+    except IOError:
+        return None
+
+
+# -----------------------------------------------------------------------------
+def clear_cache():
+    """
+    Forget all listings
+    """
+    _cache.clear()
+
+
+# -----------------------------------------------------------------------------
+def _index_path(root, git_dir):
+    """
+    The index file of the repo at *root* whose git directory is *git_dir*
+    (default: *root*/.git)
+    """
+    return os.path.join(git_dir or os.path.join(root, '.git'), 'index')
+
+
+# -----------------------------------------------------------------------------
+def _native(path):
+    """
+    Bytes *path* as a native string: as it is on python 2, decoded on 3
+    """
+    if str is bytes:
+        return path
+    return path.decode('utf-8')
+
+
+# -----------------------------------------------------------------------------
+def _glob_match(path, glob):
+    """
+    Match *glob* against the basename of *path*, or the whole of it if
+    *glob* has a '/'
+    """
+    if '/' in glob:
+        return fnmatch.fnmatchcase(path, glob)
+    return fnmatch.fnmatchcase(path.rpartition('/')[2], glob)
+
+
+# -----------------------------------------------------------------------------
+def _ls_files(root, bufsize=65536):
+    """
+    Stream (path, stage) from 'git ls-files -z --stage' for indexes gitindex
+    can't read
+    """
+    p = subprocess.Popen(['git', 'ls-files', '-z', '--stage'], cwd=root,
+                         stdout=subprocess.PIPE)
+    tail = b''
+    try:
+        while True:
+            chunk = p.stdout.read(bufsize)
+            if not chunk:
+                break
+            recs = (tail + chunk).split(b'\0')
+            tail = recs.pop()
+            for rec in recs:
+                (meta, path) = rec.split(b'\t', 1)
+                yield (_native(path), int(meta.split()[2]))
+    finally:
+        p.stdout.close()
+        p.wait()
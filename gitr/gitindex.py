@@ -0,0 +1,418 @@
+"""
+Read git's index (.git/index) in-process
+
+The index is mmapped and entries are looked up by path with a binary search,
+so asking whether a single file is dirty or staged costs a few stat calls
+rather than a 'git status' subprocess. Versions 2, 3, and 4 of the index
+format are understood. Split and sparse indexes are not; Index raises
+IndexUnsupported for those and callers should fall back to git. git is
+also asked about a file whose stat data and contents both differ from its
+entry, since only git knows what its eol conversion and filters make of
+the file.
+"""
+import array
+import binascii
+import collections
+import hashlib
+import mmap
+import os
+import stat
+import struct
+import subprocess
+
+
+HEADER = struct.Struct('>4sII')
+STAT = struct.Struct('>10I20sH')
+
+FLAG_VALID = 0x8000
+FLAG_EXTENDED = 0x4000
+FLAG_STAGE = 0x3000
+FLAG_NAMEMASK = 0x0fff
+XFLAG_SKIP_WORKTREE = 0x4000
+
+IndexEntry = collections.namedtuple('IndexEntry',
+                                    ['path', 'ctime', 'mtime', 'dev', 'ino',
+                                     'mode', 'uid', 'gid', 'size', 'sha',
+                                     'stage', 'assume_valid',
+                                     'skip_worktree'])
+
+
+# -----------------------------------------------------------------------------
+class IndexFormatError(Exception):
+    """
+    The index file is damaged or not an index
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class IndexUnsupported(IndexFormatError):
+    """
+    The index uses a feature we don't read (split index, sparse index)
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+def read_header(path):
+    """
+    Return (version, entry count) from the header of index file *path*.
+    Return (None, 0) if there is no index.
+    """
+    try:
+        with open(path, 'rb') as f:
+            hdr = f.read(HEADER.size)
+    except IOError:
+        return (None, 0)
+    if len(hdr) < HEADER.size:
+        return (None, 0)
+    (sig, version, count) = HEADER.unpack(hdr)
+    if sig != b'DIRC':
+        raise IndexFormatError('{0} is not a git index'.format(path))
+    return (version, count)
+
+
+# -----------------------------------------------------------------------------
+class Index(object):
+    """
+    A read-only view of a git index file.
+
+    Opening an Index maps the file and makes one pass over the entries to
+    record where each starts. Entries are decoded only when they are looked
+    at.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, path):
+        """
+        Map index file *path*. A missing index is treated as empty.
+        """
+        self.path = path
+        self.version = None
+        self.count = 0
+        self.mtime = None
+        self.extensions = []
+        self._map = None
+        self._offsets = array.array('L')
+        self._paths = None
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_size == 0:
+                return
+            self.mtime = _mtime(st)
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (sig, self.version, self.count) = HEADER.unpack_from(self._map, 0)
+        if sig != b'DIRC':
+            raise IndexFormatError('{0} is not a git index'.format(path))
+        if self.version not in (2, 3, 4):
+            raise IndexUnsupported('index version {0}'.format(self.version))
+        self._scan()
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        """
+        The number of entries in the index
+        """
+        return self.count
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        Release the mapping
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, *args):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    @property
+    def checksum(self):
+        """
+        The trailing checksum of the index file as a hex string, which changes
+        whenever the index does. None if there is no index.
+        """
+        if self._map is None:
+            return None
+        return binascii.hexlify(self._map[-20:]).decode('ascii')
+
+    # -------------------------------------------------------------------------
+    def _scan(self):
+        """
+        Record the offset of each entry. Version 4 indexes prefix-compress
+        paths, so for those we also have to decode and keep every path.
+        """
+        m = self._map
+        off = HEADER.size
+        if self.version == 4:
+            self._paths = []
+            prev = b''
+        for _ in range(self.count):
+            self._offsets.append(off)
+            flags = struct.unpack_from('>H', m, off + 60)[0]
+            pstart = off + 62
+            if flags & FLAG_EXTENDED:
+                pstart += 2
+            if self.version == 4:
+                (strip, pstart) = offset_varint(m, pstart)
+                end = m.find(b'\0', pstart)
+                prev = prev[:len(prev) - strip] + m[pstart:end]
+                self._paths.append(prev)
+                off = end + 1
+            else:
+                nlen = flags & FLAG_NAMEMASK
+                if nlen == FLAG_NAMEMASK:
+                    nlen = m.find(b'\0', pstart) - pstart
+                # entries are NUL-padded to a multiple of eight bytes
+                off += ((pstart - off) + nlen + 8) & ~7
+        self._scan_extensions(off)
+
+    # -------------------------------------------------------------------------
+    def _scan_extensions(self, off):
+        """
+        Note which extensions are present. Refuse the ones that mean the
+        entries we just scanned are not the whole story.
+        """
+        m = self._map
+        end = len(m) - 20
+        while off + 8 <= end:
+            (sig, size) = struct.unpack_from('>4sI', m, off)
+            self.extensions.append(sig)
+            off += 8 + size
+        for sig in (b'link', b'sdir'):
+            if sig in self.extensions:
+                raise IndexUnsupported('{0} extension in {1}'
+                                       .format(sig.decode(), self.path))
+
+    # -------------------------------------------------------------------------
+    def _path(self, n):
+        """
+        Return the path of entry *n* as bytes
+        """
+        if self._paths is not None:
+            return self._paths[n]
+        m = self._map
+        off = self._offsets[n]
+        flags = struct.unpack_from('>H', m, off + 60)[0]
+        pstart = off + (64 if flags & FLAG_EXTENDED else 62)
+        nlen = flags & FLAG_NAMEMASK
+        if nlen == FLAG_NAMEMASK:
+            nlen = m.find(b'\0', pstart) - pstart
+        return m[pstart:pstart + nlen]
+
+    # -------------------------------------------------------------------------
+    def entry(self, n):
+        """
+        Decode and return entry *n*
+        """
+        m = self._map
+        off = self._offsets[n]
+        f = STAT.unpack_from(m, off)
+        flags = f[11]
+        xflags = 0
+        if flags & FLAG_EXTENDED:
+            xflags = struct.unpack_from('>H', m, off + 62)[0]
+        return IndexEntry(path=self._path(n),
+                          ctime=(f[0], f[1]),
+                          mtime=(f[2], f[3]),
+                          dev=f[4], ino=f[5], mode=f[6], uid=f[7], gid=f[8],
+                          size=f[9],
+                          sha=binascii.hexlify(f[10]).decode('ascii'),
+                          stage=(flags & FLAG_STAGE) >> 12,
+                          assume_valid=bool(flags & FLAG_VALID),
+                          skip_worktree=bool(xflags & XFLAG_SKIP_WORKTREE))
+
+    # -------------------------------------------------------------------------
+    def entries(self):
+        """
+        Generate the entries in index order
+        """
+        for n in range(self.count):
+            yield self.entry(n)
+
+    # -------------------------------------------------------------------------
+    def _lower_bound(self, path):
+        """
+        Return the position of the first entry whose path is >= *path*
+        """
+        (lo, hi) = (0, self.count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._path(mid) < path:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # -------------------------------------------------------------------------
+    def find(self, path):
+        """
+        Return the list of entries for *path* (one per stage, so more than one
+        only during a conflicted merge). Return [] if *path* is not in the
+        index.
+        """
+        path = _bytes(path)
+        rval = []
+        n = self._lower_bound(path)
+        while n < self.count and self._path(n) == path:
+            rval.append(self.entry(n))
+            n += 1
+        return rval
+
+
+# -----------------------------------------------------------------------------
+def blob_sha(data):
+    """
+    Return the git blob id (hex) of *data*
+    """
+    h = hashlib.sha1(b'blob ' + str(len(data)).encode() + b'\0')
+    h.update(data)
+    return h.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+def file_sha(path, st):
+    """
+    Return the blob id git would compute for the file or symlink at *path*
+    whose lstat result is *st*
+    """
+    if stat.S_ISLNK(st.st_mode):
+        return blob_sha(_bytes(os.readlink(path)))
+    with open(path, 'rb') as f:
+        return blob_sha(f.read())
+
+
+# -----------------------------------------------------------------------------
+def worktree_changed(idx, ent, path):
+    """
+    Return True if the file at *path* differs from index entry *ent* of index
+    *idx*. Stat data is compared first; the content is hashed only when that
+    doesn't settle it (different stat data, or a racily clean entry). The
+    hash is of the raw bytes, without git's eol conversion or clean
+    filters, so if it doesn't match, git has the last word (see
+    git_says_changed()).
+    """
+    if ent.assume_valid or ent.skip_worktree:
+        return False
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return True
+    if stat.S_IFMT(st.st_mode) != stat.S_IFMT(ent.mode):
+        return True
+    if stat.S_ISREG(st.st_mode) and (st.st_mode & 0o100) != (ent.mode & 0o100):
+        return True
+    if (st.st_size & 0xffffffff) != ent.size:
+        return True
+    mtime = _mtime(st)
+    racy = idx.mtime is not None and idx.mtime <= mtime
+    if (mtime[0] == ent.mtime[0] and
+            (ent.mtime[1] == 0 or mtime[1] == ent.mtime[1]) and
+            (st.st_ino & 0xffffffff) == ent.ino and not racy):
+        return False
+    if file_sha(path, st) == ent.sha:
+        return False
+    return git_says_changed(path)
+
+
+# -----------------------------------------------------------------------------
+def git_says_changed(path):
+    """
+    Ask 'git status' whether the tracked file at *path* differs from the
+    index, with autocrlf, eol attributes, and clean filters applied. If git
+    can't be asked, the file is taken to have changed.
+    """
+    (where, name) = os.path.split(os.path.abspath(path))
+    try:
+        with open(os.devnull, 'wb') as devnull:
+            out = subprocess.check_output(['git', 'status', '--porcelain',
+                                           '-uno', '--', name],
+                                          cwd=where, stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return True
+    return any(line[1:2] not in (b' ', b'')
+               for line in out.splitlines())
+
+
+# -----------------------------------------------------------------------------
+def path_status(repo_root, relpath, head_sha, git_dir=None):
+    """
+    Return the two character 'git status --porcelain' code for *relpath* in
+    the repo at *repo_root* ('' if it's clean), whose git directory is
+    *git_dir* (default: *repo_root*/.git). *head_sha* is the file's blob id
+    in HEAD, or None if HEAD doesn't have it (or there is no HEAD).
+
+    Untracked files come back as '??' whether or not they are ignored; ask
+    git about those (see api.target_status).
+    """
+    git_dir = git_dir or os.path.join(repo_root, '.git')
+    with Index(os.path.join(git_dir, 'index')) as idx:
+        ents = idx.find(relpath.replace(os.sep, '/'))
+        path = os.path.join(repo_root, relpath)
+        if not ents:
+            if head_sha is not None:
+                return 'D '
+            return '??' if os.path.lexists(path) else ''
+        if any(e.stage != 0 for e in ents):
+            return 'UU'
+        ent = ents[0]
+        if head_sha is None:
+            x = 'A'
+        elif head_sha != ent.sha:
+            x = 'M'
+        else:
+            x = ' '
+        if not os.path.lexists(path):
+            y = 'D'
+        elif worktree_changed(idx, ent, path):
+            y = 'M'
+        else:
+            y = ' '
+    return '' if x + y == '  ' else x + y
+
+
+# -----------------------------------------------------------------------------
+def _bytes(s):
+    """
+    Paths in the index are bytes
+    """
+    if isinstance(s, bytes):
+        return s
+    return s.encode('utf-8')
+
+
+# -----------------------------------------------------------------------------
+def _mtime(st):
+    """
+    Return the mtime from stat result *st* as (seconds, nanoseconds)
+    """
+    ns = getattr(st, 'st_mtime_ns', None)
+    if ns is None:
+        ns = int(round(st.st_mtime * 1e9))
+    return (ns // 1000000000, ns % 1000000000)
+
+
+# -----------------------------------------------------------------------------
+def offset_varint(buf, off):
+    """
+    Decode the offset-encoded varint (as used in index v4 and pack files for
+    ofs-deltas; see odb) at *off* in *buf*. Return (value, next offset).
+    """
+    c = bytearray(buf[off:off + 1])[0]
+    off += 1
+    val = c & 0x7f
+    while c & 0x80:
+        c = bytearray(buf[off:off + 1])[0]
+        off += 1
+        val = ((val + 1) << 7) | (c & 0x7f)
+    return (val, off)
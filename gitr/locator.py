@@ -0,0 +1,107 @@
+"""
+Find the version string in a version file
+
+Each kind of version file (setup.cfg, pyproject.toml, package.json, ...) has
+a locator: a list of precompiled patterns that are tried in order. The first
+pattern that matches anywhere in the file wins and we stop scanning there.
+A match reports the version and its byte offsets so the caller can splice
+the new version in without searching the file again.
+
+Files that no registered locator claims get the generic pattern that gitr bv
+has always used: the first thing that looks like N.N.N[.x].
+"""
+import collections
+import fnmatch
+import mmap
+import os
+import re
+
+
+VERSION = br'\d+\.\d+\.\d+\.?\w*'
+
+Locator = collections.namedtuple('Locator', ['name', 'globs', 'patterns'])
+Match = collections.namedtuple('Match', ['version', 'start', 'end', 'locator'])
+
+_registry = []
+
+
+# -----------------------------------------------------------------------------
+def register(name, globs, patterns, flags=re.M):
+    """
+    Add a locator called *name* for files whose basename matches one of
+    *globs*. *patterns* are bytes regexes, tried in order; each must have a
+    group named 'version' (or, failing that, a first group) holding the
+    version. Locators registered later are consulted first, so a caller can
+    override the built-in ones.
+    """
+    compiled = [re.compile(p, flags) for p in patterns]
+    for rgx in compiled:
+        if rgx.groups < 1:
+            raise ValueError("locator pattern {0!r} has no group"
+                             .format(rgx.pattern))
+    loc = Locator(name, tuple(globs), compiled)
+    _registry.insert(0, loc)
+    return loc
+
+
+# -----------------------------------------------------------------------------
+def locator_for(path):
+    """
+    Return the locator that handles *path*
+    """
+    base = os.path.basename(path)
+    for loc in _registry:
+        if any(fnmatch.fnmatch(base, g) for g in loc.globs):
+            return loc
+    return GENERIC
+
+
+# -----------------------------------------------------------------------------
+def search(data, loc):
+    """
+    Return a Match for the first version that locator *loc* finds in *data*
+    (bytes, or anything else re can search, like an mmap), or None
+    """
+    for rgx in loc.patterns:
+        m = rgx.search(data)
+        if m:
+            grp = 'version' if 'version' in rgx.groupindex else 1
+            return Match(m.group(grp).decode('ascii'),
+                         m.start(grp), m.end(grp), loc.name)
+    return None
+
+
+# -----------------------------------------------------------------------------
+def locate(path, loc=None):
+    """
+    Return a Match for the version in file *path*, or None if there isn't
+    one. The file is mapped rather than read, so the scan stops at the first
+    hit without pulling in the rest of a large file.
+    """
+    loc = loc or locator_for(path)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return search(m, loc)
+        finally:
+            m.close()
+
+
+GENERIC = Locator('generic', ('*',),
+                  [re.compile(b'(' + VERSION + b')')])
+
+register('setup.cfg', ['setup.cfg'],
+         [br'^version\s*=\s*(?P<version>' + VERSION + br')'])
+# only the version in [project] or [tool.poetry] counts: the pattern walks
+# from the table header over lines that don't start another table
+register('pyproject.toml', ['pyproject.toml'],
+         [br'^\[(?:project|tool\.poetry)\][ \t]*\r?\n'
+          br'(?:(?!\[)[^\n]*\n)*?'
+          br'[ \t]*version\s*=\s*["\'](?P<version>' + VERSION + br')["\']'])
+register('package.json', ['package.json'],
+         [br'"version"\s*:\s*"(?P<version>' + VERSION + br')"'])
+register('version.py', ['version.py', '_version.py', '__init__.py'],
+         [br'^__version__\s*=\s*["\'](?P<version>' + VERSION + br')["\']',
+          b'(?P<version>' + VERSION + b')'])
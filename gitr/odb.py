@@ -0,0 +1,897 @@
+"""
+Read git objects in-process
+
+Loose objects are inflated with zlib. Packed objects are found by a binary
+search of the pack's .idx file (versions 1 and 2), mapped into memory, and
+read from the mapped .pack, following offset and ref deltas. Refs are read
+from the loose ref files and packed-refs. That is enough to walk commits
+and trees and read blobs without starting git or loading GitPython.
+Anything we don't handle (an unusual revision expression, say) raises
+KeyError, so callers can fall back to git.
+
+Opened packs are kept for the life of the process (see open_pack()), so
+the index files are mapped and their fanout tables parsed once, however
+many ObjectDBs come and go. Each ObjectDB keeps the objects that deltas
+were applied to in a BaseCache, so a long delta chain's base is inflated
+once rather than once per object built on it.
+"""
+import binascii
+import collections
+import mmap
+import os
+import re
+import struct
+import zlib
+
+import gitindex
+
+TYPES = {1: 'commit', 2: 'tree', 3: 'blob', 4: 'tag'}
+OFS_DELTA = 6
+REF_DELTA = 7
+
+IDX_MAGIC = b'\377tOc'
+RIDX_MAGIC = b'RIDX'
+
+# default cap on the memory a BaseCache holds (git's core.deltaBaseCacheLimit
+# defaults to 96MiB; we read a good deal less per process)
+BASE_CACHE_BYTES = 32 * 1024 * 1024
+
+# the shortest abbreviated object id git uses
+MIN_ABBREV = 7
+
+# idx path -> (mtime, size, Pack), for open_pack()
+_PACKS = {}
+
+# a parsed commit; times are seconds since the epoch
+Commit = collections.namedtuple('Commit',
+                                ['sha', 'tree', 'parents', 'author_time',
+                                 'commit_time'])
+
+_SUFFIX = re.compile(r'(\^\{commit\}|\^\{\}|\^[0-9]*|~[0-9]*)$')
+_HEX = re.compile(r'^[0-9a-f]{4,40}$')
+_PSEUDO = re.compile(r'^[A-Z_]*HEAD$')
+
+
+# -----------------------------------------------------------------------------
+class ObjectDB(object):
+    """
+    The objects and refs of the repository whose git directory is *git_dir*
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, git_dir, cache_bytes=BASE_CACHE_BYTES):
+        """
+        Set up to read the repo in *git_dir*, holding at most *cache_bytes*
+        of delta bases in memory
+        """
+        self.git_dir = git_dir
+        self.common_dir = _common_dir(git_dir)
+        self.dirs = _object_dirs(os.path.join(self.common_dir, 'objects'))
+        self.bases = BaseCache(cache_bytes)
+        self._packs = None
+        self._shallow = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, *args):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        Let go of the delta bases. The packs stay open for the next ObjectDB
+        on this repo; close_packs() unmaps them.
+        """
+        self.bases.clear()
+        self._packs = None
+
+    # -------------------------------------------------------------------------
+    def packs(self, refresh=False):
+        """
+        The Packs in the object directories
+        """
+        if self._packs is None or refresh:
+            packs = []
+            for d in self.dirs:
+                pdir = os.path.join(d, 'pack')
+                try:
+                    names = sorted(os.listdir(pdir))
+                except OSError:
+                    continue
+                for name in names:
+                    if name.endswith('.idx'):
+                        p = open_pack(os.path.join(pdir, name))
+                        if p is not None:
+                            packs.append(p)
+            self._packs = packs
+        return self._packs
+
+    # -------------------------------------------------------------------------
+    def read(self, sha):
+        """
+        Return (type, data) for object *sha* (full hex). Raise KeyError if
+        there's no such object.
+
+        Most objects are packed, so the packs are searched before the loose
+        object directories, starting with the pack that held the last object
+        found (objects read together tend to be packed together). If both
+        come up empty, the pack list is reread in case a gc moved things.
+        """
+        binsha = binascii.unhexlify(sha)
+        for refresh in [False, True]:
+            packs = self.packs(refresh)
+            for (n, p) in enumerate(packs):
+                off = p.offset(binsha)
+                if off is not None:
+                    if n:
+                        packs.insert(0, packs.pop(n))
+                    return p.read_at(off, self)
+            if not refresh:
+                for d in self.dirs:
+                    path = os.path.join(d, sha[:2], sha[2:])
+                    try:
+                        with open(path, 'rb') as f:
+                            raw = zlib.decompress(f.read())
+                    except (IOError, OSError):
+                        continue
+                    (header, _, data) = raw.partition(b'\0')
+                    return (header.split()[0].decode(), data)
+        raise KeyError(sha)
+
+    # -------------------------------------------------------------------------
+    def blob(self, sha):
+        """
+        The contents of blob *sha*
+        """
+        return self._typed(sha, 'blob')
+
+    # -------------------------------------------------------------------------
+    def shallow(self):
+        """
+        The commits a shallow clone has cut off from their parents (listed
+        in its 'shallow' file); empty if the repo isn't shallow
+        """
+        if self._shallow is None:
+            try:
+                with open(os.path.join(self.common_dir, 'shallow')) as f:
+                    self._shallow = frozenset(f.read().split())
+            except (IOError, OSError):
+                self._shallow = frozenset()
+        return self._shallow
+
+    # -------------------------------------------------------------------------
+    def commit(self, sha):
+        """
+        Return commit *sha* as a Commit. In a shallow clone, the commits at
+        the cut have no parents, as git log would show them.
+        """
+        data = self._typed(sha, 'commit')
+        (tree, parents, atime, ctime) = (None, [], 0, 0)
+        for line in data.split(b'\n'):
+            if not line:
+                break
+            (key, _, value) = line.partition(b' ')
+            if key == b'tree':
+                tree = value.decode()
+            elif key == b'parent':
+                parents.append(value.decode())
+            elif key == b'author':
+                atime = int(value.rsplit(b' ', 2)[1])
+            elif key == b'committer':
+                ctime = int(value.rsplit(b' ', 2)[1])
+        if sha in self.shallow():
+            parents = []
+        return Commit(sha, tree, parents, atime, ctime)
+
+    # -------------------------------------------------------------------------
+    def tree(self, sha):
+        """
+        Return the entries of tree *sha* as a list of (mode, name, sha);
+        *mode* is a string like '100644' and *name* is bytes
+        """
+        data = self._typed(sha, 'tree')
+        rval = []
+        pos = 0
+        while pos < len(data):
+            sp = data.index(b' ', pos)
+            nul = data.index(b'\0', sp)
+            rval.append((data[pos:sp].decode(), data[sp + 1:nul],
+                         binascii.hexlify(data[nul + 1:nul + 21]).decode()))
+            pos = nul + 21
+        return rval
+
+    # -------------------------------------------------------------------------
+    def tree_blobs(self, sha, prefix=''):
+        """
+        Return {path: sha} for every blob under tree *sha*
+        """
+        rval = {}
+        stack = [(sha, prefix)]
+        while stack:
+            (tsha, pre) = stack.pop()
+            for (mode, name, esha) in self.tree(tsha):
+                path = pre + name.decode('utf-8')
+                if mode == '40000':
+                    stack.append((esha, path + '/'))
+                elif mode != '160000':
+                    rval[path] = esha
+        return rval
+
+    # -------------------------------------------------------------------------
+    def diff_trees(self, old, new, prefix=''):
+        """
+        Generate (path, old sha, new sha) for each blob that differs between
+        trees *old* and *new* (either may be None, for an empty tree); the
+        sha is None on the side that lacks the path. Subtrees with the same
+        id on both sides are skipped without being read.
+        """
+        if old == new:
+            return
+        (a, b) = (self._entries(old), self._entries(new))
+        for name in sorted(set(a) | set(b)):
+            (amode, asha) = a.get(name, (None, None))
+            (bmode, bsha) = b.get(name, (None, None))
+            if (amode, asha) == (bmode, bsha):
+                continue
+            path = prefix + name
+            adir = amode == '40000'
+            bdir = bmode == '40000'
+            if adir or bdir:
+                for rec in self.diff_trees(asha if adir else None,
+                                           bsha if bdir else None,
+                                           path + '/'):
+                    yield rec
+            olds = asha if amode and not adir and amode != '160000' else None
+            news = bsha if bmode and not bdir and bmode != '160000' else None
+            if olds != news:
+                yield (path, olds, news)
+
+    # -------------------------------------------------------------------------
+    def _entries(self, tree):
+        """
+        {name: (mode, sha)} for tree *tree*, or {} for None. Names are
+        native strings, so bytes on python 2, like the paths files lists.
+        """
+        if tree is None:
+            return {}
+        if str is bytes:
+            return dict((name, (mode, sha))
+                        for (mode, name, sha) in self.tree(tree))
+        return dict((name.decode('utf-8'), (mode, sha))
+                    for (mode, name, sha) in self.tree(tree))
+
+    # -------------------------------------------------------------------------
+    def find(self, tree, path):
+        """
+        Return the sha of the entry at *path* under *tree*, or None
+        """
+        entry = self.find_entry(tree, path)
+        return entry[1] if entry else None
+
+    # -------------------------------------------------------------------------
+    def find_entry(self, tree, path):
+        """
+        Return (mode, sha) for the entry at *path* under *tree*, or None
+        """
+        entry = ('40000', tree)
+        for part in path.strip('/').split('/'):
+            # native paths are already bytes on python 2
+            name = part if isinstance(part, bytes) else part.encode('utf-8')
+            try:
+                entries = self.tree(entry[1])
+            except KeyError:
+                return None
+            for (mode, ename, esha) in entries:
+                if ename == name:
+                    entry = (mode, esha)
+                    break
+            else:
+                return None
+        return entry
+
+    # -------------------------------------------------------------------------
+    def _typed(self, sha, want):
+        """
+        The data of object *sha*, which must be of type *want*
+        """
+        (typ, data) = self.read(sha)
+        if typ != want:
+            raise KeyError('{0} is a {1}, not a {2}'.format(sha, typ, want))
+        return data
+
+    # -------------------------------------------------------------------------
+    def peel(self, sha):
+        """
+        Follow tags from *sha* to what they finally point at
+        """
+        (typ, data) = self.read(sha)
+        while typ == 'tag':
+            sha = data.split(b'\n', 1)[0].split()[1].decode()
+            (typ, data) = self.read(sha)
+        return sha
+
+    # -------------------------------------------------------------------------
+    def ref(self, name):
+        """
+        Return the sha that ref *name* (e.g. 'HEAD', 'refs/heads/master')
+        points at, following symbolic refs, or None
+        """
+        for _ in range(10):
+            where = self.git_dir if '/' not in name else self.common_dir
+            try:
+                with open(os.path.join(where, name), 'rb') as f:
+                    value = f.readline().strip().decode()
+            except (IOError, OSError):
+                return self.packed_refs().get(name)
+            if value.startswith('ref: '):
+                name = value[5:].strip()
+            else:
+                return value.split()[0] if value else None
+        return None
+
+    # -------------------------------------------------------------------------
+    def refs(self):
+        """
+        Return {name: sha} for every ref under refs/, loose or packed
+        """
+        rval = self.packed_refs()
+        top = os.path.join(self.common_dir, 'refs')
+        for (dirpath, dirnames, filenames) in os.walk(top):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                ref = 'refs/' + os.path.relpath(path, top).replace(os.sep,
+                                                                   '/')
+                sha = self.ref(ref)
+                if sha and _HEX.match(sha):
+                    rval[ref] = sha
+        return rval
+
+    # -------------------------------------------------------------------------
+    def packed_refs(self):
+        """
+        Return {name: sha} from packed-refs
+        """
+        rval = {}
+        try:
+            with open(os.path.join(self.common_dir, 'packed-refs'),
+                      'rb') as f:
+                for line in f:
+                    line = line.strip().decode('utf-8')
+                    if line and line[0] not in '#^':
+                        (sha, name) = line.split(' ', 1)
+                        rval[name] = sha
+        except (IOError, OSError):
+            pass
+        return rval
+
+    # -------------------------------------------------------------------------
+    def expand(self, prefix):
+        """
+        Return the one object id that starts with hex *prefix*. Raise
+        KeyError if there's none or more than one.
+        """
+        if len(prefix) == 40:
+            return prefix
+        hits = self._matching(prefix)
+        if len(hits) != 1:
+            raise KeyError(prefix)
+        return hits.pop()
+
+    # -------------------------------------------------------------------------
+    def abbrev(self, sha):
+        """
+        Abbreviate *sha* as git does by default: to the shortest prefix that
+        names no other object and is at least as long as the repo's size
+        calls for (see default_abbrev()). *sha* needn't be in the repo.
+        """
+        n = default_abbrev(sum(p.count for p in self.packs()))
+        while n < len(sha) and self._matching(sha[:n]) - set([sha]):
+            n += 1
+        return sha[:n]
+
+    # -------------------------------------------------------------------------
+    def _matching(self, prefix):
+        """
+        The set of object ids, loose or packed, that start with *prefix*
+        """
+        hits = set()
+        for d in self.dirs:
+            try:
+                names = os.listdir(os.path.join(d, prefix[:2]))
+            except OSError:
+                names = []
+            hits.update(prefix[:2] + n for n in names
+                        if n.startswith(prefix[2:]))
+        for p in self.packs():
+            hits.update(p.matching(prefix))
+        return hits
+
+    # -------------------------------------------------------------------------
+    def rev_parse(self, rev):
+        """
+        Return the object id *rev* names: a full or abbreviated id, HEAD (or
+        ORIG_HEAD and the like), or a ref name as git looks them up, followed
+        by any of ~N, ^N, ^{} and ^{commit}. Raise KeyError for anything
+        else.
+        """
+        m = _SUFFIX.search(rev)
+        if m and m.start() > 0:
+            sha = self.rev_parse(rev[:m.start()])
+            op = m.group(1)
+            if op in ['^{}', '^{commit}']:
+                return self.peel(sha)
+            n = int(op[1:] or 1)
+            sha = self.peel(sha)
+            if op[0] == '~':
+                for _ in range(n):
+                    sha = self._parent(sha, 1, rev)
+                return sha
+            if n == 0:
+                return sha
+            return self._parent(sha, n, rev)
+        for name in [rev, 'refs/' + rev, 'refs/tags/' + rev,
+                     'refs/heads/' + rev, 'refs/remotes/' + rev,
+                     'refs/remotes/' + rev + '/HEAD']:
+            if _PSEUDO.match(name) or name.startswith('refs/'):
+                sha = self.ref(name)
+                if sha:
+                    return sha
+        if _HEX.match(rev):
+            return self.expand(rev)
+        raise KeyError(rev)
+
+    # -------------------------------------------------------------------------
+    def _parent(self, sha, n, rev):
+        """
+        Commit *sha*'s *n*th parent; KeyError (for *rev*) if it hasn't one
+        """
+        parents = self.commit(sha).parents
+        if len(parents) < n:
+            raise KeyError(rev)
+        return parents[n - 1]
+
+
+# -----------------------------------------------------------------------------
+class BaseCache(object):
+    """
+    The most recently used delta bases, up to *max_bytes* of them. Keys are
+    (pack path, offset) for bases found by offset and the hex id for those
+    found by id; values are (type, data).
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, max_bytes=BASE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._entries)
+
+    # -------------------------------------------------------------------------
+    def get(self, key):
+        """
+        Return the (type, data) cached under *key*, or None. A hit makes the
+        entry the most recently used.
+        """
+        try:
+            rval = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries[key] = rval
+        self.hits += 1
+        return rval
+
+    # -------------------------------------------------------------------------
+    def put(self, key, value):
+        """
+        Cache (type, data) *value* under *key*, dropping the least recently
+        used entries to stay under the cap. Anything bigger than the whole
+        cap isn't kept.
+        """
+        size = len(value[1])
+        if self.max_bytes < size:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1])
+        self._entries[key] = value
+        self.size += size
+        while self.max_bytes < self.size:
+            (_, dropped) = self._entries.popitem(last=False)
+            self.size -= len(dropped[1])
+
+    # -------------------------------------------------------------------------
+    def clear(self):
+        """
+        Drop everything
+        """
+        self._entries.clear()
+        self.size = 0
+
+
+# -----------------------------------------------------------------------------
+class Pack(object):
+    """
+    A packfile and its index, both mapped into memory
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, idx_path):
+        self.idx_path = idx_path
+        self.pack_path = idx_path[:-4] + '.pack'
+        with open(idx_path, 'rb') as f:
+            self.idx = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._pack = None
+        self._ranks = None
+        if self.idx[:4] == IDX_MAGIC:
+            self.version = struct.unpack('>I', self.idx[4:8])[0]
+            base = 8
+        else:
+            self.version = 1
+            base = 0
+        self.fanout = struct.unpack('>256I', self.idx[base:base + 1024])
+        self.count = self.fanout[255]
+        if self.version == 2:
+            self._shas = base + 1024
+            self._offsets = self._shas + 24 * self.count
+            self._large = self._offsets + 4 * self.count
+        elif self.version == 1:
+            self._entries = base + 1024
+        else:
+            raise ValueError('{0}: unknown idx version {1}'.format(
+                idx_path, self.version))
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        Unmap the files
+        """
+        self.idx.close()
+        if self._ranks is not None and not isinstance(self._ranks, list):
+            self._ranks.close()
+        self._ranks = None
+        if self._pack is not None:
+            self._pack.close()
+            self._pack = None
+
+    # -------------------------------------------------------------------------
+    @property
+    def pack(self):
+        """
+        The mapped packfile, mapped when first wanted
+        """
+        if self._pack is None:
+            with open(self.pack_path, 'rb') as f:
+                self._pack = mmap.mmap(f.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+        return self._pack
+
+    # -------------------------------------------------------------------------
+    def sha(self, n):
+        """
+        The binary id of entry *n*
+        """
+        if self.version == 2:
+            pos = self._shas + 20 * n
+        else:
+            pos = self._entries + 24 * n + 4
+        return self.idx[pos:pos + 20]
+
+    # -------------------------------------------------------------------------
+    def offset(self, binsha):
+        """
+        Return the pack offset of object *binsha* (20 bytes), or None
+        """
+        n = self.position(binsha)
+        return None if n is None else self._offset(n)
+
+    # -------------------------------------------------------------------------
+    def position(self, binsha):
+        """
+        Return where object *binsha* (20 bytes) is in the index, or None
+        """
+        first = bytearray(binsha[:1])[0]
+        lo = self.fanout[first - 1] if first else 0
+        hi = self.fanout[first]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            here = self.sha(mid)
+            if here < binsha:
+                lo = mid + 1
+            elif binsha < here:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    # -------------------------------------------------------------------------
+    def checksum(self):
+        """
+        The packfile's checksum, as recorded near the end of the index
+        """
+        return self.idx[-40:-20]
+
+    # -------------------------------------------------------------------------
+    def rank(self, n):
+        """
+        Return where entry *n* comes in the packfile when its objects are
+        ordered by offset (the order git's reachability bitmaps number them
+        in). The pack's reverse index (.rev) is searched if git wrote one;
+        otherwise every offset is read and sorted, once.
+        """
+        if self._ranks is None:
+            self._ranks = self._reverse_index()
+        if isinstance(self._ranks, list):
+            return self._ranks[n]
+        rev = self._ranks
+        target = self._offset(n)
+        (lo, hi) = (0, self.count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = 12 + 4 * mid
+            here = self._offset(struct.unpack('>I', rev[pos:pos + 4])[0])
+            if here < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # -------------------------------------------------------------------------
+    def _reverse_index(self):
+        """
+        The mapped .rev file, or failing that a list of every entry's rank
+        """
+        try:
+            with open(self.idx_path[:-4] + '.rev', 'rb') as f:
+                rev = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if rev[:4] == RIDX_MAGIC and len(rev) >= 12 + 4 * self.count:
+                return rev
+            rev.close()
+        except (IOError, OSError, ValueError):
+            pass
+        offsets = [self._offset(n) for n in range(self.count)]
+        rval = [0] * self.count
+        for (rank, n) in enumerate(sorted(range(self.count),
+                                          key=offsets.__getitem__)):
+            rval[n] = rank
+        return rval
+
+    # -------------------------------------------------------------------------
+    def _offset(self, n):
+        """
+        The pack offset of entry *n*
+        """
+        if self.version == 1:
+            pos = self._entries + 24 * n
+            return struct.unpack('>I', self.idx[pos:pos + 4])[0]
+        pos = self._offsets + 4 * n
+        off = struct.unpack('>I', self.idx[pos:pos + 4])[0]
+        if off & 0x80000000:
+            pos = self._large + 8 * (off & 0x7fffffff)
+            off = struct.unpack('>Q', self.idx[pos:pos + 8])[0]
+        return off
+
+    # -------------------------------------------------------------------------
+    def matching(self, prefix):
+        """
+        Return the hex ids in this pack that start with hex *prefix*
+        """
+        first = int(prefix[:2], 16)
+        lo = self.fanout[first - 1] if first else 0
+        rval = []
+        for n in range(lo, self.fanout[first]):
+            sha = binascii.hexlify(self.sha(n)).decode()
+            if sha.startswith(prefix):
+                rval.append(sha)
+        return rval
+
+    # -------------------------------------------------------------------------
+    def read_at(self, offset, odb):
+        """
+        Return (type, data) for the object at *offset*, resolving deltas.
+        *odb* looks up the bases of ref deltas, and its BaseCache is checked
+        for each base along the chain before it's inflated. Whatever a delta
+        gets applied to here (the chain's base and each intermediate object)
+        is added to the cache; the object asked for is not, unless it turns
+        out to be a base itself later.
+        """
+        chain = []
+        while True:
+            hit = odb.bases.get((self.pack_path, offset)) if chain else None
+            if hit is not None:
+                (btype, data) = hit
+                break
+            (typ, size, pos) = self._header(offset)
+            if typ == OFS_DELTA:
+                (dist, pos) = gitindex.offset_varint(self.pack, pos)
+                chain.append((offset, self._inflate(pos, size)))
+                offset -= dist
+            elif typ == REF_DELTA:
+                base = binascii.hexlify(self.pack[pos:pos + 20]).decode()
+                chain.append((offset, self._inflate(pos + 20, size)))
+                (btype, data) = odb.bases.get(base) or odb.read(base)
+                odb.bases.put(base, (btype, data))
+                break
+            else:
+                (btype, data) = (TYPES[typ], self._inflate(pos, size))
+                if chain:
+                    odb.bases.put((self.pack_path, offset), (btype, data))
+                break
+        for (n, (where, delta)) in enumerate(reversed(chain)):
+            data = apply_delta(data, delta)
+            if n < len(chain) - 1:
+                odb.bases.put((self.pack_path, where), (btype, data))
+        return (btype, data)
+
+    # -------------------------------------------------------------------------
+    def _header(self, offset):
+        """
+        Return (type, size, data offset) for the entry at *offset*
+        """
+        head = bytearray(self.pack[offset:offset + 16])
+        c = head[0]
+        typ = (c >> 4) & 7
+        size = c & 15
+        shift = 4
+        n = 1
+        while c & 0x80:
+            c = head[n]
+            size |= (c & 0x7f) << shift
+            shift += 7
+            n += 1
+        return (typ, size, offset + n)
+
+    # -------------------------------------------------------------------------
+    def _inflate(self, pos, size):
+        """
+        Inflate *size* bytes of zlib data starting at *pos*. The compressed
+        data is rarely much bigger than *size*, so that much is tried first.
+        """
+        d = zlib.decompressobj()
+        chunk = size + size // 64 + 64
+        out = []
+        got = 0
+        while got < size or not out:
+            piece = d.decompress(self.pack[pos:pos + chunk])
+            pos += chunk
+            out.append(piece)
+            got += len(piece)
+            if d.unused_data or pos >= len(self.pack):
+                break
+            chunk = 65536
+        out.append(d.flush())
+        return b''.join(out)[:size]
+
+
+# -----------------------------------------------------------------------------
+def open_pack(idx_path):
+    """
+    Return the Pack for *idx_path*, opening and mapping it the first time
+    it's wanted and reusing it after that for as long as the file is
+    unchanged. Return None if it has gone away.
+    """
+    try:
+        st = os.stat(idx_path)
+    except OSError:
+        _PACKS.pop(idx_path, None)
+        return None
+    stamp = (st.st_mtime, st.st_size)
+    have = _PACKS.get(idx_path)
+    if have is not None:
+        if have[0] == stamp:
+            return have[1]
+        have[1].close()
+    try:
+        p = Pack(idx_path)
+    except (IOError, OSError, ValueError):
+        _PACKS.pop(idx_path, None)
+        return None
+    _PACKS[idx_path] = (stamp, p)
+    return p
+
+
+# -----------------------------------------------------------------------------
+def close_packs():
+    """
+    Unmap every pack open_pack() has opened
+    """
+    for (_, p) in _PACKS.values():
+        p.close()
+    _PACKS.clear()
+
+
+# -----------------------------------------------------------------------------
+def default_abbrev(count):
+    """
+    How many hex digits git abbreviates object ids to by default in a repo
+    with *count* packed objects: half the bits *count* takes, rounded up,
+    but never fewer than MIN_ABBREV
+    """
+    return max(MIN_ABBREV, (count.bit_length() + 1) // 2)
+
+
+# -----------------------------------------------------------------------------
+def apply_delta(base, delta):
+    """
+    Rebuild an object from its *base* and a git *delta*
+    """
+    delta = bytearray(delta)
+    (_, pos) = _varint(delta, 0)
+    (size, pos) = _varint(delta, pos)
+    out = []
+    while pos < len(delta):
+        op = delta[pos]
+        pos += 1
+        if op & 0x80:
+            (off, n) = (0, 0)
+            for bit in range(4):
+                if op & (1 << bit):
+                    off |= delta[pos] << (8 * bit)
+                    pos += 1
+            for bit in range(3):
+                if op & (0x10 << bit):
+                    n |= delta[pos] << (8 * bit)
+                    pos += 1
+            out.append(base[off:off + (n or 0x10000)])
+        elif op:
+            out.append(bytes(delta[pos:pos + op]))
+            pos += op
+        else:
+            raise ValueError('bad delta opcode 0')
+    rval = b''.join(out)
+    if len(rval) != size:
+        raise ValueError('delta produced {0} bytes, expected {1}'.format(
+            len(rval), size))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def _varint(data, pos):
+    """
+    Decode a little-endian base-128 size from bytearray *data* at *pos*;
+    return (value, next pos)
+    """
+    (value, shift) = (0, 0)
+    while True:
+        c = data[pos]
+        pos += 1
+        value |= (c & 0x7f) << shift
+        shift += 7
+        if not c & 0x80:
+            return (value, pos)
+
+
+# -----------------------------------------------------------------------------
+def _common_dir(git_dir):
+    """
+    Where a worktree's shared objects and refs live (the git dir itself,
+    except in a linked worktree)
+    """
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except (IOError, OSError):
+        return git_dir
+
+
+# -----------------------------------------------------------------------------
+def _object_dirs(objects):
+    """
+    *objects* and the object directories it borrows from (alternates)
+    """
+    rval = [objects]
+    try:
+        with open(os.path.join(objects, 'info', 'alternates')) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    rval.append(os.path.normpath(os.path.join(objects,
+                                                              line)))
+    except (IOError, OSError):
+        pass
+    return rval
@@ -0,0 +1,207 @@
+"""
+Write subcommand results as json, jsonl, or csv
+
+A writer takes records (dicts) one at a time and writes them to stdout in
+batches, so a scan that finds a hundred thousand things never holds the
+whole report in memory, and doesn't pay for a write and flush per line
+either. Each record is written with the writer's fields, in order; fields
+a record lacks come out as null (json) or empty (csv).
+"""
+import collections
+import csv
+import json
+import sys
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+FORMATS = ['text', 'json', 'jsonl', 'csv']
+
+# how many records to collect before writing them out
+BATCH = 1000
+
+
+# -----------------------------------------------------------------------------
+class Writer(object):
+    """
+    Collect formatted records and write them to *stream* (default: stdout)
+    *batch* at a time. Subclasses say how a record is formatted and what
+    goes before and after the records.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, fields, stream=None, batch=BATCH):
+        self.fields = fields
+        self.stream = stream or sys.stdout
+        self.batch = batch
+        self.count = 0
+        self._pending = [self.header()]
+        self._batched = 0
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, *args):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def header(self):
+        """
+        What goes before the first record
+        """
+        return ''
+
+    # -------------------------------------------------------------------------
+    def trailer(self):
+        """
+        What goes after the last record
+        """
+        return ''
+
+    # -------------------------------------------------------------------------
+    def format(self, rec):
+        """
+        Return record *rec* as text
+        """
+        raise NotImplementedError
+
+    # -------------------------------------------------------------------------
+    def ordered(self, rec):
+        """
+        *rec*'s values for our fields, in order, as an OrderedDict
+        """
+        return collections.OrderedDict((f, rec.get(f)) for f in self.fields)
+
+    # -------------------------------------------------------------------------
+    def write(self, rec):
+        """
+        Add record *rec*, writing out the batch if it's full
+        """
+        self._pending.append(self.format(rec))
+        self.count += 1
+        self._batched += 1
+        if self.batch <= self._batched:
+            self.flush()
+
+    # -------------------------------------------------------------------------
+    def flush(self):
+        """
+        Write out whatever has been collected
+        """
+        if self._pending:
+            self.stream.write(''.join(self._pending))
+            self._pending = []
+            self._batched = 0
+        self.stream.flush()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        Write the rest of the records and the trailer
+        """
+        self._pending.append(self.trailer())
+        self.flush()
+
+
+# -----------------------------------------------------------------------------
+class JSONLWriter(Writer):
+    """
+    One JSON object per line
+    """
+    # -------------------------------------------------------------------------
+    def format(self, rec):
+        return json.dumps(self.ordered(rec)) + '\n'
+
+
+# -----------------------------------------------------------------------------
+class JSONWriter(Writer):
+    """
+    A JSON list of objects, written as it goes
+    """
+    # -------------------------------------------------------------------------
+    def header(self):
+        return '['
+
+    # -------------------------------------------------------------------------
+    def format(self, rec):
+        sep = '\n' if self.count == 0 else ',\n'
+        return sep + json.dumps(self.ordered(rec))
+
+    # -------------------------------------------------------------------------
+    def trailer(self):
+        return '\n]\n' if self.count else ']\n'
+
+
+# -----------------------------------------------------------------------------
+class CSVWriter(Writer):
+    """
+    Comma separated values with a header line naming the fields
+    """
+    # -------------------------------------------------------------------------
+    def header(self):
+        return self._row(self.fields)
+
+    # -------------------------------------------------------------------------
+    def format(self, rec):
+        return self._row(['' if v is None else v
+                          for v in self.ordered(rec).values()])
+
+    # -------------------------------------------------------------------------
+    def _row(self, values):
+        """
+        *values* as one line of csv. Python 2's csv module only writes
+        bytes, so text is encoded as UTF-8 there.
+        """
+        if str is bytes:
+            values = [v.encode('utf-8') if isinstance(v, type(u'')) else v
+                      for v in values]
+        buf = StringIO()
+        csv.writer(buf, lineterminator='\n').writerow(values)
+        return buf.getvalue()
+
+
+WRITERS = {'json': JSONWriter,
+           'jsonl': JSONLWriter,
+           'csv': CSVWriter,
+           }
+
+
+# -----------------------------------------------------------------------------
+def writer(fmt, fields, stream=None, batch=BATCH):
+    """
+    Return a Writer for format *fmt* ('json', 'jsonl', or 'csv')
+    """
+    return WRITERS[fmt](fields, stream, batch)
+
+
+# -----------------------------------------------------------------------------
+def write_all(fmt, fields, records, stream=None, batch=BATCH):
+    """
+    Write each of *records* (an iterable of dicts, consumed as it goes) in
+    format *fmt*. Return how many there were.
+    """
+    with writer(fmt, fields, stream, batch) as w:
+        for rec in records:
+            w.write(rec)
+    return w.count
+
+
+# -----------------------------------------------------------------------------
+def copy_lines(src, stream=None, batch=BATCH):
+    """
+    Copy the lines of binary file *src* (a pipe, say) to *stream* (default:
+    stdout) as text, *batch* lines at a time
+    """
+    stream = stream or sys.stdout
+    pending = []
+    for line in iter(src.readline, b''):
+        if not isinstance(line, str):
+            line = line.decode('utf-8', 'replace')
+        pending.append(line)
+        if batch <= len(pending):
+            stream.write(''.join(pending))
+            pending = []
+    stream.write(''.join(pending))
+    stream.flush()
@@ -0,0 +1,203 @@
+"""
+Work with a repository's objects directly through git's plumbing commands
+
+Nothing here needs a working tree, so these work in bare repositories,
+mirrors, and shallow clones as well as in ordinary checkouts.
+"""
+import os
+import subprocess
+
+import tbx
+
+git = tbx.lazy_import('git')
+
+
+# -----------------------------------------------------------------------------
+def find_git_dir(start=None):
+    """
+    Return the git directory for *start* (default '.'). $GIT_DIR wins if it's
+    set. Otherwise, stepping up from *start*, we accept a .git directory, a
+    .git file pointing elsewhere ('gitdir: ...', as in worktrees and
+    submodules), or a directory that is itself a bare repository.
+    """
+    if os.environ.get('GIT_DIR'):
+        return os.path.abspath(os.environ['GIT_DIR'])
+    loc = os.path.abspath(start or os.getcwd())
+    while True:
+        clue = os.path.join(loc, '.git')
+        if os.path.isdir(clue):
+            return clue
+        if os.path.isfile(clue):
+            with open(clue, 'r') as f:
+                line = f.readline().strip()
+            if line.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(loc,
+                                                     line[7:].strip()))
+        if is_bare(loc):
+            return loc
+        if len(loc) <= 1 or os.path.dirname(loc) == loc:
+            break
+        loc = os.path.dirname(loc)
+    raise git.InvalidGitRepositoryError(start or os.getcwd())
+
+
+# -----------------------------------------------------------------------------
+def is_bare(path):
+    """
+    Does *path* look like a bare repository?
+    """
+    return (os.path.isfile(os.path.join(path, 'HEAD')) and
+            os.path.isdir(os.path.join(path, 'objects')) and
+            os.path.isdir(os.path.join(path, 'refs')))
+
+
+# -----------------------------------------------------------------------------
+def run(git_dir, *args, **kw):
+    """
+    Run 'git --git-dir=<git_dir> <args>', passing bytes *input* (a keyword
+    argument) on stdin, and return its stdout as bytes. Raise
+    git.GitCommandError if the command fails.
+    """
+    cmd = ['git', '--git-dir=' + git_dir] + list(args)
+    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    (out, err) = p.communicate(kw.get('input'))
+    if p.returncode != 0:
+        raise git.GitCommandError(cmd, p.returncode, err)
+    return out
+
+
+# -----------------------------------------------------------------------------
+def rev_parse(git_dir, rev):
+    """
+    Return the full object id that *rev* names
+    """
+    return run(git_dir, 'rev-parse', '--verify', '--quiet',
+               rev).decode().strip()
+
+
+# -----------------------------------------------------------------------------
+def ls_tree(git_dir, tree):
+    """
+    Return the entries of *tree* as a list of (mode, type, sha, name)
+    """
+    rval = []
+    for rec in run(git_dir, 'ls-tree', '-z', tree).split(b'\0'):
+        if rec:
+            (meta, name) = rec.split(b'\t', 1)
+            (mode, typ, sha) = meta.decode().split()
+            rval.append((mode, typ, sha, name))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def rev_list(git_dir, rev):
+    """
+    Return [(sha, commit time)] for the commits in *rev* (a range like
+    'v1.0..HEAD', or a single commit meaning it and all its ancestors),
+    oldest first
+    """
+    out = run(git_dir, 'rev-list', '--reverse', '--timestamp', rev, '--')
+    rval = []
+    for line in out.decode().splitlines():
+        (when, sha) = line.split()
+        rval.append((sha, int(when)))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def find_in_tree(git_dir, commit, name):
+    """
+    Return the paths in *commit*'s tree whose last component is *name*,
+    shallowest first
+    """
+    out = run(git_dir, 'ls-tree', '-r', '-z', '--name-only', commit)
+    paths = [p.decode('utf-8') for p in out.split(b'\0') if p]
+    hits = [p for p in paths if p.split('/')[-1] == name]
+    return sorted(hits, key=lambda p: (p.count('/'), p))
+
+
+# -----------------------------------------------------------------------------
+def read_blob(git_dir, commit, path):
+    """
+    Return (mode, sha, data) for the blob at *path* in *commit*
+    """
+    (parent, _, base) = path.rpartition('/')
+    tree = rev_parse(git_dir, '{0}:{1}'.format(commit, parent))
+    for (mode, typ, sha, name) in ls_tree(git_dir, tree):
+        if name == base.encode('utf-8') and typ == 'blob':
+            return (mode, sha, run(git_dir, 'cat-file', 'blob', sha))
+    raise KeyError(path)
+
+
+# -----------------------------------------------------------------------------
+def write_blob(git_dir, data):
+    """
+    Store *data* as a blob and return its id
+    """
+    return run(git_dir, 'hash-object', '-w', '-t', 'blob', '--stdin',
+               input=data).decode().strip()
+
+
+# -----------------------------------------------------------------------------
+def replace_blob(git_dir, tree, path, mode, sha):
+    """
+    Return the id of a new tree that is *tree* with the entry at *path*
+    pointing at blob *sha*. Each tree on the way down to *path* is rewritten
+    with 'git mktree'; everything else is shared with the original.
+    """
+    (first, _, rest) = path.partition('/')
+    name = first.encode('utf-8')
+    entries = ls_tree(git_dir, tree)
+    for n, (emode, etyp, esha, ename) in enumerate(entries):
+        if ename == name:
+            if rest:
+                entries[n] = (emode, etyp,
+                              replace_blob(git_dir, esha, rest, mode, sha),
+                              ename)
+            else:
+                entries[n] = (mode, 'blob', sha, ename)
+            break
+    else:
+        raise KeyError(path)
+    data = b''.join('{0} {1} {2}\t'.format(m, t, s).encode() + e + b'\0'
+                    for (m, t, s, e) in entries)
+    return run(git_dir, 'mktree', '-z', input=data).decode().strip()
+
+
+# -----------------------------------------------------------------------------
+def commit_tree(git_dir, tree, parent, message):
+    """
+    Create a commit of *tree* on top of *parent* and return its id
+    """
+    return run(git_dir, 'commit-tree', tree, '-p', parent, '-m',
+               message).decode().strip()
+
+
+# -----------------------------------------------------------------------------
+def update_ref(git_dir, ref, new, old):
+    """
+    Move *ref* from *old* to *new*, failing if someone else moved it first
+    """
+    run(git_dir, 'update-ref', '-m', 'gitr bv', ref, new, old)
+
+
+# -----------------------------------------------------------------------------
+def checked_out(git_dir):
+    """
+    Return the set of branches (full ref names) checked out in the working
+    trees of *git_dir*'s repository
+    """
+    out = run(git_dir, 'worktree', 'list', '--porcelain').decode('utf-8')
+    return set(line[7:] for line in out.splitlines()
+               if line.startswith('branch '))
+
+
+# -----------------------------------------------------------------------------
+def full_ref(git_dir, rev):
+    """
+    Return the full ref name (refs/heads/...) that *rev* names, or '' if it
+    isn't a ref (a commit id, say, or HEAD~2)
+    """
+    return run(git_dir, 'rev-parse', '--symbolic-full-name',
+               rev).decode().strip()
@@ -0,0 +1,535 @@
+"""
+Answer "is commit X in branch A, and how far back?" in bulk
+
+The set of commits reachable from a commit is kept as a bitset (a Python
+int) over the positions of an index, plus a set holding the ids of any
+commits the index doesn't cover. The index is git's reachability bitmap
+when the repo has one (git repack -b, or repack.writeBitmaps), and
+otherwise gitr's own, kept in .git/gitr/graph: every commit reachable from
+a ref gets a position, parents before children, and what's reachable is
+stored, compressed, for each ref tip and every STRIDE'th position. Each
+commit's time is kept there too, in a column aligned with the positions,
+so dates across any range of history come from one read (see
+GraphIndex.times()) rather than one commit at a time. Either
+way, a commit's reachable set is found by walking back only as far as the
+nearest commits with a stored bitmap. Once a ref's set is known, whether
+a commit is in it is a bit test and how far back a popcount.
+"""
+import binascii
+import collections
+import hashlib
+import json
+import os
+import struct
+import zlib
+
+import tbx
+
+# gitr's index stores what's reachable from every STRIDE'th commit
+STRIDE = 128
+
+# bump when the layout of .git/gitr/graph changes; older indexes are rebuilt
+GRAPH_VERSION = 2
+
+BITMAP_MAGIC = b'BITM'
+BITMAP_FULL_DAG = 1
+
+# what's reachable from a commit: *bits* over the index's positions and
+# *extras*, the ids of commits that have no position
+Reach = collections.namedtuple('Reach', ['bits', 'extras'])
+
+
+# -----------------------------------------------------------------------------
+class Engine(object):
+    """
+    Containment and distance queries over the repo *db* (an odb.ObjectDB)
+    reads, using *index* (default: whatever open_index() finds). Reachable
+    sets are remembered, so asking about many commits against a few refs
+    walks each ref's history once.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, db, index=None):
+        self.db = db
+        self.index = open_index(db) if index is None else index
+        self._reach = {}
+        self._counts = {}
+
+    # -------------------------------------------------------------------------
+    def reach(self, sha):
+        """
+        Return the Reach of commit *sha*
+        """
+        if sha in self._reach:
+            return self._reach[sha]
+        (bits, own, extras) = (0, [], set())
+        seen = set()
+        todo = [sha]
+        while todo:
+            here = todo.pop()
+            if here in seen:
+                continue
+            seen.add(here)
+            pos = self.index.position(here)
+            if pos is not None:
+                stored = self.index.bitmap(pos)
+                if stored is not None:
+                    bits |= stored
+                    continue
+                own.append(pos)
+            else:
+                extras.add(here)
+            todo.extend(self.db.commit(here).parents)
+        rval = self._reach[sha] = Reach(bits | from_positions(own),
+                                        frozenset(extras))
+        return rval
+
+    # -------------------------------------------------------------------------
+    def contains(self, tip, sha):
+        """
+        Whether commit *sha* is reachable from commit *tip*
+        """
+        r = self.reach(tip)
+        pos = self.index.position(sha)
+        if pos is None:
+            return sha in r.extras
+        return bool(r.bits >> pos & 1)
+
+    # -------------------------------------------------------------------------
+    def count(self, tip, base=None):
+        """
+        How many commits are reachable from *tip* but not from *base* (if
+        given)
+        """
+        if base is None and tip in self._counts:
+            return self._counts[tip]
+        r = self.reach(tip)
+        (bits, extras) = (r.bits & self.index.commits, r.extras)
+        if base is not None:
+            b = self.reach(base)
+            bits &= ~b.bits
+            extras = extras - b.extras
+        rval = popcount(bits) + len(extras)
+        if base is None:
+            self._counts[tip] = rval
+        return rval
+
+    # -------------------------------------------------------------------------
+    def distance(self, tip, sha):
+        """
+        Return (whether commit *sha* is reachable from *tip*, how many
+        commits *tip* has that *sha* doesn't)
+        """
+        if self.contains(tip, sha):
+            return (True, self.count(tip) - self.count(sha))
+        return (False, self.count(tip, sha))
+
+
+# -----------------------------------------------------------------------------
+class GraphIndex(object):
+    """
+    gitr's own reachability index, in directory *path*: the ids of the
+    commits in position order ('commits'), their commit times ('times',
+    8 bytes each), compressed bitmaps for some of them ('bitmaps'), and how
+    much of each file is valid ('meta'). In a shallow clone, *shallow*
+    names the cut the index was built against; an index built against
+    another (before a deeper fetch, say) is rebuilt.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, path, shallow=''):
+        self.path = path
+        self.shallow = shallow
+        self.commits = -1
+        self._shas = []
+        self._pos = {}
+        self._times = []
+        self._stored = {}
+        self._bitmaps = {}
+        self._new_bitmaps = []
+        self._loaded = {}
+        self._load()
+
+    # -------------------------------------------------------------------------
+    def _load(self):
+        """
+        Read the index from disk; a missing, stale, or damaged index just
+        means starting from nothing
+        """
+        try:
+            with open(os.path.join(self.path, 'meta')) as f:
+                meta = json.load(f)
+            if meta['version'] != GRAPH_VERSION or \
+               meta.get('shallow', '') != self.shallow:
+                return
+            count = meta['count']
+            with open(os.path.join(self.path, 'commits'), 'rb') as f:
+                data = f.read(20 * count)
+            with open(os.path.join(self.path, 'times'), 'rb') as f:
+                times = f.read(8 * count)
+            with open(os.path.join(self.path, 'bitmaps'), 'rb') as f:
+                blobs = f.read(meta['bitmaps'])
+        except (IOError, OSError, ValueError, KeyError):
+            return
+        if (len(data), len(times), len(blobs)) != (20 * count, 8 * count,
+                                                   meta['bitmaps']):
+            return
+        self._loaded = meta
+        self._shas = [data[n:n + 20] for n in range(0, len(data), 20)]
+        self._pos = dict((sha, n) for (n, sha) in enumerate(self._shas))
+        self._times = list(struct.unpack('<{0}q'.format(count), times))
+        off = 0
+        while off < len(blobs):
+            (pos, size) = struct.unpack('<II', blobs[off:off + 8])
+            self._stored[pos] = blobs[off + 8:off + 8 + size]
+            off += 8 + size
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._shas)
+
+    # -------------------------------------------------------------------------
+    def position(self, sha):
+        """
+        The position of commit *sha* (hex), or None
+        """
+        return self._pos.get(binascii.unhexlify(sha))
+
+    # -------------------------------------------------------------------------
+    def sha(self, pos):
+        """
+        The hex id of the commit at *pos*
+        """
+        return binascii.hexlify(self._shas[pos]).decode()
+
+    # -------------------------------------------------------------------------
+    def time(self, pos):
+        """
+        The commit time of the commit at *pos*
+        """
+        return self._times[pos]
+
+    # -------------------------------------------------------------------------
+    def times(self, bits):
+        """
+        The commit times of the commits whose positions are set in *bits*,
+        in position order (parents before children)
+        """
+        return [self._times[pos] for pos in positions(bits)]
+
+    # -------------------------------------------------------------------------
+    def bitmap(self, pos):
+        """
+        What's reachable from the commit at *pos*, if that's stored
+        """
+        if pos not in self._bitmaps:
+            if pos not in self._stored:
+                return None
+            self._bitmaps[pos] = from_bytes(zlib.decompress(
+                self._stored[pos]))
+        return self._bitmaps[pos]
+
+    # -------------------------------------------------------------------------
+    def refresh(self, db, tips):
+        """
+        Give positions to the commits reachable from *tips* that don't have
+        one yet, parents first, and store bitmaps for those that are tips or
+        fall on a STRIDE. Return how many commits were added.
+        """
+        order = []
+        when = {}
+        for tip in tips:
+            todo = [(tip, False)]
+            while todo:
+                (sha, done) = todo.pop()
+                if done:
+                    order.append(sha)
+                    continue
+                if sha in when or self.position(sha) is not None:
+                    continue
+                c = db.commit(sha)
+                when[sha] = c.commit_time
+                todo.append((sha, True))
+                todo.extend((p, False) for p in c.parents if p not in when)
+        for sha in order:
+            self._pos[binascii.unhexlify(sha)] = len(self._shas)
+            self._shas.append(binascii.unhexlify(sha))
+            self._times.append(when[sha])
+        engine = Engine(db, self)
+        wanted = set(tips)
+        for sha in order:
+            pos = self.position(sha)
+            if sha in wanted or pos % STRIDE == STRIDE - 1:
+                bits = engine.reach(sha).bits
+                self._bitmaps[pos] = bits
+                self._new_bitmaps.append((pos, bits))
+        for sha in wanted - set(order):
+            pos = self.position(sha)
+            if pos is not None and self.bitmap(pos) is None:
+                bits = engine.reach(sha).bits
+                self._bitmaps[pos] = bits
+                self._new_bitmaps.append((pos, bits))
+        return len(order)
+
+    # -------------------------------------------------------------------------
+    def save(self):
+        """
+        Append what refresh() added to the files and record the new sizes.
+        The sizes are written last, so a save that fails part way leaves
+        the index as it was. If another process has saved since we loaded,
+        its work stands and ours is dropped. Failing to write (a read-only
+        repo, say) isn't an error; the index is just rebuilt next time.
+        """
+        saved = self._loaded.get('count', 0)
+        if saved == len(self._shas) and not self._new_bitmaps:
+            return
+        try:
+            if self._meta() != self._loaded and self._loaded:
+                return
+            tbx.makedirs(self.path)
+            blobs = []
+            for (pos, bits) in self._new_bitmaps:
+                z = zlib.compress(to_bytes(bits))
+                self._stored[pos] = z
+                blobs.append(struct.pack('<II', pos, len(z)) + z)
+            times = self._times[saved:]
+            self._append('commits', 20 * saved, b''.join(self._shas[saved:]))
+            self._append('times', 8 * saved,
+                         struct.pack('<{0}q'.format(len(times)), *times))
+            size = self._append('bitmaps', self._loaded.get('bitmaps', 0),
+                                b''.join(blobs))
+            meta = {'version': GRAPH_VERSION, 'count': len(self._shas),
+                    'bitmaps': size, 'shallow': self.shallow}
+            with tbx.atomic_rewrite(os.path.join(self.path, 'meta'),
+                                    'w') as f:
+                json.dump(meta, f)
+        except (IOError, OSError):
+            return
+        self._loaded = meta
+        self._new_bitmaps = []
+
+    # -------------------------------------------------------------------------
+    def _meta(self):
+        """
+        What 'meta' says now, or {} if it's missing or stale
+        """
+        try:
+            with open(os.path.join(self.path, 'meta')) as f:
+                meta = json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+        return meta if meta.get('version') == GRAPH_VERSION else {}
+
+    # -------------------------------------------------------------------------
+    def _append(self, name, valid, data):
+        """
+        Cut file *name* back to its first *valid* bytes (dropping anything a
+        failed save left) and append *data*. Return the new size.
+        """
+        path = os.path.join(self.path, name)
+        with open(path, 'ab') as f:
+            f.truncate(valid)
+            f.write(data)
+        return valid + len(data)
+
+
+# -----------------------------------------------------------------------------
+class PackBitmap(object):
+    """
+    The reachability bitmap git wrote for Pack *pack*, in file *path*.
+    Objects are numbered by where they are in the packfile. Raise
+    ValueError if the file is not one we can read or belongs to another
+    pack.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, pack, path):
+        with open(path, 'rb') as f:
+            self.data = data = f.read()
+        if data[:4] != BITMAP_MAGIC:
+            raise ValueError('{0}: not a bitmap'.format(path))
+        (version, flags, count) = struct.unpack('>HHI', data[4:12])
+        if version != 1 or not flags & BITMAP_FULL_DAG:
+            raise ValueError('{0}: unsupported bitmap'.format(path))
+        if data[12:32] != pack.checksum():
+            raise ValueError('{0}: not for {1}'.format(path, pack.pack_path))
+        self.pack = pack
+        off = 32
+        types = []
+        for _ in range(4):
+            types.append(off)
+            off = _ewah_end(data, off)
+        self.commits = ewah(data, types[0])
+        self._entries = []
+        self._by_pos = {}
+        for n in range(count):
+            (where, xor, _) = struct.unpack('>IBB', data[off:off + 6])
+            self._entries.append((off + 6, n - xor if xor else None))
+            self._by_pos[pack.rank(where)] = n
+            off = _ewah_end(data, off + 6)
+        self._bitmaps = {}
+
+    # -------------------------------------------------------------------------
+    def position(self, sha):
+        """
+        Where commit *sha* (hex) is in the pack, or None
+        """
+        n = self.pack.position(binascii.unhexlify(sha))
+        return None if n is None else self.pack.rank(n)
+
+    # -------------------------------------------------------------------------
+    def bitmap(self, pos):
+        """
+        What's reachable from the object at *pos*, if git stored that
+        """
+        n = self._by_pos.get(pos)
+        return None if n is None else self._entry(n)
+
+    # -------------------------------------------------------------------------
+    def _entry(self, n):
+        """
+        The bitmap of entry *n*, undoing the xor against an earlier entry
+        that git stores it as
+        """
+        if n not in self._bitmaps:
+            chain = []
+            base = n
+            while base is not None and base not in self._bitmaps:
+                chain.append(base)
+                base = self._entries[base][1]
+            bits = self._bitmaps[base] if base is not None else 0
+            for m in reversed(chain):
+                bits ^= ewah(self.data, self._entries[m][0])
+                self._bitmaps[m] = bits
+        return self._bitmaps[n]
+
+
+# -----------------------------------------------------------------------------
+def open_index(db):
+    """
+    Return the index to answer reachability questions about the repo *db*
+    reads: the bitmap git wrote for one of its packs, if there is one, or
+    gitr's own, brought up to date with the refs and saved
+    """
+    for p in db.packs():
+        path = p.idx_path[:-4] + '.bitmap'
+        if os.path.exists(path):
+            try:
+                return PackBitmap(p, path)
+            except ValueError:
+                continue
+    return graph_index(db)
+
+
+# -----------------------------------------------------------------------------
+def graph_index(db):
+    """
+    Return gitr's index for the repo *db* reads, brought up to date with
+    the refs and saved
+    """
+    cut = ' '.join(sorted(db.shallow()))
+    index = GraphIndex(os.path.join(db.common_dir, 'gitr', 'graph'),
+                       hashlib.sha1(cut.encode()).hexdigest() if cut else '')
+    index.refresh(db, ref_commits(db))
+    index.save()
+    return index
+
+
+# -----------------------------------------------------------------------------
+def ref_commits(db):
+    """
+    The commits that refs (and HEAD) point at, tags peeled
+    """
+    rval = []
+    head = db.ref('HEAD')
+    for sha in sorted(set(db.refs().values()) | set([head] if head else [])):
+        try:
+            sha = db.peel(sha)
+            db.commit(sha)
+        except KeyError:
+            continue
+        rval.append(sha)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def ewah(data, off):
+    """
+    Decode the EWAH-compressed bitmap at *off* in *data* into an int (bit n
+    is object n)
+    """
+    (_, nwords) = struct.unpack('>II', data[off:off + 8])
+    words = struct.unpack('>{0}Q'.format(nwords),
+                          data[off + 8:off + 8 + 8 * nwords])
+    out = []
+    n = 0
+    while n < nwords:
+        rlw = words[n]
+        n += 1
+        run = (rlw >> 1) & 0xffffffff
+        literal = rlw >> 33
+        out.extend([0xffffffffffffffff if rlw & 1 else 0] * run)
+        out.extend(words[n:n + literal])
+        n += literal
+    return from_bytes(struct.pack('<{0}Q'.format(len(out)), *out))
+
+
+# -----------------------------------------------------------------------------
+def _ewah_end(data, off):
+    """
+    Where the EWAH bitmap at *off* in *data* ends
+    """
+    (_, nwords) = struct.unpack('>II', data[off:off + 8])
+    return off + 8 + 8 * nwords + 4
+
+
+# -----------------------------------------------------------------------------
+def from_positions(positions):
+    """
+    An int with the bits at *positions* set
+    """
+    if not positions:
+        return 0
+    buf = bytearray(max(positions) // 8 + 1)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return from_bytes(bytes(buf))
+
+
+# -----------------------------------------------------------------------------
+def from_bytes(data):
+    """
+    The int whose little-endian bytes are *data*
+    """
+    if not data:
+        return 0
+    return int(binascii.hexlify(data[::-1]), 16)
+
+
+# -----------------------------------------------------------------------------
+def to_bytes(bits):
+    """
+    The little-endian bytes of non-negative int *bits*
+    """
+    text = '{0:x}'.format(bits)
+    if len(text) % 2:
+        text = '0' + text
+    return binascii.unhexlify(text)[::-1]
+
+
+# -----------------------------------------------------------------------------
+def positions(bits):
+    """
+    Generate the positions of the bits set in non-negative int *bits*, in
+    order
+    """
+    for (n, byte) in enumerate(bytearray(to_bytes(bits))):
+        if byte:
+            for k in range(8):
+                if byte >> k & 1:
+                    yield 8 * n + k
+
+
+# -----------------------------------------------------------------------------
+def popcount(bits):
+    """
+    How many bits of non-negative int *bits* are set
+    """
+    return bin(bits).count('1')
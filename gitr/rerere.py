@@ -0,0 +1,379 @@
+"""
+Remember how conflicts were resolved, and resolve them that way again
+
+This is gitr's own take on git's rerere, so it works whether or not
+rerere.enabled is set. A conflict hunk is known by its fingerprint: the
+hash of its two sides, each normalized as resolve.normal() does, in sorted
+order, so the same conflict met the other way round (rebasing rather than
+merging) matches too.
+
+When flix sees a file with conflict markers it keeps the file's hunks and
+the text between them (the preimage) under .git/gitr/rr-pending, with the
+merge (or cherry-pick, revert, or rebase step) under way and the commit it
+started from. A later flix run finds what each hunk became by looking for
+the text around it in the resolved file, and stores that under the hunk's
+fingerprint. The resolved file is what's staged, if the merge is still in
+progress, or else what the commit that concluded it has: a commit on top
+of the one the merge started from that HEAD moved to or still descends
+from, with the merged commit among its parents (or, for a cherry-pick or
+rebase step, the picked commit's author time; for a revert, its id in the
+message). Once the merge is over, what's pending is dropped, whether it
+was learned from or not, so an aborted merge teaches nothing.
+
+Resolutions are kept in a cache.BlobCache of their own (.git/gitr/rr),
+looked up by fingerprint and evicted least recently used first once the
+cache outgrows its cap.
+"""
+import hashlib
+import json
+import os
+
+import analyze
+import cache
+import gitindex
+import odb
+import resolve
+import tbx
+
+# default cap on the resolutions kept, in bytes on disk
+MAX_BYTES = 8 * 1024 * 1024
+
+# the version of the records stored
+VERSION = 1
+
+# the files git leaves while a merge, cherry-pick, revert, or rebase step
+# is waiting for conflicts to be resolved
+IN_PROGRESS = ['MERGE_HEAD', 'CHERRY_PICK_HEAD', 'REVERT_HEAD',
+               'REBASE_HEAD']
+
+# how far back from HEAD (first parents) to look for the commit that
+# concluded a merge we remembered hunks in
+LOOKBACK = 100
+
+
+# -----------------------------------------------------------------------------
+def fingerprint(ours, theirs):
+    """
+    The fingerprint (hex) of a hunk whose sides are lists of lines *ours*
+    and *theirs*
+    """
+    sides = sorted([resolve.normal(ours), resolve.normal(theirs)])
+    h = hashlib.sha1()
+    for side in sides:
+        h.update(hashlib.sha1(side).digest())
+    return h.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+class Resolutions(object):
+    """
+    The resolutions recorded for the repo whose git directory is *git_dir*
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, git_dir, max_bytes=MAX_BYTES):
+        """
+        Set up to keep at most *max_bytes* of resolutions
+        """
+        self.git_dir = git_dir
+        self.cache = cache.BlobCache(git_dir, max_bytes, 'rr')
+        self.pending = os.path.join(git_dir, 'gitr', 'rr-pending')
+
+    # -------------------------------------------------------------------------
+    def get(self, ours, theirs):
+        """
+        Return the recorded resolution (a list of lines) of the hunk with
+        sides *ours* and *theirs*, or None
+        """
+        rec = self.cache.get(fingerprint(ours, theirs), 'resolution', VERSION)
+        if rec is None:
+            return None
+        return [_bytes(line) for line in rec]
+
+    # -------------------------------------------------------------------------
+    def put(self, ours, theirs, lines):
+        """
+        Record *lines* as the resolution of the hunk with sides *ours* and
+        *theirs*
+        """
+        self.cache.put(fingerprint(ours, theirs), 'resolution', VERSION,
+                       [_text(line) for line in lines])
+
+    # -------------------------------------------------------------------------
+    def known(self, data):
+        """
+        Return a list saying, for each hunk in the conflicted file *data*,
+        whether it has a recorded resolution
+        """
+        return [self.get(seg[1], seg[2]) is not None
+                for seg in resolve.split(data) if seg[0] == 'hunk']
+
+    # -------------------------------------------------------------------------
+    def remember(self, path, data):
+        """
+        Keep the hunks of file *path* (relative to the repo root), whose
+        conflicted contents are *data*, so learn() can find out later how
+        they were resolved. They're kept with the merge (or cherry-pick,
+        revert, or rebase step) in progress; with none, there's nothing to
+        learn from. Failing to write isn't an error.
+        """
+        op = in_progress(self.git_dir)
+        segs = [[seg[0]] + [[_text(line) for line in part]
+                            for part in seg[1:3]]
+                for seg in resolve.split(data)]
+        if op is None or not any(seg[0] == 'hunk' for seg in segs):
+            return
+        rec = {'path': path, 'op': op[0], 'head': op[1],
+               'ours': _head(self.git_dir), 'segments': segs}
+        try:
+            tbx.makedirs(self.pending)
+            with tbx.atomic_rewrite(self._pending_path(path), 'w') as f:
+                json.dump(rec, f)
+        except (IOError, OSError):
+            pass
+
+    # -------------------------------------------------------------------------
+    def learn(self, root, unmerged):
+        """
+        Record the resolutions of the remembered files (under repo root
+        *root*) that have been resolved. While the merge they were
+        remembered in is in progress, that's a file no longer among the
+        *unmerged* paths whose staged contents are what the working tree
+        has, with no conflict markers. Once it's over, it's the file as the
+        commit that concluded the merge has it, if there is one (see the
+        module docstring); then the file is forgotten, as 'git rerere
+        clear' would, so what an abort leaves behind is never taken for a
+        resolution. Return how many hunks were learned.
+        """
+        try:
+            names = sorted(os.listdir(self.pending))
+        except OSError:
+            return 0
+        op = in_progress(self.git_dir)
+        ours = _head(self.git_dir)
+        learned = 0
+        with gitindex.Index(os.path.join(self.git_dir, 'index')) as idx, \
+                odb.ObjectDB(self.git_dir) as db:
+            for name in names:
+                full = os.path.join(self.pending, name)
+                try:
+                    with open(full, 'r') as f:
+                        rec = json.load(f)
+                    # paths are native strings, so bytes on python 2
+                    path = rec['path']
+                    if str is bytes:
+                        path = path.encode('utf-8')
+                except (IOError, OSError, ValueError, KeyError):
+                    _remove(full)
+                    continue
+                if op is None or [rec.get('op'), rec.get('head'),
+                                  rec.get('ours')] != [op[0], op[1], ours]:
+                    data = _concluded(db, rec, path)
+                    if data is not None:
+                        learned += self._record(rec, data)
+                    _remove(full)
+                    continue
+                if path in unmerged:
+                    continue
+                try:
+                    with open(os.path.join(root, path), 'rb') as f:
+                        data = f.read()
+                except (IOError, OSError):
+                    _remove(full)
+                    continue
+                staged = [e.sha for e in idx.find(path)
+                          if e.stage == 0]
+                if staged != [gitindex.blob_sha(data)]:
+                    continue
+                if analyze.conflicts(data):
+                    continue
+                learned += self._record(rec, data)
+                _remove(full)
+        return learned
+
+    # -------------------------------------------------------------------------
+    def _record(self, rec, data):
+        """
+        Record what the hunks of pending record *rec* became in the
+        resolved file *data*; return how many were
+        """
+        segs = [(seg[0],) + tuple([_bytes(line) for line in part]
+                                  for part in seg[1:])
+                for seg in rec['segments']]
+        resolved = postimage(segs, data.splitlines(True))
+        hunks = [seg for seg in segs if seg[0] == 'hunk']
+        for (seg, lines) in zip(hunks, resolved or []):
+            self.put(seg[1], seg[2], lines)
+        return len(resolved or [])
+
+    # -------------------------------------------------------------------------
+    def _pending_path(self, path):
+        """
+        Where the hunks of *path* are kept until it's resolved
+        """
+        if not isinstance(path, bytes):
+            path = path.encode('utf-8')
+        key = hashlib.sha1(path).hexdigest()
+        return os.path.join(self.pending, key + '.json')
+
+
+# -----------------------------------------------------------------------------
+def in_progress(git_dir):
+    """
+    Return (the file naming it, its contents) for the merge (or
+    cherry-pick, revert, or rebase step) under way in the work tree of
+    *git_dir*, or None if there's no such operation
+    """
+    for name in IN_PROGRESS:
+        try:
+            with open(os.path.join(git_dir, name), 'r') as f:
+                return (name, f.read().strip())
+        except (IOError, OSError):
+            continue
+    return None
+
+
+# -----------------------------------------------------------------------------
+def _head(git_dir):
+    """
+    The commit HEAD names in *git_dir*, or None
+    """
+    try:
+        with odb.ObjectDB(git_dir) as db:
+            return db.rev_parse('HEAD')
+    except KeyError:
+        return None
+
+
+# -----------------------------------------------------------------------------
+def _concluded(db, rec, path):
+    """
+    Return the contents of *path* in the commit that concluded the merge
+    (or other operation) pending record *rec* was kept in: a commit on top
+    of the one the merge started from that HEAD has moved to (as its reflog
+    says) or that's on HEAD's first-parent line. Return None if there's no
+    such commit (the merge was aborted, say), it doesn't have the file, or
+    the file still has conflict markers.
+    """
+    ours = rec.get('ours')
+    heads = rec.get('head', '').split()
+    try:
+        found = [new for (old, new) in _reflog(db.git_dir) if old == ours]
+        sha = db.rev_parse('HEAD')
+        for _ in range(LOOKBACK):
+            if sha == ours:
+                break
+            found.append(sha)
+            parents = db.commit(sha).parents
+            if not parents:
+                break
+            sha = parents[0]
+        for sha in found:
+            c = db.commit(sha)
+            if c.parents[:1] == [ours] and \
+               _concludes(db, c, rec.get('op'), heads):
+                blob = db.find(c.tree, path)
+                data = db.blob(blob) if blob else None
+                if data is None or analyze.conflicts(data):
+                    return None
+                return data
+    except KeyError:
+        return None
+    return None
+
+
+# -----------------------------------------------------------------------------
+def _reflog(git_dir):
+    """
+    The (old, new) commits of HEAD's reflog in *git_dir*, most recent
+    first; [] if there's no reflog
+    """
+    try:
+        with open(os.path.join(git_dir, 'logs', 'HEAD'), 'r') as f:
+            lines = f.readlines()
+    except (IOError, OSError):
+        return []
+    return [tuple(line.split()[:2]) for line in reversed(lines[-LOOKBACK:])
+            if len(line.split()) >= 2]
+
+
+# -----------------------------------------------------------------------------
+def _concludes(db, commit, op, heads):
+    """
+    Does Commit *commit*, made on top of where operation *op* (a name from
+    IN_PROGRESS) on commits *heads* started, conclude it?
+    """
+    if op == 'MERGE_HEAD':
+        return bool(heads) and set(heads) <= set(commit.parents)
+    if not heads:
+        return False
+    if op == 'REVERT_HEAD':
+        return heads[0].encode() in db.read(commit.sha)[1]
+    return db.commit(heads[0]).author_time == commit.author_time
+
+
+# -----------------------------------------------------------------------------
+def postimage(segments, lines):
+    """
+    Return what each hunk of *segments* (see resolve.split()) became in the
+    resolved *lines*, found by matching the text between the hunks, or None
+    if the text between them was changed too (or two hunks were adjacent)
+    """
+    rval = []
+    pos = 0
+    for (n, seg) in enumerate(segments):
+        if seg[0] == 'text':
+            if lines[pos:pos + len(seg[1])] != seg[1]:
+                return None
+            pos += len(seg[1])
+            continue
+        if n + 1 == len(segments):
+            end = len(lines)
+        elif segments[n + 1][0] != 'text':
+            return None
+        elif n + 2 == len(segments):
+            end = len(lines) - len(segments[n + 1][1])
+        else:
+            end = _find(lines, segments[n + 1][1], pos)
+        if end is None or end < pos:
+            return None
+        rval.append(lines[pos:end])
+        pos = end
+    return rval if pos == len(lines) else None
+
+
+# -----------------------------------------------------------------------------
+def _find(lines, run, start):
+    """
+    The first position at or after *start* where *lines* has *run*, or None
+    """
+    for n in range(start, len(lines) - len(run) + 1):
+        if lines[n] == run[0] and lines[n:n + len(run)] == run:
+            return n
+    return None
+
+
+# -----------------------------------------------------------------------------
+def _text(line):
+    """
+    Bytes *line* as text that JSON can hold and give back unchanged
+    """
+    return line.decode('latin-1')
+
+
+# -----------------------------------------------------------------------------
+def _bytes(text):
+    """
+    The bytes _text() was given
+    """
+    return text.encode('latin-1')
+
+
+# -----------------------------------------------------------------------------
+def _remove(path):
+    """
+    Remove *path* if we can
+    """
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
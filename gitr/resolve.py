@@ -0,0 +1,224 @@
+"""
+Resolve trivial merge conflicts from the three versions of a file
+
+flix --auto looks at each conflict hunk git left in a file, taking the
+hunk's base from its '|||||||' section or, failing that, from merging the
+base, ours, and theirs versions of the file (index stages 1, 2, and 3) line
+by line and finding the region with the same two sides. A hunk is resolved
+when
+
+ * both sides made the same change, once trailing white space, line endings,
+   and blank lines are ignored ('same');
+ * one side's change is nothing but such white space, so the other side's
+   is taken ('whitespace');
+ * one side's change is nothing but new version strings (as bv makes), so
+   those are applied to the other side's lines ('version').
+
+Before the rules, a caller can have a hunk looked up among the ones
+resolved by hand before (see rerere), and settled the same way ('cached').
+
+Leading white space is never ignored: in python it's not trivial. A file is
+resolved only if every hunk in it is, and then only the hunks are replaced,
+so edits made elsewhere in the file are kept.
+"""
+import difflib
+import re
+
+import analyze
+import locator
+
+VERSION_RGX = re.compile(locator.VERSION)
+
+# the rules, in the order they're tried
+RULES = ['cached', 'same', 'whitespace', 'version']
+
+
+# -----------------------------------------------------------------------------
+def merge(base, ours, theirs):
+    """
+    Merge lists of lines *ours* and *theirs*, both descended from *base*.
+    Return a list of regions: ('same', lines) where the result is settled,
+    and ('conflict', base lines, our lines, their lines) where both sides
+    changed the same (or adjacent) lines differently.
+    """
+    rval = []
+    (iz, ia, ib) = (0, 0, 0)
+    for (zs, ze, as_, ae, bs, be) in _sync_regions(base, ours, theirs):
+        (z, a, b) = (base[iz:zs], ours[ia:as_], theirs[ib:bs])
+        if z or a or b:
+            if a == b or b == z:
+                _settled(rval, a)
+            elif a == z:
+                _settled(rval, b)
+            else:
+                rval.append(('conflict', z, a, b))
+        _settled(rval, base[zs:ze])
+        (iz, ia, ib) = (ze, ae, be)
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def _settled(regions, lines):
+    """
+    Add *lines* to the result, extending the last region if it's settled
+    """
+    if not lines:
+        return
+    if regions and regions[-1][0] == 'same':
+        regions[-1][1].extend(lines)
+    else:
+        regions.append(('same', list(lines)))
+
+
+# -----------------------------------------------------------------------------
+def _sync_regions(base, ours, theirs):
+    """
+    Return (base start, base end, ours start, ours end, theirs start,
+    theirs end) for each run of lines all three versions share, in order,
+    ending with an empty one at the ends of them all
+    """
+    ma = difflib.SequenceMatcher(None, base, ours,
+                                 autojunk=False).get_matching_blocks()
+    mb = difflib.SequenceMatcher(None, base, theirs,
+                                 autojunk=False).get_matching_blocks()
+    rval = []
+    (i, j) = (0, 0)
+    while i < len(ma) and j < len(mb):
+        (az, aa, alen) = ma[i]
+        (bz, bb, blen) = mb[j]
+        lo = max(az, bz)
+        hi = min(az + alen, bz + blen)
+        if lo < hi:
+            a = aa + lo - az
+            b = bb + lo - bz
+            rval.append((lo, hi, a, a + hi - lo, b, b + hi - lo))
+        if az + alen < bz + blen:
+            i += 1
+        else:
+            j += 1
+    rval.append((len(base), len(base), len(ours), len(ours), len(theirs),
+                 len(theirs)))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def resolve(base, ours, theirs):
+    """
+    Return (lines, rule) settling a conflict region, or None if no rule
+    does
+    """
+    (nz, na, nb) = (normal(base), normal(ours), normal(theirs))
+    if na == nb:
+        return (ours, 'same')
+    if na == nz:
+        return (theirs, 'whitespace')
+    if nb == nz:
+        return (ours, 'whitespace')
+    bumped = bump_onto(base, ours, theirs)
+    if bumped is None:
+        bumped = bump_onto(base, theirs, ours)
+    if bumped is not None:
+        return (bumped, 'version')
+    return None
+
+
+# -----------------------------------------------------------------------------
+def normal(lines):
+    """
+    *lines* with trailing white space and blank lines dropped, as one
+    string of bytes
+    """
+    return b'\n'.join(line.rstrip() for line in lines if line.strip())
+
+
+# -----------------------------------------------------------------------------
+def bump_onto(base, side, other):
+    """
+    If all *side* did to *base* is change version strings, and *other* has
+    the old ones, return *other*'s lines with the new ones put in; otherwise
+    None
+    """
+    (nz, ns) = (normal(base), normal(side))
+    if VERSION_RGX.sub(b'0', nz) != VERSION_RGX.sub(b'0', ns):
+        return None
+    bumps = dict((old, new) for (old, new) in zip(VERSION_RGX.findall(nz),
+                                                  VERSION_RGX.findall(ns))
+                 if old != new)
+    text = b''.join(other)
+    found = set(VERSION_RGX.findall(text))
+    if not bumps or any(old not in found for old in bumps):
+        return None
+    text = VERSION_RGX.sub(lambda m: bumps.get(m.group(0), m.group(0)),
+                           text)
+    return text.splitlines(True)
+
+
+# -----------------------------------------------------------------------------
+def split(data):
+    """
+    Split bytes *data* at its conflict markers into a list of segments:
+    ('text', lines) between hunks and ('hunk', our lines, their lines, base
+    lines) for each hunk, the base being None if the hunk has no '|||||||'
+    section
+    """
+    lines = data.splitlines(True)
+    rval = []
+    pos = 0
+    for (start, base, sep, end) in analyze.conflicts(data):
+        if pos < start - 1:
+            rval.append(('text', lines[pos:start - 1]))
+        rval.append(('hunk', lines[start:(base or sep) - 1],
+                     lines[sep:end - 1],
+                     lines[base:sep - 1] if base else None))
+        pos = end
+    if pos < len(lines):
+        rval.append(('text', lines[pos:]))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def resolve_conflicted(data, base, ours, theirs, known=None):
+    """
+    Settle the conflict hunks in bytes *data*, the file as the merge left
+    it, markers and all; everything outside the hunks is kept as it is,
+    edits included. A hunk's base is its '|||||||' section if it has one,
+    or else the base of the region with the same two sides in the merge of
+    bytes *ours* and *theirs* from *base* (index stages 2, 3, and 1). A
+    hunk is settled by *known*(our lines, their lines), if that's given and
+    returns the lines it was resolved to before (rule 'cached'), or else by
+    the rules. Return (resolved bytes or None, hunk count, [rule for each
+    hunk settled]). The bytes are None unless there was a hunk and every
+    one was settled.
+    """
+    bases = dict(((tuple(r[2]), tuple(r[3])), r[1])
+                 for r in merge(base.splitlines(True), ours.splitlines(True),
+                                theirs.splitlines(True))
+                 if r[0] == 'conflict')
+    out = []
+    rules = []
+    hunks = 0
+    for seg in split(data):
+        if seg[0] == 'text':
+            out.extend(seg[1])
+            continue
+        hunks += 1
+        (a, b, z) = seg[1:]
+        settled = None
+        if known is not None:
+            lines = known(a, b)
+            if lines is not None:
+                settled = (lines, 'cached')
+        if settled is None:
+            if z is None:
+                z = bases.get((tuple(a), tuple(b)))
+            if z is not None:
+                settled = resolve(z, a, b)
+            elif normal(a) == normal(b):
+                settled = (a, 'same')
+        if settled is None:
+            continue
+        out.extend(settled[0])
+        rules.append(settled[1])
+    if not hunks or len(rules) < hunks:
+        return (None, hunks, rules)
+    return (b''.join(out), hunks, rules)
@@ -0,0 +1,164 @@
+"""
+Find structurally similar functions (likely copy-and-paste clones)
+
+Each function's body is reduced to the sequence of its AST node types, so
+renaming variables or changing constants doesn't hide a copy. Overlapping
+runs of SHINGLE node types are hashed and summarized in a MinHash signature
+of K values; the fraction of positions where two signatures agree estimates
+the Jaccard similarity of the functions' shingle sets.
+
+Rather than compare every pair, signatures are split into BANDS bands of
+K / BANDS values (locality-sensitive hashing): two functions are candidates
+only if they agree on a whole band. Bands are processed one at a time, so
+only one band's buckets are held in memory, and the signatures themselves
+live in one flat array of 32 bit values, each keyed by an int (an index
+into the caller's table of functions, say) held in another; keys are only
+turned into anything bigger for the pairs reported. A pair that shares
+several bands is reported from the first of them, found by comparing the two
+signatures again rather than by remembering every pair reported.
+"""
+import array
+import ast
+import random
+import zlib
+
+K = 64
+BANDS = 16
+SHINGLE = 4
+MIN_SHINGLES = 8
+
+# don't compare within buckets bigger than this -- they are full of trivial
+# look-alikes and would make the comparison quadratic
+MAX_BUCKET = 200
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_COEFFS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME))
+           for _ in range(K)]
+
+
+# -----------------------------------------------------------------------------
+def shape(node):
+    """
+    Return the list of AST node type names in *node*'s body, in depth-first
+    order. The function's own name, arguments, and decorators are left out,
+    and so are identifiers and constants.
+    """
+    rval = []
+    stack = list(reversed(getattr(node, 'body', [])))
+    while stack:
+        n = stack.pop()
+        rval.append(type(n).__name__)
+        stack.extend(reversed(list(ast.iter_child_nodes(n))))
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def signature(tokens):
+    """
+    Return the MinHash signature (a list of K ints) of the SHINGLE-long runs
+    in *tokens*, or None if there are fewer than MIN_SHINGLES of them
+    """
+    nshingles = len(tokens) - SHINGLE + 1
+    if nshingles < MIN_SHINGLES:
+        return None
+    hashes = set()
+    for n in range(nshingles):
+        sh = ' '.join(tokens[n:n + SHINGLE]).encode()
+        hashes.add(zlib.crc32(sh) & 0xffffffff)
+    return [min((a * h + b) % _PRIME for h in hashes) & 0xffffffff
+            for (a, b) in _COEFFS]
+
+
+# -----------------------------------------------------------------------------
+class Signatures(object):
+    """
+    MinHash signatures stored end to end in one array, with a caller-supplied
+    int key for each in another
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self):
+        self.sigs = array.array('I')
+        self.keys = array.array('i')
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.keys)
+
+    # -------------------------------------------------------------------------
+    def add(self, key, sig):
+        """
+        Append signature *sig* for int *key*
+        """
+        self.sigs.extend(sig)
+        self.keys.append(key)
+
+    # -------------------------------------------------------------------------
+    def similarity(self, i, j):
+        """
+        Estimated Jaccard similarity of signatures *i* and *j*
+        """
+        s = self.sigs
+        (a, b) = (i * K, j * K)
+        return sum(1 for n in range(K) if s[a + n] == s[b + n]) / float(K)
+
+    # -------------------------------------------------------------------------
+    def candidates(self):
+        """
+        Generate the (i, j) pairs, i < j, that share at least one band,
+        each once
+        """
+        rows = K // BANDS
+        s = self.sigs
+        # the keys of the buckets too big to compare in each band so far
+        skipped = []
+        for band in range(BANDS):
+            buckets = {}
+            for i in range(len(self)):
+                start = i * K + band * rows
+                key = tuple(s[start:start + rows])
+                buckets.setdefault(key, []).append(i)
+            skipped.append(set(key for (key, members) in buckets.items()
+                               if MAX_BUCKET < len(members)))
+            for (key, members) in buckets.items():
+                if len(members) < 2 or key in skipped[band]:
+                    continue
+                for x in range(len(members)):
+                    for y in range(x + 1, len(members)):
+                        if not self._paired(members[x], members[y], band,
+                                            skipped):
+                            yield (members[x], members[y])
+
+    # -------------------------------------------------------------------------
+    def _paired(self, i, j, band, skipped):
+        """
+        Were signatures *i* and *j* already paired by a band before *band*?
+        They were if they agree on one whose bucket wasn't *skipped*.
+        """
+        rows = K // BANDS
+        s = self.sigs
+        for b in range(band):
+            (x, y) = (i * K + b * rows, j * K + b * rows)
+            if s[x:x + rows] == s[y:y + rows]:
+                if tuple(s[x:x + rows]) not in skipped[b]:
+                    return True
+        return False
+
+    # -------------------------------------------------------------------------
+    def similar(self, threshold, resolve=None):
+        """
+        Return [(score, key_i, key_j)] for candidate pairs whose estimated
+        similarity is at least *threshold*, most similar first. With
+        *resolve*, the keys of the pairs reported are passed through it,
+        and pairs with the same score are ordered by what it returns.
+        """
+        rval = []
+        for (i, j) in self.candidates():
+            score = self.similarity(i, j)
+            if threshold <= score:
+                (a, b) = (self.keys[i], self.keys[j])
+                if resolve is not None:
+                    (a, b) = (resolve(a), resolve(b))
+                rval.append((score, a, b))
+        rval.sort(key=lambda r: (-r[0], r[1], r[2]))
+        return rval
@@ -0,0 +1,517 @@
+"""
+A compact, columnar table of function symbols
+
+On a large tree dupl sees millions of functions. Rather than an object per
+function, the table keeps one array per column (qualified name, name, path,
+line, end line, has-docstring) with every string interned in a StringPool,
+so a row costs a couple of dozen bytes. Finding duplicates is a sort of
+integer name ids rather than string comparisons.
+
+Tables can be saved to a flat file and loaded back with the string data
+left memory-mapped; dupl keeps one per state of the tree this way (see
+api.symbols()).
+
+A SymbolHistory is kept the same way, for dupl --history: a row per
+(name, path) pair seen in a walk through the commits, saying which commits
+first and last had it, so it can be extended as new commits arrive.
+"""
+import array
+import binascii
+import mmap
+import struct
+import sys
+
+import tbx
+
+MAGIC = b'GSYM'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sIII')
+
+# column name -> array typecode; 'i' is a 4-byte int everywhere we run
+COLUMNS = [('qual', 'i'),
+           ('name', 'i'),
+           ('path', 'i'),
+           ('line', 'i'),
+           ('end', 'i'),
+           ('doc', 'B')]
+
+HISTORY_MAGIC = b'GSYH'
+HISTORY_HEADER = struct.Struct('<4sIIIII')
+
+# SymbolHistory's columns, all 4-byte ints
+HISTORY_COLUMNS = [('qual', 'i'),
+                   ('path', 'i'),
+                   ('first', 'i'),
+                   ('last', 'i'),
+                   ('live', 'i'),
+                   ('moved', 'i')]
+
+
+# -----------------------------------------------------------------------------
+class SymtabFormatError(ValueError):
+    """
+    The file is damaged (truncated, say) or not a saved table or history
+    """
+    pass
+
+
+# -----------------------------------------------------------------------------
+class StringPool(object):
+    """
+    Interned strings, each stored once and referred to by an integer id
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, strings=None):
+        """
+        Start with *strings* (a list), if given
+        """
+        self._strings = []
+        self._ids = {}
+        for s in strings or []:
+            self.intern(s)
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._strings)
+
+    # -------------------------------------------------------------------------
+    def __getitem__(self, n):
+        return self._strings[n]
+
+    # -------------------------------------------------------------------------
+    def intern(self, s):
+        """
+        Return the id for *s*, adding it if it's new
+        """
+        try:
+            return self._ids[s]
+        except KeyError:
+            n = self._ids[s] = len(self._strings)
+            self._strings.append(s)
+            return n
+
+    # -------------------------------------------------------------------------
+    def id(self, s):
+        """
+        Return the id for *s*, or None if it isn't in the pool
+        """
+        return self._ids.get(s)
+
+
+# -----------------------------------------------------------------------------
+class MappedStringPool(object):
+    """
+    A read-only StringPool whose strings stay in a mapped file and are
+    decoded when asked for (as native strings, so bytes on python 2)
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, buf, offsets, base):
+        """
+        *offsets* (nstrings + 1 of them) locate each string in *buf*,
+        relative to *base*
+        """
+        self._buf = buf
+        self._offsets = offsets
+        self._base = base
+        self._ids = None
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    # -------------------------------------------------------------------------
+    def __getitem__(self, n):
+        (start, end) = (self._offsets[n], self._offsets[n + 1])
+        return _native(self._buf[self._base + start:self._base + end])
+
+    # -------------------------------------------------------------------------
+    def id(self, s):
+        """
+        Return the id for *s*, or None. The first call builds a lookup dict.
+        """
+        if self._ids is None:
+            self._ids = dict((self[n], n) for n in range(len(self)))
+        return self._ids.get(s)
+
+
+# -----------------------------------------------------------------------------
+class SymbolTable(object):
+    """
+    One row per function, stored by column
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self):
+        """
+        An empty table
+        """
+        self.strings = StringPool()
+        self.cols = dict((name, array.array(code)) for (name, code) in COLUMNS)
+        self._map = None
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.cols['line'])
+
+    # -------------------------------------------------------------------------
+    def add(self, qual, name, path, line, end, doc):
+        """
+        Append a row
+        """
+        intern = self.strings.intern
+        c = self.cols
+        c['qual'].append(intern(qual))
+        c['name'].append(intern(name))
+        c['path'].append(intern(path))
+        c['line'].append(line)
+        c['end'].append(end)
+        c['doc'].append(1 if doc else 0)
+
+    # -------------------------------------------------------------------------
+    def row(self, n):
+        """
+        Return row *n* as (qual, name, path, line, end, doc)
+        """
+        c = self.cols
+        s = self.strings
+        return (s[c['qual'][n]], s[c['name'][n]], s[c['path'][n]],
+                c['line'][n], c['end'][n], bool(c['doc'][n]))
+
+    # -------------------------------------------------------------------------
+    def duplicates(self, column='qual'):
+        """
+        Return a list of row lists, one for each *column* id that appears in
+        more than one row, in order of first appearance of the id. Rows are
+        grouped by sorting their integer ids, not by comparing strings.
+        """
+        col = self.cols[column]
+        order = sorted(range(len(col)), key=col.__getitem__)
+        groups = []
+        start = 0
+        for n in range(1, len(order) + 1):
+            if n == len(order) or col[order[n]] != col[order[start]]:
+                if 1 < n - start:
+                    groups.append(order[start:n])
+                start = n
+        return sorted(groups)
+
+    # -------------------------------------------------------------------------
+    def save(self, path):
+        """
+        Write the table to *path*: a header, the string offsets and data,
+        then each column, all little-endian
+        """
+        data = [_utf8(self.strings[n]) for n in range(len(self.strings))]
+        offsets = array.array('I', [0])
+        for d in data:
+            offsets.append(offsets[-1] + len(d))
+        with tbx.atomic_rewrite(path) as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(self),
+                                len(self.strings)))
+            f.write(_le_bytes(offsets))
+            f.write(b''.join(data))
+            for (name, code) in COLUMNS:
+                f.write(_le_bytes(self.cols[name]))
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def load(cls, path):
+        """
+        Load a table saved with save(). The columns are read into arrays; the
+        strings are left in the mapped file until they're looked at. Raise
+        SymtabFormatError if *path* isn't a whole table.
+        """
+        with open(path, 'rb') as f:
+            try:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SymtabFormatError('{0} is empty'.format(path))
+        try:
+            (magic, version, nrows, nstrings) = HEADER.unpack_from(m, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise SymtabFormatError('{0} is not a gitr symbol table'
+                                        .format(path))
+            off = HEADER.size
+            offsets = _le_array('I', m[off:off + 4 * (nstrings + 1)])
+            off += 4 * (nstrings + 1)
+            base = off
+            off += offsets[-1]
+            rval = cls()
+            rval.strings = MappedStringPool(m, offsets, base)
+            for (name, code) in COLUMNS:
+                size = array.array(code).itemsize * nrows
+                rval.cols[name] = _le_array(code, m[off:off + size])
+                off += size
+            if len(offsets) != nstrings + 1 or len(m) < off:
+                raise SymtabFormatError('{0} is truncated'.format(path))
+        except (struct.error, ValueError, IndexError) as e:
+            m.close()
+            if isinstance(e, SymtabFormatError):
+                raise
+            raise SymtabFormatError('{0} is truncated'.format(path))
+        rval._map = m
+        return rval
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """
+        Release the mapping of a loaded table
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+# -----------------------------------------------------------------------------
+class SymbolHistory(object):
+    """
+    Where and when qualified names have been defined over a walk through a
+    series of commits. There's a row per (name, path) pair ever seen, with
+    the first commit that had it, the last one that did (-1 while the
+    latest still does), how many times the latest defines it there, and the
+    path it was moved from, if it was. Commits are numbered in walk order.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self):
+        """
+        An empty history
+        """
+        self.strings = StringPool()
+        self.commits = []
+        self.times = array.array('I')
+        self.cols = dict((name, array.array(code))
+                         for (name, code) in HISTORY_COLUMNS)
+        self.since = {}
+        self._rows = {}
+        self._totals = {}
+
+    # -------------------------------------------------------------------------
+    def __len__(self):
+        return len(self.cols['first'])
+
+    # -------------------------------------------------------------------------
+    def advance(self, sha, when, changes):
+        """
+        Record commit *sha*, made at *when*, the next in the walk. *changes*
+        lists (path, old names, new names) for the files it changed, the
+        names (qualified, one per definition) being None or [] for a file
+        that's not there. Where a name leaves one path and turns up at a new
+        one in the same commit, it's taken to have moved, and keeps the
+        first commit it had there.
+        """
+        n = len(self.commits)
+        self.commits.append(sha)
+        self.times.append(when)
+        intern = self.strings.intern
+        delta = {}
+        for (path, old, new) in changes:
+            p = intern(path)
+            for qual in old or []:
+                key = (intern(qual), p)
+                delta[key] = delta.get(key, 0) - 1
+            for qual in new or []:
+                key = (intern(qual), p)
+                delta[key] = delta.get(key, 0) + 1
+
+        c = self.cols
+        before = {}
+        gone = {}
+        added = []
+        for (key, d) in sorted(delta.items()):
+            if not d:
+                continue
+            (q, p) = key
+            before.setdefault(q, self._totals.get(q, 0))
+            self._totals[q] = self._totals.get(q, 0) + d
+            row = self._rows.get(key)
+            if row is None:
+                row = self._add(q, p, n)
+                added.append(row)
+            was = c['live'][row]
+            c['live'][row] = was + d
+            if was == 0:
+                c['last'][row] = -1
+            elif was + d == 0:
+                c['last'][row] = n - 1
+                gone.setdefault(q, []).append(p)
+        for row in added:
+            origin = gone.get(c['qual'][row], [])
+            if len(origin) == 1:
+                old = self._rows[(c['qual'][row], origin[0])]
+                c['first'][row] = c['first'][old]
+                c['moved'][row] = origin[0]
+        for (q, was) in before.items():
+            now = self._totals[q]
+            if was < 2 <= now:
+                self.since[q] = n
+            elif now < 2 <= was:
+                del self.since[q]
+
+    # -------------------------------------------------------------------------
+    def _add(self, q, p, n):
+        """
+        Start a row for qualified name id *q* at path id *p*, first seen in
+        commit *n*
+        """
+        row = self._rows[(q, p)] = len(self)
+        for (name, value) in [('qual', q), ('path', p), ('first', n),
+                              ('last', -1), ('live', 0), ('moved', -1)]:
+            self.cols[name].append(value)
+        return row
+
+    # -------------------------------------------------------------------------
+    def row(self, n):
+        """
+        Return row *n* as (qual, path, first commit, last commit, live
+        count, moved from path or None)
+        """
+        c = self.cols
+        s = self.strings
+        last = c['last'][n] if c['last'][n] != -1 else len(self.commits) - 1
+        moved = c['moved'][n]
+        return (s[c['qual'][n]], s[c['path'][n]], self.commits[c['first'][n]],
+                self.commits[last], c['live'][n],
+                s[moved] if moved != -1 else None)
+
+    # -------------------------------------------------------------------------
+    def duplicated(self):
+        """
+        Return {qual: (commit number it's been duplicated since, [rows where
+        the latest commit defines it])} for the names the latest commit
+        defines more than once
+        """
+        rval = dict((self.strings[q], (n, []))
+                    for (q, n) in self.since.items())
+        c = self.cols
+        for n in range(len(self)):
+            if c['live'][n] and c['qual'][n] in self.since:
+                rval[self.strings[c['qual'][n]]][1].append(n)
+        return rval
+
+    # -------------------------------------------------------------------------
+    def save(self, path):
+        """
+        Write the history to *path*: a header, the string offsets and data,
+        the commits (binary) and their times, each column, then the
+        (name id, commit number) pairs of since, all little-endian
+        """
+        data = [_utf8(self.strings[n]) for n in range(len(self.strings))]
+        offsets = array.array('I', [0])
+        for d in data:
+            offsets.append(offsets[-1] + len(d))
+        since = array.array('i')
+        for q in sorted(self.since):
+            since.extend([q, self.since[q]])
+        with tbx.atomic_rewrite(path) as f:
+            f.write(HISTORY_HEADER.pack(HISTORY_MAGIC, FORMAT_VERSION,
+                                        len(self), len(self.strings),
+                                        len(self.commits), len(self.since)))
+            f.write(_le_bytes(offsets))
+            f.write(b''.join(data))
+            f.write(binascii.unhexlify(''.join(self.commits)))
+            f.write(_le_bytes(self.times))
+            for (name, code) in HISTORY_COLUMNS:
+                f.write(_le_bytes(self.cols[name]))
+            f.write(_le_bytes(since))
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def load(cls, path):
+        """
+        Load a history saved with save(), ready to advance() further.
+        Raise SymtabFormatError if *path* isn't a whole history.
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            return cls._parse(path, data)
+        except (struct.error, ValueError, IndexError) as e:
+            if isinstance(e, SymtabFormatError):
+                raise
+            raise SymtabFormatError('{0} is truncated'.format(path))
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def _parse(cls, path, data):
+        """
+        The history saved in *data*, read from *path*
+        """
+        try:
+            (magic, version, nrows, nstrings, ncommits,
+             nsince) = HISTORY_HEADER.unpack_from(data, 0)
+        except struct.error:
+            magic = version = None
+        if magic != HISTORY_MAGIC or version != FORMAT_VERSION:
+            raise SymtabFormatError('{0} is not a gitr symbol history'
+                                    .format(path))
+        off = HISTORY_HEADER.size
+        offsets = _le_array('I', data[off:off + 4 * (nstrings + 1)])
+        off += 4 * (nstrings + 1)
+        rval = cls()
+        for n in range(nstrings):
+            rval.strings.intern(_native(data[off + offsets[n]:
+                                             off + offsets[n + 1]]))
+        off += offsets[-1]
+        raw = data[off:off + 20 * ncommits]
+        rval.commits = [binascii.hexlify(raw[n:n + 20]).decode()
+                        for n in range(0, len(raw), 20)]
+        off += 20 * ncommits
+        rval.times = _le_array('I', data[off:off + 4 * ncommits])
+        off += 4 * ncommits
+        for (name, code) in HISTORY_COLUMNS:
+            rval.cols[name] = _le_array(code, data[off:off + 4 * nrows])
+            off += 4 * nrows
+        since = _le_array('i', data[off:off + 8 * nsince])
+        if len(since) != 2 * nsince or len(rval.commits) != ncommits or \
+           len(rval.times) != ncommits or \
+           any(len(col) != nrows for col in rval.cols.values()):
+            raise SymtabFormatError('{0} is truncated'.format(path))
+        rval.since = dict(zip(since[::2], since[1::2]))
+        c = rval.cols
+        for n in range(nrows):
+            (q, p) = (c['qual'][n], c['path'][n])
+            rval._rows[(q, p)] = n
+            rval._totals[q] = rval._totals.get(q, 0) + c['live'][n]
+        return rval
+
+
+# -----------------------------------------------------------------------------
+def _utf8(s):
+    """
+    String *s* as UTF-8 bytes; on python 2 it may be bytes already
+    """
+    return s if isinstance(s, bytes) else s.encode('utf-8')
+
+
+# -----------------------------------------------------------------------------
+def _native(data):
+    """
+    UTF-8 bytes *data* as a native string: as it is on python 2, decoded
+    on 3
+    """
+    return data if str is bytes else data.decode('utf-8')
+
+
+# -----------------------------------------------------------------------------
+def _le_bytes(arr):
+    """
+    The contents of array *arr* as little-endian bytes
+    """
+    if sys.byteorder == 'big':
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes() if hasattr(arr, 'tobytes') else arr.tostring()
+
+
+# -----------------------------------------------------------------------------
+def _le_array(code, data):
+    """
+    An array of type *code* from little-endian bytes *data*
+    """
+    arr = array.array(code)
+    if hasattr(arr, 'frombytes'):
+        arr.frombytes(data)
+    else:
+        arr.fromstring(data)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
@@ -1,8 +1,11 @@
 import contextlib
 import copy
+import errno
 import os
 import shlex
 import subprocess
+import sys
+import tempfile
 
 
 # -----------------------------------------------------------------------------
@@ -44,6 +47,35 @@ def tmpenv(**kw):
                 del os.environ[n]
 
 
+# -----------------------------------------------------------------------------
+# Write a replacement for *path* without ever leaving it half written:
+#      with atomic_rewrite('version.py') as f:
+#           f.write(...)
+# The data goes to a temporary file in the same directory, which is renamed
+# over *path* when the block finishes. If the block raises (or exits), *path*
+# is untouched and the temporary file is removed.
+#
+@contextlib.contextmanager
+def atomic_rewrite(path, mode='wb'):
+    (fd, tmp) = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                 prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        try:
+            st = os.stat(path)
+            os.chmod(tmp, st.st_mode & 0o7777)
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp, 0o666 & ~umask)
+        getattr(os, 'replace', os.rename)(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
 # -----------------------------------------------------------------------------
 def contents(path, type=None, default=None):
     """
@@ -71,6 +103,55 @@ def dirname(path):
     return os.path.dirname(path)
 
 
+# -----------------------------------------------------------------------------
+def makedirs(path):
+    """
+    os.makedirs(), but it's fine if *path* is already there
+    """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+# -----------------------------------------------------------------------------
+class LazyModule(object):
+    """
+    Stands in for module *name*, which isn't imported until one of its
+    attributes is wanted. This keeps heavy imports off the startup path of
+    commands that never use them.
+    """
+    # -------------------------------------------------------------------------
+    def __init__(self, name):
+        """
+        *name* is the module's full (dotted) name
+        """
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    # -------------------------------------------------------------------------
+    def __getattr__(self, attr):
+        if self._module is None:
+            __import__(self._name)
+            self.__dict__['_module'] = sys.modules[self._name]
+        return getattr(self._module, attr)
+
+
+# -----------------------------------------------------------------------------
+def lazy_import(name, package=None):
+    """
+    Return a LazyModule for *name*, or the module itself if something has
+    already imported it. Given the importer's *package* (the part of its
+    __name__ before the last '.'), *name* is taken to be a module in that
+    package, as a plain 'import name' there would find it; otherwise the
+    import is absolute.
+    """
+    if package:
+        name = package + '.' + name
+    return sys.modules.get(name) or LazyModule(name)
+
+
 # -----------------------------------------------------------------------------
 def revnumerate(seq):
     """
@@ -0,0 +1,123 @@
+"""
+Render unified diffs the way git does
+
+gitr bv shows the change it has just made. Rather than start 'git diff' to
+compare the file with the index, diff() renders the patch from the two
+versions we already have: git's header lines, three lines of context, hunks
+closer together than twice that merged, and after each hunk header the
+nearest line above it that starts with a letter, '_', or '$' (git's
+default function name). Paths are not quoted, core.abbrev and diff
+drivers are not consulted, and where a change could be shown more than one
+way (deleting one of two blank lines, say) git's heuristics may choose
+differently; callers wanting git's exact output for those should run git.
+"""
+import difflib
+
+# lines of context around each change
+CONTEXT = 3
+
+# git truncates a hunk's function name to this many bytes
+FUNCNAME_MAX = 80
+
+# how much of a file is looked at to decide whether it's binary
+BINARY_PEEK = 8000
+
+
+# -----------------------------------------------------------------------------
+def diff(path, old, new, old_id, new_id, mode='100644', context=CONTEXT):
+    """
+    Generate the lines (text, each ending in a newline) of the patch that
+    takes bytes *old* to bytes *new* at *path*. *old_id* and *new_id* are
+    the (abbreviated) blob ids for the index line. Nothing is generated if
+    *old* and *new* are the same.
+    """
+    if old == new:
+        return
+    yield 'diff --git a/{0} b/{0}\n'.format(path)
+    yield 'index {0}..{1} {2}\n'.format(old_id, new_id, mode)
+    if is_binary(old) or is_binary(new):
+        yield 'Binary files a/{0} and b/{0} differ\n'.format(path)
+        return
+    yield '--- a/{0}\n'.format(path)
+    yield '+++ b/{0}\n'.format(path)
+    a = split_lines(old)
+    b = split_lines(new)
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for group in matcher.get_grouped_opcodes(context):
+        (first, last) = (group[0], group[-1])
+        yield '@@ -{0} +{1} @@{2}\n'.format(
+            hunk_range(first[1], last[2]), hunk_range(first[3], last[4]),
+            funcname(a, first[1]))
+        for (tag, i1, i2, j1, j2) in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield _line(' ', line)
+                continue
+            for line in a[i1:i2]:
+                yield _line('-', line)
+            for line in b[j1:j2]:
+                yield _line('+', line)
+
+
+# -----------------------------------------------------------------------------
+def hunk_range(start, stop):
+    """
+    The 'start,count' for lines *start* up to *stop* (0-based), as git
+    writes it: a count of 1 is left out, and an empty range starts at the
+    line before it
+    """
+    count = stop - start
+    if count == 1:
+        return '{0}'.format(start + 1)
+    if count == 0:
+        return '{0},0'.format(start)
+    return '{0},{1}'.format(start + 1, count)
+
+
+# -----------------------------------------------------------------------------
+def funcname(lines, start):
+    """
+    The text git puts after the header of a hunk starting at *lines*[*start*]
+    (' ' and the function name, or ''): the nearest line above it that
+    starts with a letter, '_', or '$', truncated and with trailing white
+    space removed
+    """
+    for n in range(start - 1, -1, -1):
+        line = lines[n]
+        if line[:1].isalpha() or line[:1] in (b'_', b'$'):
+            name = line[:FUNCNAME_MAX].rstrip()
+            return ' ' + name.decode('utf-8', 'replace')
+    return ''
+
+
+# -----------------------------------------------------------------------------
+def split_lines(data):
+    """
+    Split bytes *data* into lines, keeping the newlines; only '\\n' ends a
+    line, as far as git is concerned
+    """
+    rval = [line + b'\n' for line in data.split(b'\n')]
+    rval[-1] = rval[-1][:-1]
+    if not rval[-1]:
+        rval.pop()
+    return rval
+
+
+# -----------------------------------------------------------------------------
+def is_binary(data):
+    """
+    Whether git would call *data* binary: it has a NUL near the start
+    """
+    return b'\0' in data[:BINARY_PEEK]
+
+
+# -----------------------------------------------------------------------------
+def _line(prefix, line):
+    """
+    One line of a hunk, noting a missing newline at the end of the file as
+    git does
+    """
+    text = prefix + line.decode('utf-8', 'replace')
+    if text.endswith('\n'):
+        return text
+    return text + '\n\\ No newline at end of file\n'
@@ -0,0 +1,110 @@
+import pytest
+
+from gitr import analyze
+
+SRC = b'''
+def documented():
+    """I have one"""
+    pass
+
+
+def bare(x):
+    return x
+
+
+class Thing(object):
+    """A class"""
+    def method(self):
+        def inner():
+            return 1
+        return inner()
+
+    def other(self):
+        """Documented method"""
+        return 2
+'''
+
+
+# -----------------------------------------------------------------------------
+def test_functions():
+    """
+    Functions and methods, with qualified names, spans, and docstring flags
+    """
+    pytest.dbgfunc()
+    assert analyze.functions(SRC) == [
+        ['documented', 'documented', 2, 4, True],
+        ['bare', 'bare', 7, 8, False],
+        ['Thing.method', 'method', 13, 16, False],
+        ['Thing.method.inner', 'inner', 14, 15, False],
+        ['Thing.other', 'other', 18, 20, True],
+    ]
+
+
+# -----------------------------------------------------------------------------
+def test_functions_unparseable():
+    """
+    Source that doesn't parse has no functions
+    """
+    pytest.dbgfunc()
+    assert analyze.functions(b'def broken(:\n') == []
+
+
+# -----------------------------------------------------------------------------
+def test_shapes():
+    """
+    shapes() is functions() plus a signature, None for tiny bodies
+    """
+    pytest.dbgfunc()
+    res = analyze.shapes(SRC)
+    assert [r[:5] for r in res] == analyze.functions(SRC)
+    assert [r[5] for r in res] == [None] * 5
+    assert analyze.shapes(b'def f(:') == []
+
+
+# -----------------------------------------------------------------------------
+def test_conflicts():
+    """
+    Hunks with and without a base section; unterminated hunks are ignored
+    """
+    pytest.dbgfunc()
+    data = b'\n'.join([b'a',
+                       b'<<<<<<< HEAD',
+                       b'ours',
+                       b'=======',
+                       b'theirs',
+                       b'>>>>>>> other',
+                       b'b',
+                       b'<<<<<<< HEAD',
+                       b'ours',
+                       b'||||||| base',
+                       b'base',
+                       b'=======',
+                       b'theirs',
+                       b'>>>>>>> other',
+                       b'<<<<<<< HEAD',
+                       b'never finished'])
+    assert analyze.conflicts(data) == [[2, 0, 4, 6], [8, 10, 12, 14]]
+
+
+# -----------------------------------------------------------------------------
+def test_run_caches(tmpdir):
+    """
+    run() reads and analyzes on a miss and not on a hit; results are kept
+    per python version
+    """
+    pytest.dbgfunc()
+    from gitr import cache
+    bc = cache.BlobCache(tmpdir.strpath)
+    reads = []
+
+    def read():
+        reads.append(1)
+        return SRC
+    sha = 'ab' * 20
+    first = analyze.run(bc, 'functions', sha, read)
+    second = analyze.run(bc, 'functions', sha, read)
+    assert first == second
+    assert len(reads) == 1
+    assert (bc.hits, bc.misses) == (1, 1)
+    assert bc.get(sha, 'functions', '1-' + analyze.PYTHON) == first
+    assert bc.get(sha, 'functions', 1) is None
@@ -0,0 +1,434 @@
+import git
+import pytest
+import time
+
+from gitr import api
+from gitr import tbx
+
+
+# -----------------------------------------------------------------------------
+def test_bump(tmpdir, api_setup):
+    """
+    bump() returns what it did
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        res = api.bump(part='minor')
+    assert res == api.BumpResult('./pkg/version.py', tmpdir.strpath,
+                                 'pkg/version.py', '1.2.3', '1.3.0', False)
+    assert "'1.3.0'" in tmpdir.join('pkg', 'version.py').read()
+
+
+# -----------------------------------------------------------------------------
+def test_bump_repeated(tmpdir, api_setup):
+    """
+    bump() can be called over and over in one process
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    with tbx.chdir(tmpdir.strpath):
+        for n in range(1, 6):
+            res = api.bump('pkg/version.py', 'patch')
+            assert res.new == '1.2.{0}'.format(3 + n)
+            r.git.commit(a=True, m=res.new)
+
+
+# -----------------------------------------------------------------------------
+def test_bump_created(tmpdir, api_setup):
+    """
+    A missing path with a '/' is created at 0.0.0
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        res = api.bump('new/version.py')
+    assert res.created and res.old is None and res.new == '0.0.0'
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('setup, path, exc', [
+    ('dirty', None, api.AlreadyBumped),
+    ('clean', 'nosuch', api.NotFound),
+    ('clean', 'README', api.NoVersion),
+    ('norepo', None, api.NotARepo),
+    ])
+def test_bump_errors(tmpdir, api_setup, setup, path, exc):
+    """
+    Failures raise the right GitrError
+    """
+    pytest.dbgfunc()
+    if setup == 'dirty':
+        tmpdir.join('pkg', 'version.py').write("__version__ = '1.2.4'\n")
+    if setup == 'norepo':
+        tmpdir.join('.git').remove()
+    with tbx.chdir(tmpdir.strpath):
+        with pytest.raises(exc) as e:
+            api.bump(path)
+    assert isinstance(e.value, api.GitrError)
+
+
+# -----------------------------------------------------------------------------
+def test_bump_ref(tmpdir, api_setup):
+    """
+    bump_ref() returns the new commit and the ref it moved; a branch checked
+    out in any working tree is left alone
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    branch = r.active_branch.name
+    with tbx.chdir(tmpdir.strpath):
+        r.git.branch('rel')
+        res = api.bump_ref('rel', part='major')
+        with pytest.raises(api.CheckedOut):
+            api.bump_ref(branch)
+        r.git.worktree('add', tmpdir.join('wt').strpath, 'rel')
+        with pytest.raises(api.CheckedOut):
+            api.bump_ref('rel')
+    assert (res.path, res.old, res.new) == ('pkg/version.py', '1.2.3',
+                                            '2.0.0')
+    assert res.ref == 'refs/heads/rel'
+    assert res.commit == r.git.rev_parse('rel')
+    assert r.git.rev_parse(branch) == r.head.commit.hexsha
+    assert r.git.rev_parse('rel^') == r.head.commit.hexsha
+
+
+# -----------------------------------------------------------------------------
+def test_bump_ignored(tmpdir, api_setup):
+    """
+    An ignored (generated) version file is clean as far as bump() is
+    concerned; an untracked one that isn't ignored is not
+    """
+    pytest.dbgfunc()
+    tmpdir.join('.gitignore').write('gen/\n')
+    for name in ['gen', 'new']:
+        tmpdir.join(name, 'version.py').ensure().write(
+            "__version__ = '0.1.0'\n")
+    with tbx.chdir(tmpdir.strpath):
+        assert api.target_status(tmpdir.strpath, 'gen/version.py') == ''
+        res = api.bump('gen/version.py', part='minor')
+        with pytest.raises(api.AlreadyBumped):
+            api.bump('new/version.py')
+    assert res.new == '0.2.0'
+
+
+# -----------------------------------------------------------------------------
+def test_increment():
+    """
+    increment() by part; bad versions raise BadVersion
+    """
+    pytest.dbgfunc()
+    assert api.increment(['1', '2', '3'], 'major') == ['2', '0', '0']
+    assert api.increment(['1', '2', '3']) == ['1', '2', '3', '1']
+    with pytest.raises(api.BadVersion):
+        api.increment(['1', '2'])
+    with pytest.raises(api.BadVersion):
+        api.increment(['1', 'x', '3'], 'minor')
+    with pytest.raises(ValueError):
+        api.increment(['1', '2', '3'], 'frooble')
+
+
+# -----------------------------------------------------------------------------
+def test_update_error(tmpdir):
+    """
+    update() raises UpdateError rather than exiting
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join('version.py')
+    t.write('')
+    with pytest.raises(api.UpdateError):
+        api.update(t.strpath, ['1', '0', '0'], ['0', '9', '9'])
+
+
+# -----------------------------------------------------------------------------
+def test_plan(tmpdir, api_setup):
+    """
+    plan() returns BumpPlans, errors included
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        res = api.plan(['pkg/version.py', 'README'], 'patch')
+    assert res[0] == api.BumpPlan('pkg/version.py', '1.2.3', '1.2.4', 15,
+                                  20, 'version.py', None)
+    assert res[1].error == 'no version found'
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def api_setup(tmpdir):
+    """
+    A repo with pkg/version.py at 1.2.3 and a README
+    """
+    pytest.this = {}
+    r = pytest.this['repo'] = git.Repo.init(tmpdir.strpath)
+    tmpdir.join('pkg', 'version.py').ensure().write(
+        "__version__ = '1.2.3'\n")
+    tmpdir.join('README').write('no version here\n')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('pkg', 'README')
+        r.git.commit(m='first')
+
+
+# -----------------------------------------------------------------------------
+def test_history(tmpdir, monkeypatch):
+    """
+    history() reads each blob once, whatever the number of commits that
+    have it, and works in a bare repo
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.join('work').strpath)
+    work = tmpdir.join('work')
+    with tbx.chdir(work.strpath):
+        work.join('a.py').write('def f():\n    pass\n')
+        work.join('b.py').write('def f():\n    """doc"""\n')
+        r.git.add('a.py', 'b.py')
+        r.git.commit(m='one')
+        for n in range(3):
+            work.join('c.py').write('def g{0}():\n    pass\n'.format(n))
+            r.git.add('c.py')
+            r.git.commit(m='c{0}'.format(n))
+    bare = tmpdir.join('bare.git').strpath
+    git.Repo.clone_from(work.strpath, bare, bare=True)
+
+    reads = []
+    real = api.odb.ObjectDB.blob
+    monkeypatch.setattr(api.odb.ObjectDB, 'blob',
+                        lambda self, sha: reads.append(sha) or
+                        real(self, sha))
+    stats = list(api.history('HEAD', root=bare))
+    assert [(s.functions, s.nodoc, s.dupl) for s in stats] == [
+        (2, 1, 1), (3, 2, 1), (3, 2, 1), (3, 2, 1)]
+    assert stats[-1].commit == r.head.commit.hexsha
+    assert len(reads) == 5
+
+    # a second pass finds everything in the cache
+    del reads[:]
+    assert list(api.history('HEAD~1..', root=bare)) == stats[-1:]
+    assert reads == []
+
+
+# -----------------------------------------------------------------------------
+def test_dupl_history(tmpdir, monkeypatch):
+    """
+    dupl_history() tracks where duplicated names came from across moves
+    and renames, and a second call only walks the commits added since
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    shas = []
+
+    def commit(msg, **files):
+        """
+        Write *files* (None to remove one) and commit them
+        """
+        for (name, text) in files.items():
+            if text is None:
+                r.git.rm(name + '.py')
+            else:
+                tmpdir.join(name + '.py').write(text)
+                r.git.add(name + '.py')
+        r.git.commit(m=msg)
+        shas.append(r.head.commit.hexsha)
+
+    with tbx.chdir(tmpdir.strpath):
+        commit('one', a='def f():\n    pass\n', b='def g():\n    pass\n')
+        commit('two', b='def g():\n    pass\ndef f():\n    pass\n')
+        commit('three', a=None, c='def f():\n    pass\n')
+        commit('four', d='def g():\n    pass\n')
+
+    dups = api.dupl_history(root=tmpdir.strpath)
+    assert [(d.qualname, d.since) for d in dups] == [('f', shas[1]),
+                                                     ('g', shas[3])]
+    assert [(p.path, p.first, p.moved_from) for p in dups[0].paths] == [
+        ('b.py', shas[1], None), ('c.py', shas[0], 'a.py')]
+    assert dups[1].paths[0].last == shas[3]
+
+    # the walk is kept: the next call starts where this one stopped
+    walked = []
+    real = api._symbol_walk
+    monkeypatch.setattr(api, '_symbol_walk',
+                        lambda db, commits, *a: walked.extend(commits) or
+                        real(db, commits, *a))
+    with tbx.chdir(tmpdir.strpath):
+        commit('five', d=None)
+    dups = api.dupl_history(root=tmpdir.strpath)
+    assert [c for (c, when) in walked] == [shas[4]]
+    assert [d.qualname for d in dups] == ['f']
+    assert api.dupl_history('HEAD~1', root=tmpdir.strpath)[1].since == \
+        shas[3]
+
+
+# -----------------------------------------------------------------------------
+def test_dupl_saved(tmpdir, monkeypatch):
+    """
+    dupl() saves its symbol table and loads it back while the tree is the
+    same; a change to a file builds a new one, and only SYMTAB_KEEP are
+    kept
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    tmpdir.join('a.py').write('def f():\n    pass\n')
+    tmpdir.join('b.py').write('def f():\n    pass\n')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('a.py', 'b.py')
+        r.git.commit(m='one')
+    first = api.dupl(root=tmpdir.strpath)
+    assert list(first) == ['f']
+    saved = tmpdir.join('.git', 'gitr', 'symtab')
+    assert len(saved.listdir()) == 1
+
+    runs = []
+    real = api.analyze.run
+    monkeypatch.setattr(api.analyze, 'run',
+                        lambda *a: runs.append(a) or real(*a))
+    assert api.dupl(root=tmpdir.strpath) == first
+    assert runs == []
+
+    monkeypatch.setattr(api, 'SYMTAB_KEEP', 2)
+    for n in range(3):
+        tmpdir.join('b.py').write('def g{0}():\n    pass\n'.format(n))
+        assert api.dupl(root=tmpdir.strpath) == {}
+    assert len(runs) == 6
+    assert len(saved.listdir()) == 2
+
+
+# -----------------------------------------------------------------------------
+def test_changed_lines(tmpdir):
+    """
+    changed_lines() maps the diff to new-side line ranges of .py files; a
+    pure deletion marks the lines around it
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    lines = ['line {0}\n'.format(n) for n in range(1, 11)]
+    tmpdir.join('a.py').write(''.join(lines))
+    tmpdir.join('notes.txt').write('x\n')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('a.py', 'notes.txt')
+        r.git.commit(m='first')
+    lines[1] = 'changed\n'
+    del lines[6]
+    tmpdir.join('a.py').write(''.join(lines))
+    tmpdir.join('notes.txt').write('y\n')
+    assert api.changed_lines(tmpdir.strpath, 'HEAD') == {
+        'a.py': [(2, 2), (6, 7)]}
+
+
+# -----------------------------------------------------------------------------
+def test_depth(tmpdir):
+    """
+    depth() counts the commits HEAD has that the target doesn't, on or off
+    HEAD's history
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    with tbx.chdir(tmpdir.strpath):
+        for n in range(5):
+            tmpdir.join('f').write(str(n))
+            r.git.add('f')
+            r.git.commit(m='c{0}'.format(n))
+        r.git.tag('-a', 'old', '-m', 'old', 'HEAD~3')
+        r.git.checkout('-b', 'side', 'HEAD~2')
+        tmpdir.join('g').write('side')
+        r.git.add('g')
+        r.git.commit(m='side')
+        side = r.head.commit.hexsha
+        r.git.checkout('master')
+        r.git.merge('side', m='merge')
+
+        d = api.depth('old')
+        assert (d.commits, d.ancestor) == (5, True)
+        assert d.commit == r.commit('HEAD~4').hexsha
+        assert d.time == r.commit('HEAD~4').committed_date
+        assert api.depth('HEAD').commits == 0
+        assert api.depth(side[:8]).commits == 3
+        assert api.depth('HEAD@{1}').commits == 2
+
+        r.git.checkout('-b', 'other', 'HEAD~2')
+        assert api.depth('master') == api.Depth('master', r.commit(
+            'master').hexsha, 0, False, r.commit('master').committed_date)
+        with pytest.raises(api.NotFound):
+            api.depth('nosuch')
+
+
+# -----------------------------------------------------------------------------
+def test_depth_stats(tmpdir):
+    """
+    depth_stats() counts the commits in a range and spreads them over the
+    days they were made on
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    day = 1700000000 - 1700000000 % 86400
+    when = [day + 100, day + 200, day + 86400 * 2 + 5, day + 86400 * 2 + 9,
+            day + 86400 * 2 + 60, day + 86400 * 3]
+    with tbx.chdir(tmpdir.strpath):
+        for (n, t) in enumerate(when):
+            stamp = '{0} +0000'.format(t)
+            with tbx.tmpenv(GIT_COMMITTER_DATE=stamp, GIT_AUTHOR_DATE=stamp):
+                r.git.commit('--allow-empty', m='c{0}'.format(n))
+        st = api.depth_stats('HEAD~4')
+        assert st == api.DepthStats('HEAD~4', 4, when[2], when[5], 2, 2.0,
+                                    time.strftime('%Y-%m-%d', time.gmtime(
+                                        day + 86400 * 2)), 3)
+        assert api.depth_stats('..HEAD~2').commits == 4
+        assert api.depth_stats('..').days == 4
+        assert api.depth_stats('HEAD').commits == 0
+        r.git.checkout('--detach', 'HEAD~1')
+        stamp = '{0} +0000'.format(day + 86400 * 9)
+        with tbx.tmpenv(GIT_COMMITTER_DATE=stamp, GIT_AUTHOR_DATE=stamp):
+            r.git.commit('--allow-empty', m='detached')
+        st = api.depth_stats('master~1..HEAD')
+        assert (st.commits, st.days, st.last) == (1, 1, day + 86400 * 9)
+        with pytest.raises(api.NotFound):
+            api.depth_stats('nosuch..HEAD')
+
+
+# -----------------------------------------------------------------------------
+def test_depth_shallow(tmpdir):
+    """
+    In a shallow clone, history stops at the cut, as git log's does
+    """
+    pytest.dbgfunc()
+    clone = shallow_clone(tmpdir)
+    with tbx.chdir(clone.working_dir):
+        d = api.depth('HEAD~1')
+        assert (d.commits, d.ancestor) == (1, True)
+        assert api.depth('HEAD').commits == 0
+
+
+# -----------------------------------------------------------------------------
+def test_depth_in_shallow(tmpdir):
+    """
+    depth_in() in a shallow clone counts back only as far as the cut
+    """
+    pytest.dbgfunc()
+    clone = shallow_clone(tmpdir)
+    with tbx.chdir(clone.working_dir):
+        [rd] = api.depth_in(['HEAD~1'], ['master'])
+        assert (rd.contained, rd.commits) == (True, 1)
+
+
+# -----------------------------------------------------------------------------
+def test_depth_stats_shallow(tmpdir):
+    """
+    depth_stats() in a shallow clone counts the commits it has
+    """
+    pytest.dbgfunc()
+    clone = shallow_clone(tmpdir)
+    with tbx.chdir(clone.working_dir):
+        assert api.depth_stats('HEAD~1').commits == 1
+        assert api.depth_stats('..').commits == 2
+
+
+# -----------------------------------------------------------------------------
+def shallow_clone(tmpdir):
+    """
+    Make a repo of five commits in *tmpdir*/src and return a clone of it in
+    *tmpdir*/dst that has only the last two
+    """
+    src = tmpdir.join('src')
+    r = git.Repo.init(src.strpath)
+    with tbx.chdir(src.strpath):
+        for n in range(5):
+            r.git.commit('--allow-empty', m='c{0}'.format(n))
+    return git.Repo.clone_from('file://' + src.strpath,
+                               tmpdir.join('dst').strpath, depth=2)
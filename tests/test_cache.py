@@ -0,0 +1,81 @@
+import os
+import pytest
+
+from gitr import cache
+
+
+# -----------------------------------------------------------------------------
+def test_put_get(tmpdir):
+    """
+    What goes in comes out, under .../gitr/cache
+    """
+    pytest.dbgfunc()
+    bc = cache.BlobCache(tmpdir.strpath)
+    sha = '0123456789' * 4
+    assert bc.get(sha, 'functions', 1) is None
+    bc.put(sha, 'functions', 1, [['f', 'f', 1, 2, True]])
+    assert bc.get(sha, 'functions', 1) == [['f', 'f', 1, 2, True]]
+    assert tmpdir.join('gitr', 'cache', '01').check(dir=True)
+
+
+# -----------------------------------------------------------------------------
+def test_version_isolation(tmpdir):
+    """
+    Results from another analyzer or analyzer version are not returned
+    """
+    pytest.dbgfunc()
+    bc = cache.BlobCache(tmpdir.strpath)
+    sha = 'f' * 40
+    bc.put(sha, 'functions', 1, [1])
+    assert bc.get(sha, 'functions', 2) is None
+    assert bc.get(sha, 'conflicts', 1) is None
+
+
+# -----------------------------------------------------------------------------
+def test_evict_lru(tmpdir):
+    """
+    Going over the cap evicts the least recently used entries
+    """
+    pytest.dbgfunc()
+    bc = cache.BlobCache(tmpdir.strpath, max_bytes=1000)
+    payload = ['x' * 90]
+    shas = ['{0:040x}'.format(n) for n in range(8)]
+    for n, sha in enumerate(shas):
+        bc.put(sha, 'functions', 1, payload)
+        path = bc._path(sha, 'functions', 1)
+        os.utime(path, (1000 + n, 1000 + n))
+    # touch the oldest so it's the most recently used
+    bc.get(shas[0], 'functions', 1)
+    for n in range(8, 14):
+        bc.put('{0:040x}'.format(n), 'functions', 1, payload)
+    assert bc.size() <= 1000
+    assert bc.get(shas[0], 'functions', 1) == payload
+    assert bc.get(shas[1], 'functions', 1) is None
+
+
+# -----------------------------------------------------------------------------
+def test_unwritable(tmpdir):
+    """
+    A cache we can't write to just doesn't cache
+    """
+    pytest.dbgfunc()
+    tmpdir.join('gitr').write('not a directory')
+    bc = cache.BlobCache(tmpdir.strpath)
+    bc.put('a' * 40, 'functions', 1, [1])
+    assert bc.get('a' * 40, 'functions', 1) is None
+
+
+# -----------------------------------------------------------------------------
+def test_read_only_hit(tmpdir, monkeypatch):
+    """
+    A hit is still a hit when the entry's mtime can't be refreshed
+    """
+    pytest.dbgfunc()
+    bc = cache.BlobCache(tmpdir.strpath)
+    bc.put('a' * 40, 'functions', 1, [1])
+
+    def utime(path, times):
+        raise OSError(30, 'Read-only file system')
+    monkeypatch.setattr(cache.os, 'utime', utime)
+    assert bc.get('a' * 40, 'functions', 1) == [1]
+    assert (bc.hits, bc.misses) == (1, 0)
@@ -0,0 +1,195 @@
+import git
+import pytest
+
+from gitr import files
+from gitr import tbx
+
+
+# -----------------------------------------------------------------------------
+def test_tracked_all(tmpdir, files_setup):
+    """
+    Every tracked path, in index order; untracked files left out
+    """
+    pytest.dbgfunc()
+    assert list(files.tracked(tmpdir.strpath)) == sorted(pytest.this['paths'])
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('specs, globs, exp', [
+    (['src'], None, ['src/a.py', 'src/b.txt', 'src/sub/c.py']),
+    (['src/sub/'], None, ['src/sub/c.py']),
+    (['src/a.py'], None, ['src/a.py']),
+    (['sr'], None, []),
+    (None, ['*.py'], ['setup.py', 'src/a.py', 'src/sub/c.py']),
+    (['src'], ['*.py'], ['src/a.py', 'src/sub/c.py']),
+    (None, ['src/*.txt'], ['src/b.txt']),
+    (['.'], ['*.txt'], ['src/b.txt']),
+    ])
+def test_tracked_filter(tmpdir, files_setup, specs, globs, exp):
+    """
+    Pathspecs and globs narrow the listing
+    """
+    pytest.dbgfunc()
+    assert list(files.tracked(tmpdir.strpath, specs, globs)) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_selector():
+    """
+    selector() applies pathspecs and globs to any path
+    """
+    pytest.dbgfunc()
+    wanted = files.selector(['pkg', './'], ['*.py'])
+    assert wanted('pkg/a.py')
+    assert not wanted('pkg/a.txt')
+    assert not wanted('pkgx/a.py')
+    assert files.selector()('anything')
+
+
+# -----------------------------------------------------------------------------
+def test_tracked_cache(tmpdir, files_setup, monkeypatch):
+    """
+    A second listing of an unchanged index comes from the cache; changing
+    the index invalidates it
+    """
+    pytest.dbgfunc()
+    files.clear_cache()
+    list(files.tracked(tmpdir.strpath))
+
+    def boom(path):
+        raise AssertionError('index read again')
+    monkeypatch.setattr(files.gitindex, 'Index', boom)
+    assert list(files.tracked(tmpdir.strpath)) == sorted(pytest.this['paths'])
+    monkeypatch.undo()
+
+    tmpdir.join('new.py').write('x = 1\n')
+    pytest.this['repo'].git.add('new.py')
+    assert 'new.py' in list(files.tracked(tmpdir.strpath))
+
+
+# -----------------------------------------------------------------------------
+def test_tracked_skiphash(tmpdir, files_setup, monkeypatch):
+    """
+    An index with no checksum (index.skipHash) is told from the next one by
+    its size and mtime
+    """
+    pytest.dbgfunc()
+    files.clear_cache()
+    monkeypatch.setattr(files, 'index_checksum', lambda ipath: None)
+    list(files.tracked(tmpdir.strpath))
+    tmpdir.join('new.py').write('x = 1\n')
+    pytest.this['repo'].git.add('new.py')
+    assert 'new.py' in list(files.tracked(tmpdir.strpath))
+
+
+# -----------------------------------------------------------------------------
+def test_tracked_native(tmpdir, files_setup):
+    """
+    Paths are native strings, bytes on python 2, so a non-ascii path can be
+    used as it is whatever the locale
+    """
+    pytest.dbgfunc()
+    name = u'\xe9t\xe9.py'
+    if str is bytes:
+        name = name.encode('utf-8')
+    tmpdir.join(name).write('x = 1\n')
+    pytest.this['repo'].git.add('.')
+    got = [p for p in files.tracked(tmpdir.strpath) if p.endswith('.py')]
+    assert name in got
+    assert all(isinstance(p, str) for p in got)
+    assert tmpdir.join(name).check(file=True)
+
+
+# -----------------------------------------------------------------------------
+def test_tracked_lazy(tmpdir, files_setup):
+    """
+    tracked() is a generator; a partial listing is not cached
+    """
+    pytest.dbgfunc()
+    files.clear_cache()
+    g = files.tracked(tmpdir.strpath)
+    assert next(g) == 'setup.py'
+    g.close()
+    assert files._cache == {}
+
+
+# -----------------------------------------------------------------------------
+def test_ls_files(tmpdir, files_setup):
+    """
+    The ls-files fallback agrees with the index reader
+    """
+    pytest.dbgfunc()
+    exp = [(p, 0) for p in sorted(pytest.this['paths'])]
+    assert list(files._ls_files(tmpdir.strpath, bufsize=7)) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_tracked_conflicted(tmpdir, files_setup):
+    """
+    conflicted=True lists only unmerged paths, once each
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    base = r.active_branch.name
+    with tbx.chdir(tmpdir.strpath):
+        r.git.checkout('-b', 'other')
+        tmpdir.join('src', 'a.py').write('x = 2\n')
+        r.git.commit(a=True, m='other')
+        r.git.checkout(base)
+        tmpdir.join('src', 'a.py').write('x = 3\n')
+        r.git.commit(a=True, m='base')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('other')
+    assert list(files.tracked(tmpdir.strpath, conflicted=True)) == \
+        ['src/a.py']
+
+
+# -----------------------------------------------------------------------------
+def test_unmerged(tmpdir, files_setup, monkeypatch):
+    """
+    unmerged() gives each conflicted path's stages with their modes and
+    blob ids, and the ls-files fallback agrees
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    base = r.active_branch.name
+    with tbx.chdir(tmpdir.strpath):
+        r.git.checkout('-b', 'other')
+        tmpdir.join('src', 'a.py').write('x = 2\n')
+        r.git.commit(a=True, m='other')
+        r.git.checkout(base)
+        tmpdir.join('src', 'a.py').write('x = 3\n')
+        r.git.commit(a=True, m='base')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('other')
+        exp = {}
+        for line in r.git.ls_files('-u').splitlines():
+            (mode, sha, stage) = line.split('\t')[0].split()
+            exp[int(stage)] = (mode, sha)
+    got = files.unmerged(tmpdir.strpath)
+    assert list(got.items()) == [('src/a.py', exp)]
+    assert sorted(exp) == [1, 2, 3]
+    assert files.unmerged(tmpdir.strpath, ['setup.py']) == {}
+
+    def unsupported(path):
+        raise files.gitindex.IndexUnsupported(path)
+    monkeypatch.setattr(files.gitindex, 'Index', unsupported)
+    assert files.unmerged(tmpdir.strpath) == got
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def files_setup(tmpdir):
+    """
+    A repo with a handful of tracked files and one untracked one
+    """
+    pytest.this = {}
+    r = pytest.this['repo'] = git.Repo.init(tmpdir.strpath)
+    paths = pytest.this['paths'] = ['setup.py', 'src/a.py', 'src/b.txt',
+                                    'src/sub/c.py']
+    for p in paths:
+        tmpdir.join(p).ensure().write('x = 1\n')
+    tmpdir.join('untracked.py').write('y = 1\n')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add(*paths)
+        r.git.commit(m='first')
@@ -0,0 +1,155 @@
+import git
+import os
+import pytest
+
+from gitr import gitindex
+from gitr import tbx
+
+
+# -----------------------------------------------------------------------------
+def test_find(index_setup, tmpdir):
+    """
+    Every tracked path can be found; others can't
+    """
+    pytest.dbgfunc()
+    with gitindex.Index(tmpdir.join('.git', 'index').strpath) as idx:
+        assert len(idx) == len(pytest.this['paths'])
+        for p in pytest.this['paths']:
+            ents = idx.find(p)
+            assert len(ents) == 1
+            assert ents[0].path == p.encode()
+            assert ents[0].stage == 0
+        assert idx.find('nosuch') == []
+        assert idx.find('a') == []
+
+
+# -----------------------------------------------------------------------------
+def test_find_v4(index_setup, tmpdir):
+    """
+    Lookups work on a version 4 (path-compressed) index
+    """
+    pytest.dbgfunc()
+    pytest.this['repo'].git.update_index(index_version=4)
+    with gitindex.Index(tmpdir.join('.git', 'index').strpath) as idx:
+        assert idx.version == 4
+        for p in pytest.this['paths']:
+            assert idx.find(p)[0].path == p.encode()
+        assert idx.find('a/b/zz') == []
+
+
+# -----------------------------------------------------------------------------
+def test_entries_sha(index_setup, tmpdir):
+    """
+    Entry shas match what git reports
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    with gitindex.Index(tmpdir.join('.git', 'index').strpath) as idx:
+        for ent in idx.entries():
+            path = ent.path.decode()
+            assert ent.sha == r.git.rev_parse(':' + path)
+            assert ent.sha == gitindex.blob_sha(tmpdir.join(path)
+                                                .read_binary())
+
+
+# -----------------------------------------------------------------------------
+def test_header_missing(tmpdir):
+    """
+    No index -> (None, 0)
+    """
+    pytest.dbgfunc()
+    assert gitindex.read_header(tmpdir.join('index').strpath) == (None, 0)
+
+
+# -----------------------------------------------------------------------------
+def test_header_bad(tmpdir):
+    """
+    Not an index -> IndexFormatError
+    """
+    pytest.dbgfunc()
+    tmpdir.join('index').write('not an index at all')
+    with pytest.raises(gitindex.IndexFormatError):
+        gitindex.read_header(tmpdir.join('index').strpath)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('change, exp', [('none', ''),
+                                         ('edit', ' M'),
+                                         ('stage', 'M '),
+                                         ('both', 'MM'),
+                                         ('remove', ' D'),
+                                         ('touch', ''),
+                                         ])
+def test_path_status(index_setup, tmpdir, change, exp):
+    """
+    path_status agrees with 'git status --porcelain'
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    target = 'a/b/c.py'
+    t = tmpdir.join(target)
+    if change in ['edit', 'stage', 'both']:
+        t.write('changed\n')
+    if change in ['stage', 'both']:
+        r.git.add(target)
+    if change == 'both':
+        t.write('changed again\n')
+    if change == 'remove':
+        t.remove()
+    if change == 'touch':
+        os.utime(t.strpath, None)
+    head = r.git.rev_parse('HEAD:' + target)
+    assert gitindex.path_status(tmpdir.strpath, target, head) == exp
+    assert r.git.status(target, porcelain=True)[:2] == exp
+
+
+# -----------------------------------------------------------------------------
+def test_path_status_autocrlf(index_setup, tmpdir):
+    """
+    With autocrlf, a checked out file has CRLF line ends its blob doesn't;
+    with its stat data stale it's still clean, as git says, not modified
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    target = 'a/b/c.py'
+    t = tmpdir.join(target)
+    with tbx.chdir(tmpdir.strpath):
+        r.git.config('core.autocrlf', 'true')
+        t.remove()
+        r.git.checkout('--', target)
+    assert b'\r\n' in t.read_binary()
+    os.utime(t.strpath, (1000000000, 1000000000))
+    head = r.git.rev_parse('HEAD:' + target)
+    assert gitindex.path_status(tmpdir.strpath, target, head) == ''
+    t.write_binary(b'changed\r\n')
+    assert gitindex.path_status(tmpdir.strpath, target, head) == ' M'
+
+
+# -----------------------------------------------------------------------------
+def test_path_status_untracked(index_setup, tmpdir):
+    """
+    Untracked -> '??', added -> 'A '
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    tmpdir.join('new').write('new\n')
+    assert gitindex.path_status(tmpdir.strpath, 'new', None) == '??'
+    r.git.add('new')
+    assert gitindex.path_status(tmpdir.strpath, 'new', None) == 'A '
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def index_setup(tmpdir):
+    """
+    A repo with a few committed files at various depths
+    """
+    pytest.this = {}
+    r = pytest.this['repo'] = git.Repo.init(tmpdir.strpath)
+    paths = pytest.this['paths'] = ['a/b/c.py', 'a/d', 'a.txt', 'version.py',
+                                    'z/' + 'x' * 200]
+    for p in paths:
+        tmpdir.join(p).ensure().write('contents of {0}\n'.format(p))
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add(*paths)
+        r.git.commit(m='first')
@@ -9,6 +9,7 @@ Tests for `gitr` module.
 """
 import docopt
 import git
+import json
 import os
 import pexpect
 import pydoc
@@ -16,11 +17,17 @@ import pytest
 import setuptools
 import shlex
 import subprocess
+import sys
 import unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 
 import gitr
 from gitr import gitr as app
+from gitr import api
 from gitr import tbx
 
 
@@ -55,6 +62,30 @@ def test_bv_nofile_noarg(basic, tmpdir):
     assert bf['notfound'].format(bf['defname']) in str(e)
 
 
+# -----------------------------------------------------------------------------
+def test_bv_git_diff(basic, tmpdir, capsys):
+    """
+    pre: 2.7.3 in version.py
+    gitr bv, then gitr bv --git-diff
+    post: the diffs gitr renders and git renders are the same
+    """
+    bf = pytest.basic_fx
+    pre = '2.7.3'
+    vpath = tmpdir.join(bf['defname'])
+    vpath.write(bf['template'].format(pre))
+    r = git.Repo.init(tmpdir.strpath)
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add(vpath.basename)
+        r.git.commit(m='inception')
+        outs = []
+        for use_git in [False, True]:
+            gitr.gitr_bv({'bv': True, '--git-diff': use_git})
+            outs.append(capsys.readouterr()[0])
+            r.git.checkout(vpath.basename)
+    assert outs[0] == outs[1]
+    assert "+__version__ = '2.7.3.1'" in outs[0]
+
+
 # -----------------------------------------------------------------------------
 def test_bv_file_noarg_3(basic, tmpdir, capsys):
     """
@@ -727,6 +758,190 @@ def test_bv_patch_build(basic, tmpdir):
         assert exp in str(e)
 
 
+# -----------------------------------------------------------------------------
+def test_bv_setup_cfg(basic, tmpdir, capsys):
+    """
+    pre: setup.cfg with a python version ahead of the package version
+    gitr bv --minor setup.cfg
+    post: only the package version is bumped
+    """
+    pytest.dbgfunc()
+    tmpl = "[options]\npython_requires = >=3.6.1\n[metadata]\nversion = {0}\n"
+    cfg = tmpdir.join('setup.cfg')
+    cfg.write(tmpl.format('1.4.2'))
+    r = git.Repo.init(tmpdir.strpath)
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add(cfg.basename)
+        r.git.commit(m='inception')
+        gitr.gitr_bv({'bv': True, '--minor': True, '<path>': 'setup.cfg'})
+    assert cfg.read() == tmpl.format('1.5.0')
+
+
+# -----------------------------------------------------------------------------
+def test_bv_dry_run_json(basic, tmpdir, capsys):
+    """
+    pre: several packages, each with a version.py
+    gitr bv --dry-run --json --minor
+    post: each planned bump reported; nothing changed
+    """
+    pytest.dbgfunc()
+    bf = pytest.basic_fx
+    pkgs = {'pkg1': '1.0.0', 'pkg2': '2.3.4.5', 'sub/pkg3': '0.9.1'}
+    for p in pkgs:
+        tmpdir.join(p, bf['defname']).ensure().write(
+            bf['template'].format(pkgs[p]))
+    tmpdir.join('pkg4', bf['defname']).ensure().write('nothing\n')
+    with tbx.chdir(tmpdir.strpath):
+        gitr.gitr_bv({'bv': True, '--dry-run': True, '--json': True,
+                      '--minor': True})
+    o, e = capsys.readouterr()
+    plan = json.loads(o)
+    assert [q['path'] for q in plan] == ['./pkg1/version.py',
+                                         './pkg2/version.py',
+                                         './pkg4/version.py',
+                                         './sub/pkg3/version.py']
+    assert plan[0]['old'] == '1.0.0' and plan[0]['new'] == '1.1.0'
+    assert plan[1]['old'] == '2.3.4.5' and plan[1]['new'] == '2.4.0'
+    assert plan[3]['old'] == '0.9.1' and plan[3]['new'] == '0.10.0'
+    assert 'error' in plan[2]
+    text = bf['template'].format('1.0.0')
+    assert text[plan[0]['start']:plan[0]['end']] == '1.0.0'
+    for p in pkgs:
+        assert pkgs[p] in tmpdir.join(p, bf['defname']).read()
+
+
+# -----------------------------------------------------------------------------
+def test_bv_dry_run_text(basic, tmpdir, capsys):
+    """
+    pre: version.py
+    gitr bv --dry-run
+    post: 'path: old -> new'
+    """
+    pytest.dbgfunc()
+    bf = pytest.basic_fx
+    tmpdir.join(bf['defname']).write(bf['template'].format('1.2.3'))
+    with tbx.chdir(tmpdir.strpath):
+        gitr.gitr_bv({'bv': True, '--dry-run': True})
+    o, e = capsys.readouterr()
+    assert o == './version.py: 1.2.3 -> 1.2.3.1\n'
+
+
+# -----------------------------------------------------------------------------
+def test_bv_ref_bare(basic, tmpdir, capsys):
+    """
+    pre: bare clone; pkg/version.py at 1.2.3 on the default branch
+    gitr bv --ref <branch> --minor (in the bare repo)
+    post: branch has a new commit with 1.3.0, parent is the old tip
+    """
+    pytest.dbgfunc()
+    bf = pytest.basic_fx
+    src = tmpdir.join('src')
+    r = git.Repo.init(src.strpath)
+    src.join('pkg', bf['defname']).ensure().write(
+        bf['template'].format('1.2.3'))
+    src.join('README').write('hello\n')
+    with tbx.chdir(src.strpath):
+        r.git.add('pkg', 'README')
+        r.git.commit(m='inception')
+    branch = r.active_branch.name
+    old = r.head.commit.hexsha
+    bare = r.clone(tmpdir.join('bare.git').strpath, bare=True)
+    with tbx.chdir(bare.git_dir):
+        gitr.gitr_bv({'bv': True, '--ref': branch, '--minor': True})
+    o, e = capsys.readouterr()
+    new = bare.git.rev_parse(branch)
+    assert o == 'pkg/version.py: 1.2.3 -> 1.3.0\n{0}\n'.format(new)
+    assert bare.git.rev_parse(branch + '^') == old
+    assert (bare.git.show(branch + ':pkg/version.py') ==
+            bf['template'].format('1.3.0').strip())
+    assert bare.git.show(branch + ':README') == 'hello'
+    assert bare.git.log('-1', '--format=%s', branch) == \
+        'Bump version to 1.3.0'
+
+
+# -----------------------------------------------------------------------------
+def test_bv_ref_commit(basic, tmpdir, capsys, repo_setup):
+    """
+    pre: --ref names a commit, not a branch
+    gitr bv --ref <sha> other_name
+    post: new commit reported, no ref moved
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    tmpdir.join('other_name').write("V = '0.0.7'\n")
+    with tbx.chdir(tmpdir.strpath):
+        r.git.commit(a=True, m='version')
+        tip = r.head.commit.hexsha
+        gitr.gitr_bv({'bv': True, '--ref': tip, '--patch': True,
+                      '<path>': 'other_name'})
+    o, e = capsys.readouterr()
+    (line, new) = o.splitlines()
+    assert line == 'other_name: 0.0.7 -> 0.0.8'
+    assert r.head.commit.hexsha == tip
+    assert r.git.show(new + ':other_name') == "V = '0.0.8'"
+
+
+# -----------------------------------------------------------------------------
+def test_bv_ref_checked_out(basic, tmpdir, repo_setup):
+    """
+    pre: the branch --ref names (here through HEAD) is checked out
+    gitr bv --ref HEAD other_name
+    post: exception('HEAD is checked out; ...'), branch and tree unchanged
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    tmpdir.join('other_name').write("V = '0.0.7'\n")
+    with tbx.chdir(tmpdir.strpath):
+        r.git.commit(a=True, m='version')
+        tip = r.head.commit.hexsha
+        with pytest.raises(SystemExit) as e:
+            gitr.gitr_bv({'bv': True, '--ref': 'HEAD', '<path>': 'other_name'})
+    assert 'HEAD is checked out' in str(e)
+    assert r.head.commit.hexsha == tip
+    assert tmpdir.join('other_name').read() == "V = '0.0.7'\n"
+    assert r.git.status('--porcelain', '-uno') == ''
+
+
+# -----------------------------------------------------------------------------
+def test_bv_ref_tag(basic, tmpdir, capsys):
+    """
+    pre: bare clone with tag v1 on the default branch
+    gitr bv --ref v1 (in the bare repo)
+    post: exception('v1 (refs/tags/v1) is not a branch'), tag unchanged
+    """
+    pytest.dbgfunc()
+    bf = pytest.basic_fx
+    src = tmpdir.join('src')
+    r = git.Repo.init(src.strpath)
+    src.join(bf['defname']).write(bf['template'].format('1.2.3'))
+    with tbx.chdir(src.strpath):
+        r.git.add(bf['defname'])
+        r.git.commit(m='inception')
+        r.git.tag('v1')
+    bare = r.clone(tmpdir.join('bare.git').strpath, bare=True)
+    old = bare.git.rev_parse('v1')
+    with tbx.chdir(bare.git_dir):
+        with pytest.raises(SystemExit) as e:
+            gitr.gitr_bv({'bv': True, '--ref': 'v1'})
+    assert 'v1 (refs/tags/v1) is not a branch' in str(e)
+    assert bare.git.rev_parse('v1') == old
+
+
+# -----------------------------------------------------------------------------
+def test_bv_ref_notfound(basic, tmpdir, repo_setup):
+    """
+    pre: no such file in the ref
+    gitr bv --ref HEAD frooble
+    post: exception('frooble not found')
+    """
+    pytest.dbgfunc()
+    bf = pytest.basic_fx
+    with tbx.chdir(tmpdir.strpath):
+        with pytest.raises(SystemExit) as e:
+            gitr.gitr_bv({'bv': True, '--ref': 'HEAD', '<path>': 'frooble'})
+    assert bf['notfound'].format('frooble') in str(e)
+
+
 # -----------------------------------------------------------------------------
 def test_docopt_help(capsys):
     """
@@ -788,6 +1003,8 @@ def test_docopt_raises(argd, capsys):
                                   {'bv': True, '-d': True,
                                    '<path>': 'patch'},
                                   {'bv': True, '--debug': True,},
+                                  {'bv': True, '--dry-run': True,
+                                   '--json': True, '--minor': True},
                                   {'flix': True, '-d': True,
                                    '<target>': 'foobar'},
                                   {'flix': True, '-d': True,},
@@ -795,6 +1012,7 @@ def test_docopt_raises(argd, capsys):
                                   {'nodoc': True,},
                                   {'dupl': True, "--debug": True},
                                   {'dupl': True,},
+                                  {'dupl': True, '--similar': True},
                                   ))
 def test_docopt(argd, capsys):
     """
@@ -807,6 +1025,294 @@ def test_docopt(argd, capsys):
     assert r == exp
 
 
+# -----------------------------------------------------------------------------
+def test_docopt_ref():
+    """
+    'gitr bv --ref <ref>' takes a value
+    """
+    pytest.dbgfunc()
+    exp = docopt_exp(bv=True, **{'--ref': 'master', '--patch': True})
+    r = docopt.docopt(gitr.__doc__, ['bv', '--ref', 'master', '--patch'])
+    assert r == exp
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('subc', ['nodoc', 'dupl'])
+def test_docopt_rev(subc):
+    """
+    'gitr nodoc/dupl --rev <range>' takes a value
+    """
+    pytest.dbgfunc()
+    exp = docopt_exp(**{subc: True, '--rev': 'HEAD~3..'})
+    r = docopt.docopt(gitr.__doc__, [subc, '--rev', 'HEAD~3..'])
+    assert r == exp
+
+
+# -----------------------------------------------------------------------------
+def test_docopt_since():
+    """
+    'gitr nodoc --since <commitish>' takes a value
+    """
+    pytest.dbgfunc()
+    exp = docopt_exp(**{'nodoc': True, '--since': 'HEAD~2'})
+    r = docopt.docopt(gitr.__doc__, ['nodoc', '--since', 'HEAD~2'])
+    assert r == exp
+
+
+# -----------------------------------------------------------------------------
+def test_docopt_multi():
+    """
+    'gitr multi' passes everything after '--' through
+    """
+    pytest.dbgfunc()
+    exp = docopt_exp(multi=True, **{'--': True, '--jobs': '4',
+                                    '<repolist>': 'repos',
+                                    '<args>': ['bv', '--minor', 'v.py']})
+    r = docopt.docopt(gitr.__doc__, ['multi', '--jobs=4', 'repos', '--',
+                                     'bv', '--minor', 'v.py'])
+    assert r == exp
+
+
+# -----------------------------------------------------------------------------
+def test_depth(tmpdir, capsys, analysis_setup):
+    """
+    gitr depth reports how many commits back a commitish is and its age
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    with tbx.chdir(tmpdir.strpath):
+        first = r.head.commit.hexsha
+        for n in range(2):
+            tmpdir.join('notes.txt').write(str(n))
+            r.git.commit(a=True, m='more')
+        gitr.gitr_depth({'depth': True, '<commitish>': 'HEAD~2'})
+        o, e = capsys.readouterr()
+        assert o.startswith('HEAD~2 ({0}) is 2 commits back from HEAD, '
+                            ''.format(first[:12]))
+        assert o.endswith(' old\n')
+        gitr.gitr_depth({'depth': True, '<commitish>': 'HEAD~1',
+                         '--format': 'jsonl'})
+        o, e = capsys.readouterr()
+        rec = json.loads(o)
+        assert (rec['commits'], rec['ancestor']) == (1, True)
+        with pytest.raises(SystemExit) as err:
+            gitr.gitr_depth({'depth': True, '<commitish>': 'nosuch'})
+        assert 'nosuch is not a commit' in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_depth_in(tmpdir, capsys, monkeypatch, analysis_setup):
+    """
+    gitr depth --in reports whether commitishes are in each of several refs
+    (named or matched by pattern) and how far back
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    with tbx.chdir(tmpdir.strpath):
+        r.git.branch('release/1')
+        first = r.head.commit.hexsha
+        for n in range(3):
+            tmpdir.join('notes.txt').write(str(n))
+            r.git.commit(a=True, m='more')
+        r.git.branch('release/2')
+        gitr.gitr_depth({'depth': True, '<commitish>': first,
+                         '--in': 'master,release/*'})
+        o, e = capsys.readouterr()
+        assert o.splitlines() == [
+            '{0} ({1}) is in master, 3 commits back'.format(first,
+                                                            first[:12]),
+            '{0} ({1}) is in release/1, 0 commits back'.format(first,
+                                                               first[:12]),
+            '{0} ({1}) is in release/2, 3 commits back'.format(first,
+                                                               first[:12])]
+        monkeypatch.setattr(sys, 'stdin', StringIO('HEAD\nHEAD~1\n\n'))
+        gitr.gitr_depth({'depth': True, '<commitish>': '-',
+                         '--in': 'release/1', '--format': 'jsonl'})
+        o, e = capsys.readouterr()
+        recs = [json.loads(line) for line in o.splitlines()]
+        assert [(x['commitish'], x['contained'], x['commits'])
+                for x in recs] == [('HEAD', False, 0), ('HEAD~1', False, 0)]
+        with pytest.raises(SystemExit) as err:
+            gitr.gitr_depth({'depth': True, '<commitish>': 'HEAD',
+                             '--in': 'nosuch/*'})
+        assert 'no refs match nosuch/*' in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_depth_stats(tmpdir, capsys, analysis_setup):
+    """
+    gitr depth --stats reports the commits in a range and their dates
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    with tbx.chdir(tmpdir.strpath):
+        for n in range(3):
+            tmpdir.join('notes.txt').write(str(n))
+            r.git.commit(a=True, m='more')
+        gitr.gitr_depth({'depth': True, '<commitish>': 'HEAD~2',
+                         '--stats': True})
+        o, e = capsys.readouterr()
+        assert o.startswith('HEAD~2: 2 commits over 1 day, 2.0 per day; '
+                            'busiest ')
+        assert ' with 2; the oldest is ' in o
+        assert o.endswith(' old\n')
+        gitr.gitr_depth({'depth': True, '<commitish>': 'HEAD..',
+                         '--stats': True, '--format': 'json'})
+        o, e = capsys.readouterr()
+        rec = json.loads(o)[0]
+        assert (rec['range'], rec['commits'], rec['age']) == ('HEAD..', 0,
+                                                              None)
+
+
+# -----------------------------------------------------------------------------
+def test_docopt_in():
+    """
+    'gitr depth --in <refs>' takes a value; --stats doesn't
+    """
+    pytest.dbgfunc()
+    exp = docopt_exp(depth=True, **{'--in': 'a,b', '<commitish>': 'HEAD'})
+    r = docopt.docopt(gitr.__doc__, ['depth', '--in', 'a,b', 'HEAD'])
+    assert r == exp
+    exp = docopt_exp(depth=True, **{'--stats': True, '<commitish>': 'v1..'})
+    r = docopt.docopt(gitr.__doc__, ['depth', '--stats', 'v1..'])
+    assert r == exp
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('secs, exp', [(0, '0 seconds'), (1, '1 second'),
+                                       (7200, '2 hours'),
+                                       (86400 * 400, '1 year')])
+def test_age_text(secs, exp):
+    """
+    Ages are given in the largest whole unit
+    """
+    pytest.dbgfunc()
+    assert gitr.age_text(secs) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_dupl(tmpdir, capsys, analysis_setup):
+    """
+    gitr dupl reports qualified names defined more than once
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        gitr.gitr_dupl({'dupl': True})
+    o, e = capsys.readouterr()
+    assert o == ("helper\n"
+                 "    a.py:1\n"
+                 "    pkg/b.py:4\n")
+
+
+# -----------------------------------------------------------------------------
+def test_dupl_damaged(tmpdir, capsys, analysis_setup):
+    """
+    A saved symbol table that's been cut short is discarded and rebuilt
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        gitr.gitr_dupl({'dupl': True})
+        first = capsys.readouterr()[0]
+        [saved] = tmpdir.join('.git', 'gitr', 'symtab').listdir()
+        size = saved.size()
+        saved.write_binary(saved.read_binary()[:10])
+        gitr.gitr_dupl({'dupl': True})
+    assert capsys.readouterr()[0] == first
+    assert saved.size() == size
+
+
+# -----------------------------------------------------------------------------
+def test_dupl_history(tmpdir, capsys, analysis_setup):
+    """
+    gitr dupl --history reports since when a name has been duplicated and
+    which commit brought each copy, following a renamed file
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    first = r.head.commit.hexsha
+    with tbx.chdir(tmpdir.strpath):
+        r.git.mv('a.py', 'c.py')
+        r.git.commit(m='rename')
+        gitr.gitr_dupl({'dupl': True, '--history': True})
+        o, e = capsys.readouterr()
+        lines = o.splitlines()
+        assert lines[0].startswith('helper duplicated since {0} '
+                                   ''.format(first[:12]))
+        assert lines[1].startswith('    c.py {0} '.format(first[:12]))
+        assert lines[1].endswith(' (from a.py)')
+        assert lines[2].startswith('    pkg/b.py {0} '.format(first[:12]))
+        gitr.gitr_dupl({'dupl': True, '--history': True, '--format': 'json'})
+        o, e = capsys.readouterr()
+        recs = json.loads(o)
+        assert [(d['name'], d['path'], d['moved_from']) for d in recs] == [
+            ('helper', 'c.py', 'a.py'), ('helper', 'pkg/b.py', None)]
+        assert recs[0]['last'] == r.head.commit.hexsha
+
+
+# -----------------------------------------------------------------------------
+def test_docopt_history():
+    """
+    'gitr dupl --history' takes an optional --rev
+    """
+    pytest.dbgfunc()
+    exp = docopt_exp(dupl=True, **{'--history': True, '--rev': 'v1..'})
+    r = docopt.docopt(gitr.__doc__, ['dupl', '--history', '--rev', 'v1..'])
+    assert r == exp
+
+
+# -----------------------------------------------------------------------------
+def test_dupl_history_native(tmpdir, capsys, analysis_setup):
+    """
+    dupl --history reports a non-ascii path as a native string (bytes on
+    python 2), fresh from the walk or loaded back, so it prints whatever
+    stdout's encoding
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    name = u'\xe9t\xe9.py'
+    if str is bytes:
+        name = name.encode('utf-8')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.mv('a.py', name)
+        r.git.commit(m='rename')
+        for _ in range(2):
+            [d] = api.dupl_history('HEAD')
+            paths = [(f.path, f.moved_from) for f in d.paths]
+            assert paths == [('pkg/b.py', None), (name, 'a.py')]
+            assert all(isinstance(p, str) for p in paths[1])
+        gitr.gitr_dupl({'dupl': True, '--history': True})
+    o, e = capsys.readouterr()
+    if str is bytes and not isinstance(o, bytes):
+        o = o.encode('utf-8')
+    assert o.splitlines()[2].startswith('    {0} '.format(name))
+
+
+# -----------------------------------------------------------------------------
+def test_dupl_similar(tmpdir, capsys, analysis_setup):
+    """
+    gitr dupl --similar reports functions with the same structure, whatever
+    their names, and leaves out ones too small to compare
+    """
+    pytest.dbgfunc()
+    body = ('    total = 0\n'
+            '    for item in {0}:\n'
+            '        if item > {1}:\n'
+            '            total += item * 2\n'
+            '        else:\n'
+            '            total -= 1\n'
+            '    return total\n')
+    tmpdir.join('c.py').write('def tally(values):\n' +
+                              body.format('values', 3))
+    tmpdir.join('pkg', 'd.py').write('def score(things):\n' +
+                                     body.format('things', 10))
+    r = pytest.this['repo']
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('c.py', 'pkg/d.py')
+        gitr.gitr_dupl({'dupl': True, '--similar': True})
+    o, e = capsys.readouterr()
+    assert o == "1.00 c.py:1 tally ~ pkg/d.py:1 score\n"
+
+
 # -----------------------------------------------------------------------------
 def test_find_repo_root_deep(repo_setup, tmpdir):
     """
@@ -836,13 +1342,161 @@ def test_find_repo_root_shallow(repo_setup, tmpdir):
         assert tmpdir.strpath == gitr.find_repo_root()
 
 
+# -----------------------------------------------------------------------------
+def test_flix(tmpdir, capsys, analysis_setup):
+    """
+    gitr flix reports the conflict hunks in unmerged files
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    base = r.active_branch.name
+    with tbx.chdir(tmpdir.strpath):
+        gitr.gitr_flix({'flix': True})
+        o, e = capsys.readouterr()
+        assert o == "No conflicts found\n"
+        r.git.checkout('-b', 'side')
+        tmpdir.join('a.py').write('def helper():\n    return 2\n')
+        r.git.commit(a=True, m='side')
+        r.git.checkout(base)
+        tmpdir.join('a.py').write('def helper():\n    return 3\n')
+        r.git.commit(a=True, m='base')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('side')
+        gitr.gitr_flix({'flix': True})
+        o, e = capsys.readouterr()
+        assert o == "a.py:2: conflict (1 lines ours, 1 lines theirs)\n"
+        gitr.gitr_flix({'flix': True, '<target>': 'pkg/b.py'})
+        o, e = capsys.readouterr()
+        assert o == "No conflicts found\n"
+
+
+# -----------------------------------------------------------------------------
+def test_flix_auto(tmpdir, capsys, analysis_setup):
+    """
+    gitr flix --auto rewrites and stages files whose conflicts are all
+    trivial, leaves the rest alone, and says which is which
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    base = r.active_branch.name
+    start = {'version.py': "__version__ = '1.2.3'\nname = 'x'\n",
+             'c.py': 'def c():\n    return 1\n'}
+    with tbx.chdir(tmpdir.strpath):
+        for (name, text) in start.items():
+            tmpdir.join(name).write(text)
+        r.git.add(*start)
+        r.git.commit(m='start')
+        r.git.checkout('-b', 'side')
+        tmpdir.join('a.py').write('def helper():  \n    return 1\n')
+        tmpdir.join('version.py').write("__version__ = '1.2.3'\n"
+                                        "name = 'y'\n")
+        tmpdir.join('c.py').write('def c():\n    return 2\n')
+        r.git.commit(a=True, m='side')
+        r.git.checkout(base)
+        tmpdir.join('a.py').write('def helper():\n    return 7\n')
+        tmpdir.join('version.py').write("__version__ = '1.2.4'\n"
+                                        "name = 'x'\n")
+        tmpdir.join('c.py').write('def c():\n    return 3\n')
+        r.git.commit(a=True, m='base')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('side')
+        # an edit made outside the conflict hunks is kept
+        tmpdir.join('version.py').write('# edited\n', mode='a')
+        gitr.gitr_flix({'flix': True, '--auto': True})
+        o, e = capsys.readouterr()
+        assert o == ("a.py: resolved 1 of 1 conflicts (whitespace)\n"
+                     "c.py: 0 of 1 conflicts trivial; left as is\n"
+                     "version.py: resolved 1 of 1 conflicts (version)\n"
+                     "auto-resolved 2 of 3 files\n")
+        assert tmpdir.join('a.py').read() == 'def helper():\n    return 7\n'
+        assert tmpdir.join('version.py').read() == ("__version__ = '1.2.4'\n"
+                                                    "name = 'y'\n"
+                                                    "# edited\n")
+        assert '<<<<<<<' in tmpdir.join('c.py').read()
+        assert r.git.diff('--name-only', '--diff-filter=U') == 'c.py'
+        gitr.gitr_flix({'flix': True, '--auto': True, '--format': 'jsonl'})
+        o, e = capsys.readouterr()
+        assert json.loads(o) == {'path': 'c.py', 'conflicts': 1, 'rules': '',
+                                 'resolved': False, 'reason': 'not trivial'}
+
+
+# -----------------------------------------------------------------------------
+def test_flix_rerere(tmpdir, capsys, analysis_setup):
+    """
+    A conflict resolved by hand and committed is learned by the next flix,
+    even from another branch, and when it comes up again flix says so and
+    --auto resolves it, with git's rerere off
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    base = r.active_branch.name
+    with tbx.chdir(tmpdir.strpath):
+        r.git.config('rerere.enabled', 'false')
+        r.git.checkout('-b', 'side')
+        tmpdir.join('a.py').write('def helper():\n    return 2\n')
+        r.git.commit(a=True, m='side')
+        r.git.checkout(base)
+        tmpdir.join('a.py').write('def helper():\n    return 3\n')
+        r.git.commit(a=True, m='base')
+        r.git.branch('again')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('side')
+        gitr.gitr_flix({'flix': True})
+        o, e = capsys.readouterr()
+        assert o == "a.py:2: conflict (1 lines ours, 1 lines theirs)\n"
+
+        tmpdir.join('a.py').write('def helper():\n    return 5\n')
+        r.git.add('a.py')
+        r.git.commit(m='merged side')
+
+        r.git.checkout('again')
+        tmpdir.join('b.txt').write('unrelated\n')
+        r.git.add('b.txt')
+        r.git.commit(m='unrelated')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('side')
+        gitr.gitr_flix({'flix': True, '--format': 'jsonl'})
+        o, e = capsys.readouterr()
+        assert json.loads(o)['known'] is True
+        gitr.gitr_flix({'flix': True, '--auto': True})
+        o, e = capsys.readouterr()
+        assert o.startswith("a.py: resolved 1 of 1 conflicts (cached)\n")
+        assert tmpdir.join('a.py').read() == 'def helper():\n    return 5\n'
+
+
+# -----------------------------------------------------------------------------
+def test_flix_rerere_abort(tmpdir, capsys, analysis_setup):
+    """
+    Aborting a merge isn't resolving it: ours, which the abort leaves in
+    the work tree, is not learned, and the conflict is left alone next time
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    base = r.active_branch.name
+    with tbx.chdir(tmpdir.strpath):
+        r.git.checkout('-b', 'side')
+        tmpdir.join('a.py').write('def helper():\n    return 2\n')
+        r.git.commit(a=True, m='side')
+        r.git.checkout(base)
+        tmpdir.join('a.py').write('def helper():\n    return 3\n')
+        r.git.commit(a=True, m='base')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('side')
+        gitr.gitr_flix({'flix': True})
+        r.git.merge('--abort')
+        gitr.gitr_flix({'flix': True})
+        capsys.readouterr()
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('side')
+        gitr.gitr_flix({'flix': True, '--auto': True})
+        o, e = capsys.readouterr()
+        assert o.startswith("a.py: 0 of 1 conflicts trivial; left as is\n")
+        assert '<<<<<<<' in tmpdir.join('a.py').read()
+
+
 # -----------------------------------------------------------------------------
 @pytest.mark.parametrize('subc', ['dunn',
-                                  'depth',
-                                  'dupl',
-                                  'flix',
                                   'hook',
-                                  'nodoc',
                                   ])
 def test_gitr_unimpl(subc, capsys):
     """
@@ -855,6 +1509,242 @@ def test_gitr_unimpl(subc, capsys):
     assert 'Coming soon' in o
 
 
+# -----------------------------------------------------------------------------
+def test_multi(basic, tmpdir, capsys, multi_setup):
+    """
+    gitr multi <repolist> -- bv --dry-run
+    Each repo's output is prefixed with its path
+    """
+    pytest.dbgfunc()
+    gitr.gitr_multi({'multi': True, '<repolist>': pytest.this['list'],
+                     '<args>': ['bv', '--dry-run', '--minor']})
+    o, e = capsys.readouterr()
+    lines = sorted(o.splitlines())
+    assert lines == sorted('{0}: ./version.py: {1} -> {2}'.format(r, old, new)
+                           for (r, old, new) in pytest.this['repos'])
+
+
+# -----------------------------------------------------------------------------
+def test_multi_json_failure(basic, tmpdir, capsys, multi_setup):
+    """
+    A repo that fails is reported and doesn't stop the others
+    """
+    pytest.dbgfunc()
+    nosuch = tmpdir.join('nosuch').strpath
+    with open(pytest.this['list'], 'a') as f:
+        f.write(nosuch + '\n')
+    with pytest.raises(SystemExit) as e:
+        gitr.gitr_multi({'multi': True, '<repolist>': pytest.this['list'],
+                         '<args>': ['bv', '--dry-run'], '--json': True})
+    assert 'gitr multi: 1 of 3 repos failed' in str(e)
+    o, err = capsys.readouterr()
+    res = dict((r['repo'], r) for r in map(json.loads, o.splitlines()))
+    assert res[nosuch]['status'] == 'error'
+    for (r, old, new) in pytest.this['repos']:
+        assert res[r]['status'] == 'ok'
+        assert old in res[r]['output']
+
+
+# -----------------------------------------------------------------------------
+def test_multi_order(tmpdir, multi_setup):
+    """
+    Repos are ordered biggest first
+    """
+    pytest.dbgfunc()
+    (small, big) = [r for (r, old, new) in pytest.this['repos']]
+    with tbx.chdir(big):
+        for n in range(5):
+            tmpdir.join('big', 'f{0}'.format(n)).write('x')
+        git.Repo(big).git.add('.')
+    assert gitr.multi_repos(pytest.this['list']) == [big, small]
+
+
+# -----------------------------------------------------------------------------
+def test_nodoc(tmpdir, capsys, analysis_setup):
+    """
+    gitr nodoc reports functions without docstrings, scoped to the current
+    directory
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        gitr.gitr_nodoc({'nodoc': True})
+    o, e = capsys.readouterr()
+    assert o == "a.py:1: helper\npkg/b.py:4: helper\n"
+    with tbx.chdir(tmpdir.join('pkg').strpath):
+        gitr.gitr_nodoc({'nodoc': True})
+    o, e = capsys.readouterr()
+    assert o == "pkg/b.py:4: helper\n"
+
+
+# -----------------------------------------------------------------------------
+def test_nodoc_worktree(tmpdir, capsys, analysis_setup):
+    """
+    nodoc, nodoc --rev, dupl, and flix work in a linked worktree, where
+    .git is a file pointing at the git directory
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    wt = tmpdir.dirpath().join(tmpdir.basename + '-wt')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.worktree('add', '-b', 'other', wt.strpath)
+    assert wt.join('.git').isfile()
+    with tbx.chdir(wt.strpath):
+        gitr.gitr_nodoc({'nodoc': True})
+        gitr.gitr_nodoc({'nodoc': True, '--rev': 'HEAD'})
+        gitr.gitr_dupl({'dupl': True})
+        gitr.gitr_flix({'flix': True})
+    o, e = capsys.readouterr()
+    lines = o.splitlines()
+    assert lines[:2] == ["a.py:1: helper", "pkg/b.py:4: helper"]
+    assert lines[2].endswith(' 3 functions, 2 undocumented')
+    assert lines[3:] == ["helper", "    a.py:1", "    pkg/b.py:4",
+                         "No conflicts found"]
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('subc, exp', [
+    ('nodoc', ['3 functions, 2 undocumented',
+               '4 functions, 1 undocumented']),
+    ('dupl', ['3 functions, 1 duplicated',
+              '4 functions, 0 duplicated']),
+    ])
+def test_rev(tmpdir, capsys, analysis_setup, subc, exp):
+    """
+    With --rev, nodoc and dupl report one line per commit, oldest first,
+    without touching the working tree
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    with tbx.chdir(tmpdir.strpath):
+        tmpdir.join('a.py').write('def first():\n    """doc"""\n'
+                                  'def other():\n    """doc"""\n')
+        r.git.commit(a=True, m='second')
+        tmpdir.join('a.py').write('not committed\n')
+        getattr(gitr, 'gitr_' + subc)({subc: True, '--rev': 'HEAD'})
+    o, e = capsys.readouterr()
+    lines = o.splitlines()
+    assert [line.split(' ', 3)[3] for line in lines] == exp
+    assert lines[1].startswith(r.head.commit.hexsha[:12] + ' ')
+    assert tmpdir.join('a.py').read() == 'not committed\n'
+
+
+# -----------------------------------------------------------------------------
+def test_nodoc_since(tmpdir, capsys, analysis_setup):
+    """
+    gitr nodoc --since reports only undocumented functions the diff touches,
+    including ones in newly added files
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    tmpdir.join('pkg', 'b.py').write('def main():\n'
+                                     '    """Main"""\n'
+                                     '    return 0\n\n'
+                                     'def helper():\n'
+                                     '    return 1\n\n'
+                                     'def added():\n'
+                                     '    return 2\n')
+    tmpdir.join('c.py').write('def new():\n    pass\n')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('c.py')
+        gitr.gitr_nodoc({'nodoc': True, '--since': 'HEAD'})
+        o, e = capsys.readouterr()
+        assert o == "c.py:1: new\npkg/b.py:8: added\n"
+        with pytest.raises(SystemExit) as err:
+            gitr.gitr_nodoc({'nodoc': True, '--since': 'nosuch'})
+    assert 'nosuch is not a commit' in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('subc, fmt, exp', [
+    ('nodoc', 'jsonl', '{"path": "a.py", "lineno": 1, "qualname": "helper"}\n'
+                       '{"path": "pkg/b.py", "lineno": 4, '
+                       '"qualname": "helper"}\n'),
+    ('dupl', 'csv', 'name,path,lineno\nhelper,a.py,1\nhelper,pkg/b.py,4\n'),
+    ('flix', 'json', '[]\n'),
+    ('dunn', 'jsonl', None),
+    ])
+def test_format(tmpdir, capsys, analysis_setup, subc, fmt, exp):
+    """
+    --format writes each subcommand's results as records
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        getattr(gitr, 'gitr_' + subc)({subc: True, '--format': fmt})
+    o, e = capsys.readouterr()
+    if exp is None:
+        assert json.loads(o.splitlines()[0]) == {
+            'message': "Git'r Dunn: I dunno, maybe do a commit?"}
+    else:
+        assert o == exp
+
+
+# -----------------------------------------------------------------------------
+def test_format_bv(basic, tmpdir, capsys):
+    """
+    gitr bv --format reports the bump instead of the diff
+    """
+    pytest.dbgfunc()
+    bf = pytest.basic_fx
+    r = git.Repo.init(tmpdir.strpath)
+    tmpdir.join(bf['defname']).write(bf['template'].format('1.2.3'))
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add(bf['defname'])
+        r.git.commit(m='inception')
+        gitr.gitr_bv({'bv': True, '--format': 'csv', '--minor': True})
+    o, e = capsys.readouterr()
+    assert o == "path,old,new\nversion.py,1.2.3,1.3.0\n"
+
+
+# -----------------------------------------------------------------------------
+def test_format_bad(tmpdir, analysis_setup):
+    """
+    An unknown --format is reported
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        with pytest.raises(SystemExit) as err:
+            gitr.gitr_nodoc({'nodoc': True, '--format': 'xml'})
+    assert '--format must be one of text, json, jsonl, csv' in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_rev_bad(tmpdir, analysis_setup):
+    """
+    An unknown revision is reported
+    """
+    pytest.dbgfunc()
+    with tbx.chdir(tmpdir.strpath):
+        with pytest.raises(SystemExit) as err:
+            gitr.gitr_nodoc({'nodoc': True, '--rev': 'nosuch..HEAD'})
+    assert 'nosuch..HEAD is not a revision range' in str(err.value)
+
+
+# -----------------------------------------------------------------------------
+def test_nodoc_branch_switch(tmpdir, analysis_setup, monkeypatch):
+    """
+    After switching branches, only blobs that changed are analyzed again
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    base = r.active_branch.name
+    bc = api.blob_cache(tmpdir.join('.git').strpath)
+    monkeypatch.setattr(api, 'blob_cache', lambda git_dir: bc)
+    with tbx.chdir(tmpdir.strpath):
+        assert len(api.nodoc()) == 2
+        assert (bc.hits, bc.misses) == (0, 2)
+        r.git.checkout('-b', 'side')
+        tmpdir.join('a.py').write('def helper():\n    """doc"""\n')
+        r.git.commit(a=True, m='side')
+        assert len(api.nodoc()) == 1
+        assert (bc.hits, bc.misses) == (1, 3)
+        r.git.checkout(base)
+        assert len(api.nodoc()) == 2
+        r.git.checkout('side')
+        assert len(api.nodoc()) == 1
+    # after the first two runs, every blob had been seen
+    assert (bc.hits, bc.misses) == (5, 3)
+
+
 # -----------------------------------------------------------------------------
 def test_pydoc_gitr(capsys):
     """
@@ -868,6 +1758,61 @@ def test_pydoc_gitr(capsys):
         assert k in o
 
 
+# -----------------------------------------------------------------------------
+def test_status_config_default(tmpdir):
+    """
+    Fresh repo, nothing configured -> untracked cache turned on per call
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    tmpdir.join('file').write('data\n')
+    r.git.add('file')
+    r.git.commit(m='first')
+    assert 'core.untrackedCache=true' in api.status_config(r)
+    assert 'core.fsmonitor=true' not in api.status_config(r)
+
+
+# -----------------------------------------------------------------------------
+def test_status_config_explicit(tmpdir):
+    """
+    If the user has configured the untracked cache, leave it alone
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    r.git.config('core.untrackedCache', 'false')
+    assert api.status_config(r) == []
+
+
+# -----------------------------------------------------------------------------
+def test_status_hint(tmpdir, capsys, monkeypatch):
+    """
+    A big repo without the status speedups configured gets a hint
+    """
+    pytest.dbgfunc()
+    monkeypatch.setattr(api, 'STATUS_HINT_THRESHOLD', 2)
+    r = git.Repo.init(tmpdir.strpath)
+    for name in ['a', 'b', 'c']:
+        tmpdir.join(name).write(name)
+    r.git.add('a', 'b', 'c')
+    assert api.index_entry_count(tmpdir.strpath) == 3
+    api.status_hint(r, tmpdir.strpath)
+    o, e = capsys.readouterr()
+    assert "'git config core.untrackedCache true'" in e
+    assert "'git config core.fsmonitor true'" in e
+
+
+# -----------------------------------------------------------------------------
+def test_status_hint_small(tmpdir, capsys):
+    """
+    A small repo gets no hint
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    api.status_hint(r, tmpdir.strpath)
+    o, e = capsys.readouterr()
+    assert e == ''
+
+
 # -----------------------------------------------------------------------------
 def test_vi_major():
     """
@@ -1069,6 +2014,103 @@ def test_vu_os_tfl_onp(tmpdir):
         assert exp in str(e)
 
 
+# -----------------------------------------------------------------------------
+def test_vu_first_only(tmpdir):
+    """
+    old is in target more than once
+    exp: only the first is updated
+    """
+    pytest.dbgfunc()
+    oldv, newv = '1.2.3', '1.2.4'
+    trg = tmpdir.join('version.py')
+    trg.write("__version__ = '1.2.3'\nrequires = 'other>=1.2.3'\n")
+    gitr.version_update(trg.strpath, newv.split('.'), oldv.split('.'))
+    assert trg.read() == ("__version__ = '1.2.4'\n"
+                          "requires = 'other>=1.2.3'\n")
+
+
+# -----------------------------------------------------------------------------
+def test_vu_occurrence(tmpdir):
+    """
+    old is in target more than once, occurrence=2
+    exp: only the second is updated
+    """
+    pytest.dbgfunc()
+    oldv, newv = '1.2.3', '1.2.4'
+    trg = tmpdir.join('version.py')
+    trg.write("a = '1.2.3'\nb = '1.2.3'\nc = '1.2.3'\n")
+    gitr.version_update(trg.strpath, newv.split('.'), oldv.split('.'),
+                        occurrence=2)
+    assert trg.read() == "a = '1.2.3'\nb = '1.2.4'\nc = '1.2.3'\n"
+
+
+# -----------------------------------------------------------------------------
+def test_vu_notfound_intact(tmpdir):
+    """
+    old is not in target
+    exp: SystemExit, target unchanged, no temporary files left behind
+    """
+    pytest.dbgfunc()
+    trg = tmpdir.join('version.py')
+    pre = "__version__ = '3.3.3'\n"
+    trg.write(pre)
+    with pytest.raises(SystemExit):
+        gitr.version_update(trg.strpath, ['1', '2', '4'], ['1', '2', '3'])
+    assert trg.read() == pre
+    assert tmpdir.listdir() == [trg]
+
+
+# -----------------------------------------------------------------------------
+def test_vu_mode(tmpdir):
+    """
+    The updated file keeps its permissions
+    """
+    pytest.dbgfunc()
+    trg = tmpdir.join('version.sh')
+    trg.write("VERSION=1.2.3\n")
+    trg.chmod(0o751)
+    gitr.version_update(trg.strpath, ['1', '2', '4'], ['1', '2', '3'])
+    assert trg.read() == "VERSION=1.2.4\n"
+    assert trg.stat().mode & 0o777 == 0o751
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('bufsize', [1, 2, 3, 5, 7, 64])
+def test_stream_replace(bufsize):
+    """
+    Matches that straddle reads are found, and counted once
+    """
+    pytest.dbgfunc()
+    import io
+    src = io.BytesIO(b'x1.2.3y1.2.3z1.2.3')
+    dst = io.BytesIO()
+    assert api.stream_replace(src, dst, b'1.2.3', b'10.0.0', 2, bufsize)
+    assert dst.getvalue() == b'x1.2.3y10.0.0z1.2.3'
+    src = io.BytesIO(b'1.2.1.2.')
+    dst = io.BytesIO()
+    assert not api.stream_replace(src, dst, b'1.2.3', b'9', 1, bufsize)
+    assert dst.getvalue() == b'1.2.1.2.'
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def analysis_setup(tmpdir):
+    """
+    A repo with a few python files for nodoc, dupl, and flix
+    """
+    pytest.this = {}
+    r = pytest.this['repo'] = git.Repo.init(tmpdir.strpath)
+    tmpdir.join('a.py').write('def helper():\n    return 1\n')
+    tmpdir.join('pkg', 'b.py').ensure().write('def main():\n'
+                                              '    """Main"""\n\n'
+                                              'def helper():\n'
+                                              '    return 1\n')
+    tmpdir.join('notes.txt').write('def helper(): not python\n')
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('a.py', 'pkg', 'notes.txt')
+        r.git.commit(m='first')
+
+
 # -----------------------------------------------------------------------------
 @pytest.fixture
 def already_setup(tmpdir, request):
@@ -1167,6 +2209,15 @@ def docopt_exp(**kw):
     """Default dict expected back from docopt
     """
     rv = {'--debug': False,
+          '--dry-run': False,
+          '--json': False,
+          '--ref': None,
+          '--git-diff': False,
+          '--': False,
+          '--jobs': None,
+          '<args>': [],
+          '<repolist>': None,
+          'multi': False,
           '--help': False,
           '--build': False,
           '--major': False,
@@ -1189,7 +2240,15 @@ def docopt_exp(**kw):
           '--list': False,
           '--show': False,
           '--rm': False,
-          'dupl': False
+          'dupl': False,
+          '--similar': False,
+          '--history': False,
+          '--auto': False,
+          '--rev': None,
+          '--since': None,
+          '--in': None,
+          '--stats': False,
+          '--format': 'text',
           }
     for k in kw:
         kp = '--debug' if k == '-d' else k
@@ -1198,6 +2257,26 @@ def docopt_exp(**kw):
     return rv
 
 
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def multi_setup(tmpdir):
+    """
+    Two repos with version files, and a file listing them
+    """
+    pytest.this = {'repos': []}
+    for (name, old, new) in [('small', '1.0.0', '1.1.0'),
+                             ('big', '2.3.4', '2.4.0')]:
+        d = tmpdir.join(name).ensure(dir=True)
+        r = git.Repo.init(d.strpath)
+        d.join('version.py').write("__version__ = '{0}'\n".format(old))
+        r.git.add('version.py')
+        pytest.this['repos'].append((d.strpath, old, new))
+    lst = tmpdir.join('repos')
+    lst.write('# repos\n' +
+              ''.join(r + '\n\n' for (r, o, n) in pytest.this['repos']))
+    pytest.this['list'] = lst.strpath
+
+
 # -----------------------------------------------------------------------------
 @pytest.fixture
 def repo_setup(tmpdir):
@@ -1243,5 +2322,4 @@ def repo_setup(tmpdir):
 
 # -----------------------------------------------------------------------------
 if __name__ == '__main__':
-    import sys
     sys.exit(unittest.main())
@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# print the modules 'import gitr' adds to a fresh interpreter
+PROBE = '''
+import json, sys
+before = set(sys.modules)
+import gitr
+print(json.dumps(sorted(m for m in set(sys.modules) - before
+                        if sys.modules[m] is not None)))
+'''
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def startup_modules():
+    """
+    The modules a fresh 'import gitr' loads
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT, os.path.join(ROOT, 'gitr')])
+    out = subprocess.check_output([sys.executable, '-c', PROBE], env=env)
+    return json.loads(out.decode())
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def budget():
+    """
+    The import budget
+    """
+    with open(os.path.join(ROOT, 'bench', 'import_budget.json')) as f:
+        return json.load(f)
+
+
+# -----------------------------------------------------------------------------
+def test_forbidden(startup_modules, budget):
+    """
+    Heavy modules stay off the startup path
+    """
+    pytest.dbgfunc()
+    loaded = [m for m in startup_modules
+              if m.split('.')[0] in budget['forbidden']]
+    assert loaded == []
+
+
+# -----------------------------------------------------------------------------
+def test_module_count(startup_modules, budget):
+    """
+    'import gitr' loads no more modules than the budget allows
+    """
+    pytest.dbgfunc()
+    limit = budget['max_modules'][str(sys.version_info[0])]
+    assert len(startup_modules) <= limit, startup_modules
@@ -0,0 +1,82 @@
+import pytest
+
+from gitr import locator
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('name, text, exp', [
+    ('version.py', "__version__ = '1.2.3'\n", '1.2.3'),
+    ('version.py', "# from 0.9.9\n__version__ = '1.2.3'\n", '1.2.3'),
+    ('version.py', "x = 4.5.6\n", '4.5.6'),
+    ('setup.cfg', "[bdist]\npython=3.4.1\n[metadata]\nversion = 2.0.1\n",
+     '2.0.1'),
+    ('pyproject.toml', '[tool.x]\nmin = "0.1.0"\n[project]\n'
+     'version = "3.4.5.7"\n', '3.4.5.7'),
+    ('pyproject.toml', '[tool.x]\nversion = "0.1.0"\n[project]\n'
+     'name = "x"\nversion = "3.4.5"\n', '3.4.5'),
+    ('pyproject.toml', '[project]\nname = "x"\n[tool.x]\nversion = "0.1.0"\n'
+     '[tool.poetry]\nversion = "2.3.4"\n', '2.3.4'),
+    ('package.json', '{"engines": {"node": "10.1.2"},\n'
+     ' "version": "5.6.7"}\n', '5.6.7'),
+    ('other', "says 7.8.9 then 1.1.1\n", '7.8.9'),
+])
+def test_locate(tmpdir, name, text, exp):
+    """
+    The right version is found in each kind of file, and the span points at
+    it
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join(name)
+    t.write(text)
+    m = locator.locate(t.strpath)
+    assert m.version == exp
+    assert t.read_binary()[m.start:m.end] == exp.encode()
+
+
+# -----------------------------------------------------------------------------
+def test_locate_none(tmpdir):
+    """
+    No version -> None; empty file -> None
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join('version.py')
+    t.write('nothing to see here\n')
+    assert locator.locate(t.strpath) is None
+    t.write('')
+    assert locator.locate(t.strpath) is None
+
+
+# -----------------------------------------------------------------------------
+def test_locator_for():
+    """
+    Files are matched by basename; unclaimed files get the generic locator
+    """
+    pytest.dbgfunc()
+    assert locator.locator_for('a/b/setup.cfg').name == 'setup.cfg'
+    assert locator.locator_for('package.json').name == 'package.json'
+    assert locator.locator_for('frooble') is locator.GENERIC
+
+
+# -----------------------------------------------------------------------------
+def test_register(tmpdir, monkeypatch):
+    """
+    A registered locator takes over files matching its globs
+    """
+    pytest.dbgfunc()
+    monkeypatch.setattr(locator, '_registry', list(locator._registry))
+    locator.register('cargo', ['Cargo.toml'],
+                     [br'^version = "(?P<version>' + locator.VERSION +
+                      br')"'])
+    t = tmpdir.join('Cargo.toml')
+    t.write('[dependencies]\nfoo = "1.0.0"\n[package]\nversion = "0.4.2"\n')
+    assert locator.locate(t.strpath).version == '0.4.2'
+
+
+# -----------------------------------------------------------------------------
+def test_register_nogroup():
+    """
+    A pattern with no group is refused
+    """
+    pytest.dbgfunc()
+    with pytest.raises(ValueError):
+        locator.register('bad', ['bad'], [locator.VERSION])
@@ -0,0 +1,111 @@
+import json
+import subprocess
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+import pytest
+
+from gitr import output
+
+RECS = [{'path': 'a.py', 'lineno': 1, 'extra': 'dropped'},
+        {'path': 'b,c.py', 'lineno': None}]
+
+
+# -----------------------------------------------------------------------------
+class CountingIO(StringIO):
+    """
+    A StringIO that counts its writes
+    """
+    writes = 0
+
+    def write(self, data):
+        """
+        Count and write
+        """
+        self.writes += 1
+        StringIO.write(self, data)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('fmt, exp', [
+    ('jsonl', '{"path": "a.py", "lineno": 1}\n'
+              '{"path": "b,c.py", "lineno": null}\n'),
+    ('json', '[\n{"path": "a.py", "lineno": 1},\n'
+             '{"path": "b,c.py", "lineno": null}\n]\n'),
+    ('csv', 'path,lineno\na.py,1\n"b,c.py",\n'),
+    ])
+def test_write_all(fmt, exp):
+    """
+    Records come out with the writer's fields, in order
+    """
+    pytest.dbgfunc()
+    buf = StringIO()
+    assert output.write_all(fmt, ['path', 'lineno'], RECS, buf) == 2
+    assert buf.getvalue() == exp
+
+
+# -----------------------------------------------------------------------------
+def test_csv_unicode():
+    """
+    Non-ascii text is written to csv as UTF-8 on python 2 and as text on 3
+    """
+    pytest.dbgfunc()
+    buf = StringIO()
+    output.write_all('csv', ['path'], [{'path': u'\xe9t\xe9.py'}], buf)
+    exp = u'path\n\xe9t\xe9.py\n'
+    if str is bytes:
+        exp = exp.encode('utf-8')
+    assert buf.getvalue() == exp
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('fmt, exp', [('jsonl', ''), ('json', '[]\n'),
+                                      ('csv', 'path\n')])
+def test_write_all_empty(fmt, exp):
+    """
+    No records is still a well-formed document
+    """
+    pytest.dbgfunc()
+    buf = StringIO()
+    assert output.write_all(fmt, ['path'], [], buf) == 0
+    assert buf.getvalue() == exp
+    if fmt == 'json':
+        assert json.loads(buf.getvalue()) == []
+
+
+# -----------------------------------------------------------------------------
+def test_batching():
+    """
+    Records are written a batch at a time, as they arrive
+    """
+    pytest.dbgfunc()
+    buf = CountingIO()
+    seen = []
+
+    def records():
+        """
+        Note how much has been written before each record is produced
+        """
+        for n in range(25):
+            seen.append(buf.getvalue().count('\n'))
+            yield {'n': n}
+    output.write_all('jsonl', ['n'], records(), buf, batch=10)
+    assert buf.writes == 3
+    assert seen[9] == 0 and seen[10] == 10 and seen[24] == 20
+    assert len(buf.getvalue().splitlines()) == 25
+
+
+# -----------------------------------------------------------------------------
+def test_copy_lines():
+    """
+    copy_lines() moves a pipe's lines to a text stream
+    """
+    pytest.dbgfunc()
+    p = subprocess.Popen(['printf', 'one\\ntwo\\nthree'],
+                         stdout=subprocess.PIPE)
+    buf = StringIO()
+    output.copy_lines(p.stdout, buf, batch=2)
+    p.wait()
+    assert buf.getvalue() == 'one\ntwo\nthree'
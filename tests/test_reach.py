@@ -0,0 +1,208 @@
+import os
+import struct
+import subprocess
+
+import git
+import pytest
+
+from gitr import odb
+from gitr import reach
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def reach_setup(tmpdir):
+    """
+    A repo with two release branches, a topic branch merged into master, and
+    some commits on master after the branches were made
+    """
+    pytest.this = {}
+    r = pytest.this['repo'] = git.Repo.init(tmpdir.strpath)
+
+    def commits(n, label):
+        for k in range(n):
+            r.git.commit('--allow-empty', m='{0} {1}'.format(label, k))
+
+    commits(5, 'base')
+    r.git.branch('release/1')
+    commits(3, 'master')
+    r.git.checkout('-b', 'topic')
+    commits(4, 'topic')
+    r.git.checkout('master')
+    commits(2, 'master')
+    r.git.merge('topic', '--no-ff', m='merge topic')
+    r.git.branch('release/2')
+    r.git.checkout('release/1')
+    commits(2, 'fix')
+    r.git.tag('-a', 'v1.1', '-m', 'v1.1')
+    r.git.checkout('master')
+    commits(3, 'more')
+    pytest.this['git_dir'] = tmpdir.join('.git').strpath
+
+
+# -----------------------------------------------------------------------------
+def all_commits(r):
+    """
+    Every commit in the repo
+    """
+    return r.git.rev_list('--all').split()
+
+
+# -----------------------------------------------------------------------------
+def check_against_git(r, engine, tips):
+    """
+    The engine agrees with git about every commit against every tip
+    """
+    for tip in tips:
+        tsha = r.git.rev_parse(tip + '^{commit}')
+        for sha in all_commits(r):
+            try:
+                r.git.merge_base('--is-ancestor', sha, tsha)
+                inside = True
+            except git.GitCommandError:
+                inside = False
+            count = int(r.git.rev_list('--count', tsha, '^' + sha))
+            assert engine.distance(tsha, sha) == (inside, count)
+            assert engine.contains(tsha, sha) == inside
+
+
+TIPS = ['master', 'release/1', 'release/2', 'topic', 'v1.1']
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('stride', [reach.STRIDE, 3])
+def test_graph_index(reach_setup, monkeypatch, stride):
+    """
+    With no git bitmap, gitr's index answers as git does, whether most
+    commits get bitmaps or few do
+    """
+    pytest.dbgfunc()
+    monkeypatch.setattr(reach, 'STRIDE', stride)
+    r = pytest.this['repo']
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        engine = reach.Engine(db)
+        assert isinstance(engine.index, reach.GraphIndex)
+        assert len(engine.index) == len(all_commits(r))
+        check_against_git(r, engine, TIPS)
+
+
+# -----------------------------------------------------------------------------
+def test_graph_index_refresh(reach_setup, tmpdir):
+    """
+    The index is saved and picked up again, and commits made since are
+    added to it, not rebuilt
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    gdir = tmpdir.join('.git', 'gitr', 'graph')
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        first = reach.open_index(db)
+    size = gdir.join('commits').size()
+    assert size == 20 * len(first)
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        again = reach.GraphIndex(gdir.strpath)
+        assert len(again) == len(first)
+        assert again.refresh(db, reach.ref_commits(db)) == 0
+    for k in range(3):
+        r.git.commit('--allow-empty', m='later {0}'.format(k))
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        engine = reach.Engine(db)
+        assert len(engine.index) == len(first) + 3
+        assert gdir.join('commits').size() == size + 60
+        assert gdir.join('times').size() == 8 * (len(first) + 3)
+        check_against_git(r, engine, ['master', 'release/2'])
+
+
+# -----------------------------------------------------------------------------
+def test_graph_index_times(reach_setup, tmpdir):
+    """
+    The times column holds each commit's commit time, at its position, and
+    survives a save and load
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    exp = dict(line.split() for line in
+               r.git.log('--all', '--format=%H %ct').splitlines())
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        reach.graph_index(db)
+    index = reach.GraphIndex(tmpdir.join('.git', 'gitr', 'graph').strpath)
+    assert len(index) == len(exp)
+    for (sha, when) in exp.items():
+        assert index.time(index.position(sha)) == int(when)
+    bits = reach.from_positions([0, 2, 3])
+    assert index.times(bits) == [index.time(0), index.time(2),
+                                 index.time(3)]
+
+
+# -----------------------------------------------------------------------------
+def test_graph_index_damaged(reach_setup, tmpdir):
+    """
+    An index whose files don't match what meta says is rebuilt
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        reach.open_index(db)
+    gdir = tmpdir.join('.git', 'gitr', 'graph')
+    commits = gdir.join('commits')
+    commits.write_binary(commits.read_binary()[:30])
+    assert len(reach.GraphIndex(gdir.strpath)) == 0
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        engine = reach.Engine(db)
+        check_against_git(r, engine, ['master'])
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('rev', [False, True])
+def test_pack_bitmap(reach_setup, rev):
+    """
+    git's reachability bitmap is used when there is one (with or without a
+    reverse index beside it), including for commits made since the pack
+    was written
+    """
+    pytest.dbgfunc()
+    r = pytest.this['repo']
+    subprocess.check_call(['git', '-C', r.working_dir, '-c',
+                           'pack.writeReverseIndex={0}'.format(
+                               str(rev).lower()),
+                           'repack', '-adbq'])
+    packdir = os.path.join(pytest.this['git_dir'], 'objects', 'pack')
+    assert any(n.endswith('.rev') for n in os.listdir(packdir)) == rev
+    r.git.commit('--allow-empty', m='loose')
+    r.git.checkout('-b', 'loose', 'release/1')
+    r.git.commit('--allow-empty', m='loose too')
+    with odb.ObjectDB(pytest.this['git_dir']) as db:
+        engine = reach.Engine(db)
+        assert isinstance(engine.index, reach.PackBitmap)
+        check_against_git(r, engine, TIPS + ['loose'])
+        head = r.git.rev_parse('HEAD')
+        assert engine.reach(head).extras == frozenset([head])
+
+
+# -----------------------------------------------------------------------------
+def test_ewah():
+    """
+    Runs of ones and zeros and literal words decode to the right bits
+    """
+    pytest.dbgfunc()
+    # 1 word of ones, then 2 words of zeros with one literal word after
+    words = [(1 << 1) | 1, (2 << 1) | (1 << 33), 0x8000000000000001]
+    data = struct.pack('>II', 256, len(words)) + \
+        struct.pack('>3Q', *words) + struct.pack('>I', 1)
+    bits = reach.ewah(b'xx' + data, 2)
+    assert bits == (1 << 64) - 1 | (1 << 192) | (1 << 255)
+    assert reach._ewah_end(data, 0) == len(data)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('bits', [0, 1, 255, 256, 1 << 1000 | 5])
+def test_bytes(bits):
+    """
+    Bitsets survive the trip to bytes and back, and to positions and back
+    """
+    pytest.dbgfunc()
+    assert reach.from_bytes(reach.to_bytes(bits)) == bits
+    assert reach.popcount(bits) == bin(bits).count('1')
+    positions = [n for n in range(bits.bit_length()) if bits >> n & 1]
+    assert reach.from_positions(positions) == bits
+    assert list(reach.positions(bits)) == positions
@@ -0,0 +1,179 @@
+import git
+import pytest
+
+from gitr import rerere
+from gitr import resolve
+from gitr import tbx
+
+CONFLICTED = (b"x = 1\n"
+              b"<<<<<<< HEAD\n"
+              b"y = 2\n"
+              b"||||||| base\n"
+              b"y = 1\n"
+              b"=======\n"
+              b"y = 3\n"
+              b">>>>>>> side\n"
+              b"z = 1\n"
+              b"<<<<<<< HEAD\n"
+              b"w = 'a'\n"
+              b"=======\n"
+              b">>>>>>> side\n")
+
+
+# -----------------------------------------------------------------------------
+def test_fingerprint():
+    """
+    A hunk's fingerprint ignores which side is which and trailing white
+    space, but not what the sides say
+    """
+    pytest.dbgfunc()
+    fp = rerere.fingerprint([b'a\n'], [b'b\n'])
+    assert rerere.fingerprint([b'b\n'], [b'a\n']) == fp
+    assert rerere.fingerprint([b'a  \r\n'], [b'b\n', b'\n']) == fp
+    assert rerere.fingerprint([b'a\n'], [b'c\n']) != fp
+    assert rerere.fingerprint([b'a\n', b'b\n'], []) != \
+        rerere.fingerprint([b'a\n'], [b'b\n'])
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('resolved, exp', [
+    (b"x = 1\ny = 4\nz = 1\nw = 'a'\n", [[b'y = 4\n'], [b"w = 'a'\n"]]),
+    (b"x = 1\nz = 1\n", [[], []]),
+    (b"x = 1\ny = 2\ny = 3\nz = 1\n", [[b'y = 2\n', b'y = 3\n'], []]),
+    (b"x = 2\ny = 4\nz = 1\n", None),
+    ])
+def test_postimage(resolved, exp):
+    """
+    What each hunk became is found from the text around it; if that text
+    changed, nothing is
+    """
+    pytest.dbgfunc()
+    segs = resolve.split(CONFLICTED)
+    assert rerere.postimage(segs, resolved.splitlines(True)) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_learn_apply(tmpdir):
+    """
+    Resolutions are learned once a remembered file is resolved and staged
+    in the same merge, then applied to the same conflicts, whichever way
+    round they come
+    """
+    pytest.dbgfunc()
+    (r, rr) = conflicted(tmpdir)
+    data = tmpdir.join('f.py').read_binary()
+    assert apply(rr, data) == (None, 1, [])
+    rr.remember('f.py', data)
+
+    # nothing is learned while the file is unmerged, or staged but changed
+    assert rr.learn(tmpdir.strpath, ['f.py']) == 0
+    tmpdir.join('f.py').write_binary(b"x = 1\ny = 5\nz = 1\n")
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('f.py')
+    tmpdir.join('f.py').write_binary(b"x = 1\ny = 6\nz = 1\n")
+    assert rr.learn(tmpdir.strpath, []) == 0
+    tmpdir.join('f.py').write_binary(b"x = 1\ny = 5\nz = 1\n")
+    assert rr.learn(tmpdir.strpath, []) == 1
+    assert tmpdir.join('.git', 'gitr', 'rr-pending').listdir() == []
+
+    assert rr.known(data) == [True]
+    assert apply(rr, data) == (b"x = 1\ny = 5\nz = 1\n", 1, ['cached'])
+    swapped = data.replace(b'y = 2\n', b'@@\n').replace(
+        b'y = 3\n', b'y = 2\n').replace(b'@@\n', b'y = 3\n')
+    assert apply(rr, swapped)[0] == b"x = 1\ny = 5\nz = 1\n"
+    assert rr.known(data.replace(b'y = 3', b'y = 6')) == [False]
+
+
+# -----------------------------------------------------------------------------
+def test_learn_committed(tmpdir):
+    """
+    A remembered file resolved and committed with no flix in between is
+    learned from the merge commit once the merge is over, even with more
+    commits on top
+    """
+    pytest.dbgfunc()
+    (r, rr) = conflicted(tmpdir)
+    data = tmpdir.join('f.py').read_binary()
+    rr.remember('f.py', data)
+    with tbx.chdir(tmpdir.strpath):
+        tmpdir.join('f.py').write_binary(b"x = 1\ny = 5\nz = 1\n")
+        r.git.commit(a=True, m='merged')
+        tmpdir.join('g.py').write('g = 1\n')
+        r.git.add('g.py')
+        r.git.commit(m='more')
+    assert rerere.in_progress(r.git_dir) is None
+    assert rr.learn(tmpdir.strpath, []) == 1
+    assert tmpdir.join('.git', 'gitr', 'rr-pending').listdir() == []
+    assert apply(rr, data) == (b"x = 1\ny = 5\nz = 1\n", 1, ['cached'])
+
+
+# -----------------------------------------------------------------------------
+def test_abort(tmpdir):
+    """
+    What an aborted merge leaves isn't taken for a resolution; the pending
+    hunks are dropped
+    """
+    pytest.dbgfunc()
+    (r, rr) = conflicted(tmpdir)
+    data = tmpdir.join('f.py').read_binary()
+    rr.remember('f.py', data)
+    with tbx.chdir(tmpdir.strpath):
+        r.git.merge('--abort')
+    assert rerere.in_progress(r.git_dir) is None
+    assert rr.learn(tmpdir.strpath, []) == 0
+    assert tmpdir.join('.git', 'gitr', 'rr-pending').listdir() == []
+    assert rr.known(data) == [False]
+
+    # and with no merge under way, there's nothing to remember
+    rr.remember('f.py', data)
+    assert tmpdir.join('.git', 'gitr', 'rr-pending').listdir() == []
+
+
+# -----------------------------------------------------------------------------
+def test_eviction(tmpdir):
+    """
+    The resolutions are kept apart from the analysis cache and held under
+    their own cap (see test_cache for the order they go in)
+    """
+    pytest.dbgfunc()
+    git_dir = tmpdir.join('.git').ensure(dir=True).strpath
+    rr = rerere.Resolutions(git_dir, max_bytes=2000)
+    for n in range(100):
+        rr.put([b'ours\n'], ['{0}\n'.format(n).encode()], [b'x' * 20])
+    assert rr.cache.size() <= 2000
+    kept = [n for n in range(100)
+            if rr.get([b'ours\n'], ['{0}\n'.format(n).encode()])]
+    assert 0 < len(kept) < 100
+    assert not tmpdir.join('.git', 'gitr', 'cache').exists()
+
+
+# -----------------------------------------------------------------------------
+def conflicted(tmpdir):
+    """
+    Leave a repo in *tmpdir* mid-merge, with f.py conflicted; return it and
+    its Resolutions
+    """
+    r = git.Repo.init(tmpdir.strpath)
+    with tbx.chdir(tmpdir.strpath):
+        tmpdir.join('f.py').write('x = 1\ny = 1\nz = 1\n')
+        r.git.add('f.py')
+        r.git.commit(m='base')
+        base = r.active_branch.name
+        r.git.checkout('-b', 'side')
+        tmpdir.join('f.py').write('x = 1\ny = 3\nz = 1\n')
+        r.git.commit(a=True, m='side')
+        r.git.checkout(base)
+        tmpdir.join('f.py').write('x = 1\ny = 2\nz = 1\n')
+        r.git.commit(a=True, m='ours')
+        with pytest.raises(git.GitCommandError):
+            r.git.merge('side')
+    assert rerere.in_progress(r.git_dir) is not None
+    return (r, rerere.Resolutions(r.git_dir))
+
+
+# -----------------------------------------------------------------------------
+def apply(rr, data):
+    """
+    Settle the hunks of *data* from the resolutions in *rr* alone
+    """
+    return resolve.resolve_conflicted(data, b'', b'', b'', rr.get)
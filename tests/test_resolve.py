@@ -0,0 +1,116 @@
+import pytest
+
+from gitr import resolve
+
+
+# -----------------------------------------------------------------------------
+def lines(text):
+    """
+    *text* as a list of byte lines
+    """
+    return text.encode().splitlines(True)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('base, ours, theirs, exp', [
+    ('a\nb\nc\n', 'a\nB\nc\n', 'a\nb\nc\n', [('same', 'a\nB\nc\n')]),
+    ('a\nb\nc\n', 'A\nb\nc\n', 'a\nb\nC\n', [('same', 'A\nb\nC\n')]),
+    ('a\nb\nc\n', 'a\nB\nc\n', 'a\nB\nc\n', [('same', 'a\nB\nc\n')]),
+    ('a\nb\nc\n', 'a\nX\nc\n', 'a\nY\nc\n',
+     [('same', 'a\n'), ('conflict', 'b\n', 'X\n', 'Y\n'), ('same', 'c\n')]),
+    ('', 'x\n', 'y\n', [('conflict', '', 'x\n', 'y\n')]),
+    ])
+def test_merge(base, ours, theirs, exp):
+    """
+    Changes on one side, or the same on both, merge; different changes to
+    the same lines conflict
+    """
+    pytest.dbgfunc()
+    got = resolve.merge(lines(base), lines(ours), lines(theirs))
+    assert [(r[0],) + tuple(b''.join(x).decode() for x in r[1:])
+            for r in got] == exp
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('base, ours, theirs, exp', [
+    ('x = 1\n', 'x = 2  \n', 'x = 2\n', ('x = 2  \n', 'same')),
+    ('x = 1\n', 'x = 1\t\n\n', 'x = 3\n', ('x = 3\n', 'whitespace')),
+    ('x = 1\n', 'x = 3\n', 'x = 1\r\n', ('x = 3\n', 'whitespace')),
+    ("v = '1.2.3'\nx = 1\n", "v = '1.2.4'\nx = 1\n", "v = '1.2.3'\ny = 1\n",
+     ("v = '1.2.4'\ny = 1\n", 'version')),
+    ("v = '1.2.3'\ny = 1\n", "v = '1.2.3'\nx = 1\n", "v = '1.3.0'\ny = 1\n",
+     ("v = '1.3.0'\nx = 1\n", 'version')),
+    ("v = '1.2.3'\n", "v = '1.2.4'\n", "v = '1.3.0'\n", None),
+    ('x = 1\n', '    x = 1\n', 'x = 2\n', None),
+    ('x = 1\n', 'x = 2\n', 'x = 3\n', None),
+    ])
+def test_resolve(base, ours, theirs, exp):
+    """
+    Same-but-for-white-space, white-space-only, and one-sided version
+    changes are settled; indentation and two-sided changes are not
+    """
+    pytest.dbgfunc()
+    got = resolve.resolve(lines(base), lines(ours), lines(theirs))
+    if exp is None:
+        assert got is None
+    else:
+        assert (b''.join(got[0]).decode(), got[1]) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_split():
+    """
+    A conflicted file splits into text and hunks, with the base section of
+    each hunk if it has one
+    """
+    pytest.dbgfunc()
+    data = (b"x = 1\n"
+            b"<<<<<<< HEAD\n"
+            b"y = 2\n"
+            b"||||||| base\n"
+            b"y = 1\n"
+            b"=======\n"
+            b"y = 3\n"
+            b">>>>>>> side\n"
+            b"z = 1\n"
+            b"<<<<<<< HEAD\n"
+            b"w = 'a'\n"
+            b"=======\n"
+            b">>>>>>> side\n")
+    assert resolve.split(data) == [
+        ('text', [b'x = 1\n']),
+        ('hunk', [b'y = 2\n'], [b'y = 3\n'], [b'y = 1\n']),
+        ('text', [b'z = 1\n']),
+        ('hunk', [b"w = 'a'\n"], [], None)]
+    assert resolve.split(b'plain\n') == [('text', [b'plain\n'])]
+
+
+# -----------------------------------------------------------------------------
+def test_resolve_conflicted():
+    """
+    Only the hunks are settled, each from its own base section or from the
+    matching region of the merged stages; the rest of the file is kept as
+    it is, edits and all, and it's settled only if every hunk is
+    """
+    pytest.dbgfunc()
+    base = b"v = '1.0.0'\n# one\n\ndef f():\n    return 1\n"
+    ours = b"v = '1.0.1'\n# one\n\ndef f():\n    return 1 \n"
+    theirs = b"v = '1.0.0'\n# two\n\ndef f():\n    return 2\n"
+    data = (b"<<<<<<< HEAD\nv = '1.0.1'\n# one\n=======\n"
+            b"v = '1.0.0'\n# two\n>>>>>>> side\n"
+            b"\n# edited by hand\ndef f():\n"
+            b"<<<<<<< HEAD\n    return 1 \n||||||| base\n    return 1\n"
+            b"=======\n    return 2\n>>>>>>> side\n")
+    assert resolve.resolve_conflicted(data, base, ours, theirs) == (
+        b"v = '1.0.1'\n# two\n\n# edited by hand\ndef f():\n"
+        b"    return 2\n", 2, ['version', 'whitespace'])
+    assert resolve.resolve_conflicted(b'plain\n', base, ours, ours) == (
+        None, 0, [])
+    data = data.replace(b'return 1 \n|', b'return 3\n|')
+    assert resolve.resolve_conflicted(data, base, ours, theirs) == (
+        None, 2, ['version'])
+    assert resolve.resolve_conflicted(
+        data, base, ours, theirs,
+        lambda a, b: [b'    return 4\n'] if a == [b'    return 3\n']
+        else None) == (b"v = '1.0.1'\n# two\n\n# edited by hand\ndef f():\n"
+                       b"    return 4\n", 2, ['version', 'cached'])
@@ -0,0 +1,108 @@
+import ast
+
+import pytest
+
+from gitr import similar
+
+
+# -----------------------------------------------------------------------------
+def sig_of(src):
+    """
+    The signature of the first function in *src*
+    """
+    return similar.signature(similar.shape(ast.parse(src).body[0]))
+
+
+LOOP = '''
+def {0}(xs):
+    n = 0
+    for x in xs:
+        if x > {1}:
+            n += x
+        else:
+            n -= 1
+    return n
+'''
+
+OTHER = '''
+def other(path):
+    with open(path) as f:
+        data = f.read()
+    try:
+        return int(data)
+    except ValueError:
+        raise SystemExit('bad: ' + path)
+'''
+
+
+# -----------------------------------------------------------------------------
+def test_shape_ignores_names():
+    """
+    Renaming things and changing constants doesn't change the shape
+    """
+    pytest.dbgfunc()
+    one = similar.shape(ast.parse(LOOP.format('f', 1)).body[0])
+    two = similar.shape(ast.parse(LOOP.format('g', 99)).body[0])
+    assert one == two
+    assert one[0] == 'Assign'
+
+
+# -----------------------------------------------------------------------------
+def test_signature_small():
+    """
+    Bodies too small to compare have no signature
+    """
+    pytest.dbgfunc()
+    assert sig_of('def f():\n    return 1\n') is None
+    assert len(sig_of(LOOP.format('f', 1))) == similar.K
+
+
+# -----------------------------------------------------------------------------
+def test_similar():
+    """
+    Matching shapes are paired; different ones aren't
+    """
+    pytest.dbgfunc()
+    sigs = similar.Signatures()
+    sigs.add(0, sig_of(LOOP.format('f', 1)))
+    sigs.add(1, sig_of(OTHER))
+    sigs.add(2, sig_of(LOOP.format('g', 2)))
+    assert len(sigs) == 3
+    assert sigs.similarity(0, 2) == 1.0
+    assert sigs.similarity(0, 1) < 0.5
+    assert sigs.similar(0.8) == [(1.0, 0, 2)]
+    names = ['f', 'other', 'g']
+    assert sigs.similar(0.8, names.__getitem__) == [(1.0, 'f', 'g')]
+
+
+# -----------------------------------------------------------------------------
+def test_candidates_bucket_cap(monkeypatch):
+    """
+    Buckets bigger than MAX_BUCKET yield no candidates
+    """
+    pytest.dbgfunc()
+    sigs = similar.Signatures()
+    sig = sig_of(LOOP.format('f', 1))
+    for n in range(4):
+        sigs.add(n, sig)
+    assert len(list(sigs.candidates())) == 6
+    monkeypatch.setattr(similar, 'MAX_BUCKET', 3)
+    assert list(sigs.candidates()) == []
+
+
+# -----------------------------------------------------------------------------
+def test_candidates_later_band(monkeypatch):
+    """
+    A pair whose first shared band is in a bucket that's too big is still
+    paired, once, by a later band
+    """
+    pytest.dbgfunc()
+    monkeypatch.setattr(similar, 'MAX_BUCKET', 3)
+    sigs = similar.Signatures()
+    for n in range(4):
+        sig = [n * 1000 + k for k in range(similar.K)]
+        sig[:4] = [7] * 4
+        if n < 2:
+            sig[4:12] = [9] * 8
+        sigs.add(n, sig)
+    assert list(sigs.candidates()) == [(0, 1)]
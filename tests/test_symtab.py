@@ -0,0 +1,139 @@
+import pytest
+
+from gitr import symtab
+
+
+# -----------------------------------------------------------------------------
+def test_pool():
+    """
+    Interning returns one id per distinct string
+    """
+    pytest.dbgfunc()
+    pool = symtab.StringPool()
+    assert [pool.intern(s) for s in ['a', 'b', 'a', 'c', 'b']] == \
+        [0, 1, 0, 2, 1]
+    assert len(pool) == 3
+    assert pool[2] == 'c'
+    assert pool.id('b') == 1 and pool.id('zz') is None
+
+
+# -----------------------------------------------------------------------------
+def test_table_rows(table):
+    """
+    Rows come back as they went in; strings are stored once
+    """
+    pytest.dbgfunc()
+    assert len(table) == 5
+    assert table.row(1) == ('helper', 'helper', 'b.py', 4, 6, False)
+    assert len(table.strings) == 6
+
+
+# -----------------------------------------------------------------------------
+def test_duplicates(table):
+    """
+    Rows sharing an id are grouped, singletons are not reported
+    """
+    pytest.dbgfunc()
+    assert table.duplicates('qual') == [[0, 1, 3]]
+    assert table.duplicates('name') == [[0, 1, 3], [2, 4]]
+    assert table.duplicates('path') == [[0, 2], [1, 4]]
+
+
+# -----------------------------------------------------------------------------
+def test_save_load(table, tmpdir):
+    """
+    A saved table loads back the same, strings included
+    """
+    pytest.dbgfunc()
+    path = tmpdir.join('symbols').strpath
+    table.save(path)
+    loaded = symtab.SymbolTable.load(path)
+    try:
+        assert len(loaded) == len(table)
+        for n in range(len(table)):
+            assert loaded.row(n) == table.row(n)
+        assert loaded.duplicates('name') == table.duplicates('name')
+        assert loaded.strings.id(u'b.py') == table.strings.id('b.py')
+    finally:
+        loaded.close()
+
+
+# -----------------------------------------------------------------------------
+def test_load_bad(tmpdir):
+    """
+    Not a symbol table -> ValueError
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join('bogus')
+    t.write('x' * 64)
+    with pytest.raises(ValueError):
+        symtab.SymbolTable.load(t.strpath)
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('keep', [0, 3, 18, -5])
+def test_load_truncated(table, tmpdir, keep):
+    """
+    A table or history cut short anywhere -> SymtabFormatError, not
+    struct.error or a short column
+    """
+    pytest.dbgfunc()
+    hist = symtab.SymbolHistory()
+    hist.advance('1' * 40, 100, [('a.py', None, ['f', 'f'])])
+    for (obj, cls) in [(table, symtab.SymbolTable),
+                       (hist, symtab.SymbolHistory)]:
+        t = tmpdir.join('saved')
+        obj.save(t.strpath)
+        data = t.read_binary()
+        t.write_binary(data[:keep])
+        with pytest.raises(symtab.SymtabFormatError):
+            cls.load(t.strpath)
+
+
+# -----------------------------------------------------------------------------
+def test_history(tmpdir):
+    """
+    SymbolHistory keeps first and last commits per (name, path), carries a
+    moved name's first commit along, and survives a save and load
+    """
+    pytest.dbgfunc()
+    sha = ['{0}'.format(n) * 40 for n in range(4)]
+    hist = symtab.SymbolHistory()
+    hist.advance(sha[0], 100, [('a.py', None, ['f', 'g']),
+                               ('b.py', None, ['g'])])
+    hist.advance(sha[1], 200, [('a.py', ['f', 'g'], ['g'])])
+    assert hist.duplicated() == {'g': (0, [1, 2])}
+    assert hist.row(0) == ('f', 'a.py', sha[0], sha[0], 0, None)
+    hist.advance(sha[2], 300, [('a.py', ['g'], None),
+                               ('c.py', None, ['g', 'f'])])
+    assert hist.row(4) == ('g', 'c.py', sha[0], sha[2], 1, 'a.py')
+    assert hist.row(3) == ('f', 'c.py', sha[2], sha[2], 1, None)
+
+    path = tmpdir.join('history').strpath
+    hist.save(path)
+    loaded = symtab.SymbolHistory.load(path)
+    assert loaded.commits == hist.commits
+    assert list(loaded.times) == [100, 200, 300]
+    assert [loaded.row(n) for n in range(len(hist))] == \
+        [hist.row(n) for n in range(len(hist))]
+    loaded.advance(sha[3], 400, [('b.py', ['g'], None)])
+    assert loaded.duplicated() == {}
+    assert loaded.row(2)[3] == sha[2]
+    tmpdir.join('history').write('x' * 10)
+    with pytest.raises(ValueError):
+        symtab.SymbolHistory.load(path)
+
+
+# -----------------------------------------------------------------------------
+@pytest.fixture
+def table():
+    """
+    A small table with a duplicated name
+    """
+    t = symtab.SymbolTable()
+    t.add('helper', 'helper', 'a.py', 1, 2, False)
+    t.add('helper', 'helper', 'b.py', 4, 6, False)
+    t.add('Thing.run', 'run', 'a.py', 9, 12, True)
+    t.add('helper', 'helper', 'c.py', 1, 1, True)
+    t.add('run', 'run', 'b.py', 20, 30, True)
+    return t
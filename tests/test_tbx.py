@@ -1,6 +1,7 @@
 import os
 import pytest
 import re
+import sys
 
 from gitr import tbx
 
@@ -63,6 +64,69 @@ def test_chdir_perm(tmpdir):
     assert os.getcwd() == here
 
 
+# -----------------------------------------------------------------------------
+def test_atomic_rewrite(tmpdir):
+    """
+    The new contents replace the old ones when the block completes
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join('target')
+    t.write('old contents\n')
+    with tbx.atomic_rewrite(t.strpath, 'w') as f:
+        f.write('new contents\n')
+        assert t.read() == 'old contents\n'
+    assert t.read() == 'new contents\n'
+    assert tmpdir.listdir() == [t]
+
+
+# -----------------------------------------------------------------------------
+def test_atomic_rewrite_fail(tmpdir):
+    """
+    If the block fails, the target is untouched and the temp file is gone
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join('target')
+    t.write('old contents\n')
+    with pytest.raises(SystemExit):
+        with tbx.atomic_rewrite(t.strpath, 'w') as f:
+            f.write('partial')
+            raise SystemExit('oops')
+    assert t.read() == 'old contents\n'
+    assert tmpdir.listdir() == [t]
+
+
+# -----------------------------------------------------------------------------
+def test_atomic_rewrite_new(tmpdir):
+    """
+    A new file gets the usual permissions, not mkstemp's 0600
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join('target')
+    umask = os.umask(0o022)
+    try:
+        with tbx.atomic_rewrite(t.strpath, 'w') as f:
+            f.write('contents\n')
+    finally:
+        os.umask(umask)
+    assert t.stat().mode & 0o777 == 0o644
+
+
+# -----------------------------------------------------------------------------
+def test_makedirs(tmpdir):
+    """
+    makedirs() makes the whole path, and it's fine if it's already there,
+    but not if a file is in the way
+    """
+    pytest.dbgfunc()
+    t = tmpdir.join('a', 'b')
+    tbx.makedirs(t.strpath)
+    tbx.makedirs(t.strpath)
+    assert t.check(dir=True)
+    t.join('f').write('x')
+    with pytest.raises(OSError):
+        tbx.makedirs(t.join('f', 'g').strpath)
+
+
 # -----------------------------------------------------------------------------
 @pytest.fixture
 def contents_setup(tmpdir):
@@ -121,6 +185,33 @@ def test_contents_default(tmpdir):
     assert "take this instead" in c
 
 
+# -----------------------------------------------------------------------------
+def test_lazy_import(monkeypatch):
+    """
+    A lazy module is imported when it's first used, not before
+    """
+    pytest.dbgfunc()
+    monkeypatch.delitem(sys.modules, 'colorsys', raising=False)
+    mod = tbx.lazy_import('colorsys')
+    assert 'colorsys' not in sys.modules
+    assert mod.rgb_to_hsv(0, 0, 0) == (0, 0, 0)
+    assert 'colorsys' in sys.modules
+    assert tbx.lazy_import('colorsys') is sys.modules['colorsys']
+
+
+# -----------------------------------------------------------------------------
+def test_lazy_import_package(monkeypatch):
+    """
+    Given a package, a lazy module is looked for in it
+    """
+    pytest.dbgfunc()
+    monkeypatch.delitem(sys.modules, 'xml.dom.minicompat', raising=False)
+    mod = tbx.lazy_import('minicompat', 'xml.dom')
+    assert 'xml.dom.minicompat' not in sys.modules
+    assert mod.EmptyNodeList.__name__ == 'EmptyNodeList'
+    assert mod._module is sys.modules['xml.dom.minicompat']
+
+
 # -----------------------------------------------------------------------------
 def test_revnumerate():
     """
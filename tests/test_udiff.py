@@ -0,0 +1,93 @@
+import subprocess
+
+import git
+import pytest
+
+from gitr import api
+from gitr import tbx
+from gitr import udiff
+
+LINES = ['import os\n', '\n', '\n', 'def first():\n', '    a = 1\n',
+         '    b = 2\n', '    return a + b\n', '\n', '\n', 'class Thing:\n',
+         '    x = 1\n', '    y = 2\n', '    z = 3\n', '\n', '\n',
+         '_private = 0\n', "__version__ = '1.2.3'\n", 'last = 1\n']
+
+
+# -----------------------------------------------------------------------------
+def edit(lines, n, text):
+    """
+    *lines* with line *n* replaced by *text* (None to delete it, or a list
+    to insert those lines before it)
+    """
+    rval = list(lines)
+    if text is None:
+        del rval[n]
+    elif isinstance(text, list):
+        rval[n:n] = text
+    else:
+        rval[n] = text
+    return rval
+
+
+# -----------------------------------------------------------------------------
+@pytest.mark.parametrize('old, new', [
+    (LINES, edit(LINES, 16, "__version__ = '1.2.4'\n")),
+    (LINES, edit(LINES, 0, 'import sys\n')),
+    (LINES, edit(LINES, 17, 'last = 2')),
+    (LINES[:-1] + ['last = 1'], LINES),
+    (LINES, edit(edit(LINES, 4, '    a = 5\n'), 11, '    y = 7\n')),
+    (LINES, edit(edit(LINES, 0, None), 16, None)),
+    (LINES, edit(LINES, 12, ['    w = 0\n', '    v = 0\n'])),
+    (LINES, LINES + ['more = 2\n']),
+    (['x\n'], []),
+    ([], ['x\n']),
+    (['x\r\n', 'y\n'], ['x\r\n', 'z\n']),
+    ])
+def test_diff_like_git(tmpdir, old, new):
+    """
+    What version_patch() renders is what git diff shows
+    """
+    pytest.dbgfunc()
+    r = git.Repo.init(tmpdir.strpath)
+    target = tmpdir.join('sub', 'target.py').ensure()
+    target.write_binary(''.join(old).encode())
+    with tbx.chdir(tmpdir.strpath):
+        r.git.add('sub/target.py')
+        r.git.commit(m='old')
+        target.write_binary(''.join(new).encode())
+        exp = subprocess.check_output(['git', '-c', 'color.ui=never', 'diff',
+                                       'sub/target.py']).decode()
+    assert ''.join(api.version_patch(tmpdir.strpath,
+                                     'sub/target.py')) == exp
+
+
+# -----------------------------------------------------------------------------
+def test_diff_same():
+    """
+    No change, no diff
+    """
+    pytest.dbgfunc()
+    assert list(udiff.diff('p', b'a\n', b'a\n', '1', '2')) == []
+
+
+# -----------------------------------------------------------------------------
+def test_diff_binary():
+    """
+    Binary files get git's one-line notice
+    """
+    pytest.dbgfunc()
+    assert list(udiff.diff('p', b'a\0', b'b\0', 'abc', 'def')) == [
+        'diff --git a/p b/p\n', 'index abc..def 100644\n',
+        'Binary files a/p and b/p differ\n']
+
+
+# -----------------------------------------------------------------------------
+def test_version_patch_untracked(tmpdir):
+    """
+    A file HEAD doesn't have can't be diffed in-process
+    """
+    pytest.dbgfunc()
+    git.Repo.init(tmpdir.strpath)
+    tmpdir.join('version.py').write("__version__ = '1.0.0'\n")
+    with pytest.raises(api.NotFound):
+        api.version_patch(tmpdir.strpath, 'version.py')